@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting_exports', '0003_error_repetition_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountingexport',
+            name='export_checkpoints',
+            field=models.JSONField(default=dict, help_text='Responses of the completed export stages'),
+        ),
+    ]
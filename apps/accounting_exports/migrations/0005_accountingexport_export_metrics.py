@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting_exports', '0004_accountingexport_export_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountingexport',
+            name='export_metrics',
+            field=models.JSONField(default=dict, help_text='Wall time, query count and HTTP call count of the export stages'),
+        ),
+    ]
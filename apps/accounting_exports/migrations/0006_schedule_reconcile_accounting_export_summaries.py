@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.db import migrations
+
+RECONCILE_FUNC = 'apps.business_central.actions.reconcile_accounting_export_summaries'
+
+
+def create_reconcile_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+
+    Schedule.objects.update_or_create(
+        func=RECONCILE_FUNC,
+        defaults={
+            'schedule_type': 'I',
+            'minutes': 60,
+            'next_run': datetime.now()
+        }
+    )
+
+
+def delete_reconcile_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+
+    Schedule.objects.filter(func=RECONCILE_FUNC).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting_exports', '0005_accountingexport_export_metrics'),
+        ('django_q', '0014_schedule_cluster'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_reconcile_schedule, delete_reconcile_schedule)
+    ]
@@ -1,10 +1,10 @@
+from collections import Counter
 from datetime import datetime
 from typing import List
 
-from django.contrib.postgres.aggregates import ArrayAgg
 from django.contrib.postgres.fields import ArrayField
-from django.db import models
-from django.db.models import Count
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
 from fyle_accounting_mappings.models import ExpenseAttribute
 
 from apps.fyle.models import Expense
@@ -71,17 +71,27 @@ def _group_expenses(expenses: List[Expense], export_setting: ExportSetting, fund
     if date_field:
         default_fields.append(date_field)
 
-    # Extract expense IDs from the provided expenses
-    expense_ids = [expense.id for expense in expenses]
-    # Retrieve expenses from the database
-    expenses = Expense.objects.filter(id__in=expense_ids).all()
+    # Build the groups in a single pass over the loaded expenses, keeping the latest spent_at of each group
+    expense_groups = {}
+    grouped_expense_ids = set()
+    for expense in expenses:
+        if expense.id in grouped_expense_ids:
+            continue
+        grouped_expense_ids.add(expense.id)
 
-    # Create expense groups by grouping expenses based on specified fields
-    expense_groups = list(expenses.values(*default_fields).annotate(
-        total=Count('*'), expense_ids=ArrayAgg('id'))
-    )
+        group_key = tuple(getattr(expense, field) for field in default_fields)
+        expense_group = expense_groups.get(group_key)
+
+        if not expense_group:
+            expense_group = dict(zip(default_fields, group_key))
+            expense_group.update({'expense_ids': [], 'last_spent_at': None})
+            expense_groups[group_key] = expense_group
+
+        expense_group['expense_ids'].append(expense.id)
+        if expense.spent_at and (not expense_group['last_spent_at'] or expense.spent_at > expense_group['last_spent_at']):
+            expense_group['last_spent_at'] = expense.spent_at
 
-    return expense_groups
+    return list(expense_groups.values())
 
 
 class AccountingExport(BaseForeignWorkspaceModel):
@@ -100,6 +110,8 @@ class AccountingExport(BaseForeignWorkspaceModel):
     detail = CustomJsonField(help_text='Task Response')
     business_central_errors = CustomJsonField(help_text='Business Central Errors')
     exported_at = CustomDateTimeField(help_text='time of export')
+    export_checkpoints = models.JSONField(default=dict, help_text='Responses of the completed export stages')
+    export_metrics = models.JSONField(default=dict, help_text='Wall time, query count and HTTP call count of the export stages')
 
     class Meta:
         db_table = 'accounting_exports'
@@ -120,6 +132,9 @@ class AccountingExport(BaseForeignWorkspaceModel):
             'CCC': 'credit_card'
         }
 
+        accounting_export_instances = []
+        accounting_export_expense_ids = []
+
         for accounting_export in accounting_exports:
             # Determine the date field based on fund_source
             date_field = getattr(export_setting, f"{fund_source_map.get(fund_source)}_expense_date", None).lower()
@@ -129,26 +144,30 @@ class AccountingExport(BaseForeignWorkspaceModel):
                 else:
                     accounting_export[date_field] = datetime.now().strftime('%Y-%m-%d')
 
-            # Calculate and assign 'last_spent_at' based on the chosen date field
+            # 'last_spent_at' is computed while grouping, keep it only when it is the chosen date field
+            last_spent_at = accounting_export.pop('last_spent_at')
             if date_field == 'last_spent_at':
-                latest_expense = Expense.objects.filter(id__in=accounting_export['expense_ids']).order_by('-spent_at').first()
-                accounting_export['last_spent_at'] = latest_expense.spent_at.strftime('%Y-%m-%d') if latest_expense else None
+                accounting_export['last_spent_at'] = last_spent_at.strftime('%Y-%m-%d') if last_spent_at else None
 
             # Store expense IDs and remove unnecessary keys
-            expense_ids = accounting_export['expense_ids']
-            accounting_export.pop('total')
-            accounting_export.pop('expense_ids')
+            accounting_export_expense_ids.append(accounting_export.pop('expense_ids'))
 
-            # Create an AccountingExport object for the expense group
-            accounting_export_instance = AccountingExport.objects.create(
+            accounting_export_instances.append(AccountingExport(
                 workspace_id=workspace_id,
                 fund_source=accounting_export['fund_source'],
                 description=accounting_export,
                 status='EXPORT_READY'
-            )
+            ))
 
-            # Add related expenses to the AccountingExport object
-            accounting_export_instance.expenses.add(*expense_ids)
+        # Create the AccountingExport objects and link their expenses in two statements
+        accounting_export_instances = AccountingExport.objects.bulk_create(accounting_export_instances)
+
+        AccountingExportExpense = AccountingExport.expenses.through
+        AccountingExportExpense.objects.bulk_create([
+            AccountingExportExpense(accountingexport_id=accounting_export_instance.id, expense_id=expense_id)
+            for accounting_export_instance, expense_ids in zip(accounting_export_instances, accounting_export_expense_ids)
+            for expense_id in expense_ids
+        ])
 
 
 class AccountingExportSummary(BaseModel):
@@ -193,5 +212,48 @@ class Error(BaseForeignWorkspaceModel):
         self.repetition_count += 1
         self.save()
 
+    @staticmethod
+    def bulk_create_or_update_mapping_errors(workspace_id: int, error_type: str, error_detail: str, expense_attributes: List[ExpenseAttribute]):
+        """
+        Create or update the mapping errors of expense attributes in bulk
+        repetition_count is increased by one for every occurrence of an attribute in expense_attributes
+        """
+        repetition_counts = Counter(expense_attribute.id for expense_attribute in expense_attributes)
+
+        if not repetition_counts:
+            return
+
+        # Rows are locked and upserted in expense attribute order, so concurrent export lanes cannot deadlock
+        errors = {
+            expense_attribute.id: Error(
+                workspace_id=workspace_id,
+                expense_attribute_id=expense_attribute.id,
+                type=error_type,
+                error_title=expense_attribute.value,
+                error_detail=error_detail,
+                is_resolved=False
+            ) for expense_attribute in sorted(expense_attributes, key=lambda expense_attribute: expense_attribute.id)
+        }
+
+        with transaction.atomic():
+            list(Error.objects.select_for_update().filter(
+                expense_attribute_id__in=repetition_counts.keys()
+            ).order_by('expense_attribute_id').values_list('id', flat=True))
+
+            Error.objects.bulk_create(
+                list(errors.values()),
+                update_conflicts=True,
+                unique_fields=['expense_attribute'],
+                update_fields=['type', 'error_title', 'error_detail', 'is_resolved', 'updated_at']
+            )
+
+            # Increase the counts in the database so that concurrent exports do not overwrite each other
+            Error.objects.filter(expense_attribute_id__in=repetition_counts.keys()).update(
+                repetition_count=F('repetition_count') + Case(
+                    *[When(expense_attribute_id=expense_attribute_id, then=Value(count)) for expense_attribute_id, count in repetition_counts.items()],
+                    default=Value(0)
+                )
+            )
+
     class Meta:
         db_table = 'errors'
@@ -15,7 +15,7 @@ class AccountingExportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = AccountingExport
-        fields = '__all__'
+        exclude = ['export_checkpoints']
 
 
 class AccountingExportSummarySerializer(serializers.ModelSerializer):
@@ -1,22 +1,103 @@
-from django.db.models import Q
+from datetime import datetime, timezone
+from typing import List
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 
 from apps.accounting_exports.models import AccountingExport, AccountingExportSummary
 
+SUMMARY_EXCLUDED_TYPES = ['FETCHING_REIMBURSABLE_EXPENSES', 'FETCHING_CREDIT_CARD_EXPENSES']
+FAILED_STATUSES = ['FAILED', 'FATAL']
+
 
 def update_accounting_export_summary(workspace_id):
-    accounting_export_summary = AccountingExportSummary.objects.get(workspace_id=workspace_id)
+    """
+    Recount the accounting export summary of a workspace
+    The summary row is locked while counting, so status changes committed meanwhile are counted exactly once
+    :param workspace_id: Workspace id
+    :return: AccountingExportSummary object
+    """
+    with transaction.atomic():
+        accounting_export_summary = AccountingExportSummary.objects.select_for_update().get(workspace_id=workspace_id)
 
-    failed_exports = AccountingExport.objects.filter(~Q(type__in=['FETCHING_REIMBURSABLE_EXPENSES', 'FETCHING_CREDIT_CARD_EXPENSES']), workspace_id=workspace_id, status__in=['FAILED', 'FATAL']).count()
+        failed_exports = AccountingExport.objects.filter(~Q(type__in=SUMMARY_EXCLUDED_TYPES), workspace_id=workspace_id, status__in=FAILED_STATUSES).count()
 
-    successful_exports = AccountingExport.objects.filter(
-        ~Q(type__in=['FETCHING_REIMBURSABLE_EXPENSES', 'FETCHING_CREDIT_CARD_EXPENSES']),
-        workspace_id=workspace_id, status='COMPLETE',
-        updated_at__gte=accounting_export_summary.last_exported_at
-    ).count()
+        successful_exports = AccountingExport.objects.filter(
+            ~Q(type__in=SUMMARY_EXCLUDED_TYPES),
+            workspace_id=workspace_id, status='COMPLETE',
+            updated_at__gte=accounting_export_summary.last_exported_at
+        ).count()
 
-    accounting_export_summary.failed_accounting_export_count = failed_exports
-    accounting_export_summary.successful_accounting_export_count = successful_exports
-    accounting_export_summary.total_accounting_export_count = failed_exports + successful_exports
-    accounting_export_summary.save()
+        accounting_export_summary.failed_accounting_export_count = failed_exports
+        accounting_export_summary.successful_accounting_export_count = successful_exports
+        accounting_export_summary.total_accounting_export_count = failed_exports + successful_exports
+        accounting_export_summary.save()
 
     return accounting_export_summary
+
+
+def reconcile_accounting_export_summaries():
+    """
+    Recount the accounting export summaries of every workspace, correcting any drift of the incremental counters
+    """
+    for workspace_id in AccountingExportSummary.objects.values_list('workspace_id', flat=True):
+        update_accounting_export_summary(workspace_id)
+
+
+def increment_accounting_export_summary(workspace_id: int, previous_statuses: list, status: str):
+    """
+    Move the summary counters of a workspace for accounting exports changing status
+    :param workspace_id: Workspace id
+    :param previous_statuses: statuses of the accounting exports before the change
+    :param status: new status of the accounting exports
+    """
+    failed_count = sum(int(status in FAILED_STATUSES) - int(previous_status in FAILED_STATUSES) for previous_status in previous_statuses)
+    successful_count = sum(int(status == 'COMPLETE' and previous_status != 'COMPLETE') for previous_status in previous_statuses)
+
+    if failed_count or successful_count:
+        AccountingExportSummary.objects.filter(workspace_id=workspace_id).update(
+            failed_accounting_export_count=Coalesce(F('failed_accounting_export_count'), 0) + failed_count,
+            successful_accounting_export_count=Coalesce(F('successful_accounting_export_count'), 0) + successful_count,
+            total_accounting_export_count=Coalesce(F('total_accounting_export_count'), 0) + failed_count + successful_count
+        )
+
+
+def update_accounting_export_status(accounting_export: AccountingExport, status: str):
+    """
+    Save an accounting export with a new status and move the summary counters of its workspace along with it
+    The previous status is read under a row lock, so concurrent changes of the same export are counted once
+    :param accounting_export: AccountingExport object
+    :param status: new status
+    """
+    with transaction.atomic():
+        previous_status = AccountingExport.objects.select_for_update().filter(id=accounting_export.id).values_list('status', flat=True).first()
+
+        accounting_export.status = status
+        accounting_export.save()
+
+        if accounting_export.type not in SUMMARY_EXCLUDED_TYPES:
+            increment_accounting_export_summary(accounting_export.workspace_id, [previous_status], status)
+
+
+def bulk_update_accounting_export_status(workspace_id: int, accounting_export_ids: List[int], status: str, **fields):
+    """
+    Move accounting exports of a workspace to a new status with a single update and move the summary counters along with them
+    :param workspace_id: Workspace id
+    :param accounting_export_ids: accounting export ids
+    :param status: new status
+    :param fields: other fields to update
+    """
+    with transaction.atomic():
+        # Rows are locked in id order, so concurrent bulk updates cannot deadlock
+        accounting_exports = AccountingExport.objects.select_for_update().filter(
+            workspace_id=workspace_id, id__in=accounting_export_ids
+        ).order_by('id').values_list('type', 'status')
+
+        previous_statuses = [previous_status for export_type, previous_status in accounting_exports if export_type not in SUMMARY_EXCLUDED_TYPES]
+
+        AccountingExport.objects.filter(workspace_id=workspace_id, id__in=accounting_export_ids).update(
+            status=status, updated_at=datetime.now(tz=timezone.utc), **fields
+        )
+
+        increment_accounting_export_summary(workspace_id, previous_statuses, status)
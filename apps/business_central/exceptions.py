@@ -5,7 +5,8 @@ import traceback
 from dynamics.exceptions.dynamics_exceptions import InvalidTokenError, WrongParamsError
 
 from apps.accounting_exports.models import AccountingExport, Error
-from apps.business_central.actions import update_accounting_export_summary
+from apps.business_central.actions import update_accounting_export_status
+from apps.business_central.utils import BusinessCentralConnector
 from apps.workspaces.models import BusinessCentralCredentials, FyleCredential
 from ms_business_central_api.exceptions import BulkError
 
@@ -22,10 +23,9 @@ def handle_business_central_error(exception, accounting_export: AccountingExport
 
     error.increase_repetition_count_by_one()
 
-    accounting_export.status = 'FAILED'
     accounting_export.detail = None
     accounting_export.business_central_errors = business_central_error
-    accounting_export.save()
+    update_accounting_export_status(accounting_export, 'FAILED')
 
 
 def handle_business_central_exceptions():
@@ -39,47 +39,41 @@ def handle_business_central_exceptions():
             except (FyleCredential.DoesNotExist):
                 logger.info('Fyle credentials not found %s', accounting_export.workspace_id)
                 accounting_export.detail = {'message': 'Fyle credentials do not exist in workspace'}
-                accounting_export.status = 'FAILED'
-
-                accounting_export.save()
+                update_accounting_export_status(accounting_export, 'FAILED')
 
             except BusinessCentralCredentials.DoesNotExist:
                 logger.info('Business Central Account not connected / token expired for workspace_id %s / accounting export %s', accounting_export.workspace_id, accounting_export.id)
                 detail = {'accounting_export_id': accounting_export.id, 'message': 'Business Central Account not connected / token expired'}
-                accounting_export.status = 'FAILED'
                 accounting_export.detail = detail
-
-                accounting_export.save()
+                update_accounting_export_status(accounting_export, 'FAILED')
 
             except WrongParamsError as exception:
                 handle_business_central_error(exception, accounting_export, accounting_export.type)
 
             except InvalidTokenError as exception:
                 logger.info(exception.response)
+                BusinessCentralConnector.clear_connection(accounting_export.workspace_id)
                 business_central_credentials: BusinessCentralCredentials = BusinessCentralCredentials.objects.filter(workspace_id=accounting_export.workspace_id).first()
                 if business_central_credentials:
                     business_central_credentials.is_expired = True
                     business_central_credentials.refresh_token = None
                     business_central_credentials.save()
 
+                accounting_export.detail = {'accounting_export_id': accounting_export.id, 'message': 'Business Central Account token expired'}
+                update_accounting_export_status(accounting_export, 'FAILED')
+
             except BulkError as exception:
                 logger.info(exception.response)
                 detail = exception.response
-                accounting_export.status = 'FAILED'
                 accounting_export.detail = detail
-
-                accounting_export.save()
+                update_accounting_export_status(accounting_export, 'FAILED')
 
             except Exception as error:
                 error = traceback.format_exc()
                 accounting_export.detail = {'error': error}
-                accounting_export.status = 'FATAL'
-
-                accounting_export.save()
+                update_accounting_export_status(accounting_export, 'FATAL')
                 logger.error('Something unexpected happened workspace_id: %s %s', accounting_export.workspace_id, accounting_export.detail)
 
-            update_accounting_export_summary(accounting_export.workspace_id)
-
         return new_fn
 
     return decorator
@@ -1,12 +1,46 @@
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-from django.db import transaction
+from django.db import connection, transaction
 
 from apps.accounting_exports.models import AccountingExport
+from apps.business_central.actions import update_accounting_export_status
 from apps.business_central.exports.helpers import resolve_errors_for_exported_accounting_export, validate_accounting_export
+from apps.business_central.exports.mapping_resolver import MappingResolver
+from apps.business_central.rate_limiter import RateLimiter
 from apps.workspaces.models import AdvancedSetting, ExportSetting
 
 
+@contextmanager
+def record_export_stage(accounting_export: AccountingExport, stage: str):
+    """
+    Record the wall time, database query count and Business Central HTTP call count of an export stage
+    The metrics are saved along with the accounting export, whether the stage succeeds or fails
+    :param accounting_export: The accounting export object
+    :param stage: Name of the stage
+    """
+    query_count = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal query_count
+        query_count += 1
+        return execute(sql, params, many, context)
+
+    http_call_count = RateLimiter.get_call_count()
+    started_at = time.monotonic()
+
+    try:
+        with connection.execute_wrapper(count_query):
+            yield
+    finally:
+        accounting_export.export_metrics[stage] = {
+            'duration': round(time.monotonic() - started_at, 3),
+            'query_count': query_count,
+            'http_call_count': RateLimiter.get_call_count() - http_call_count
+        }
+
+
 class AccountingDataExporter:
     """
     Base class for exporting accounting data to an external accounting system.
@@ -38,36 +72,94 @@ class AccountingDataExporter:
 
         export_settings = ExportSetting.objects.filter(workspace_id=accounting_export.workspace_id).first()
 
+        # Checkpoints of an earlier attempt may be newer than the queued accounting export
+        accounting_export.refresh_from_db(fields=['export_checkpoints'])
+
         # Check and update the status of the accounting export
         if accounting_export.status not in ['IN_PROGRESS', 'COMPLETE']:
-            accounting_export.status = 'IN_PROGRESS'
-            accounting_export.save()
+            update_accounting_export_status(accounting_export, 'IN_PROGRESS')
         else:
             # If the status is already 'IN_PROGRESS' or 'COMPLETE', return without further processing
             return
 
-        validate_accounting_export(accounting_export, export_settings)
-        with transaction.atomic():
+        # Metrics describe the latest attempt only
+        accounting_export.export_metrics = {}
+
+        with record_export_stage(accounting_export, 'validate'):
+            validate_accounting_export(accounting_export, export_settings)
+
+        with record_export_stage(accounting_export, 'staging'), transaction.atomic():
             # Create or update the main body of the accounting object
             body_model_object = self.body_model.create_or_update_object(accounting_export, advance_settings, export_settings)
 
             # Create or update line items for the accounting object
             lineitems_model_objects = None
             if self.lineitem_model:
+                # The mappings of the line items are loaded once for the whole export run
+                mapping_resolver = MappingResolver(accounting_export.workspace_id, list(accounting_export.expenses.all()))
                 lineitems_model_objects = self.lineitem_model.create_or_update_object(
-                    accounting_export, advance_settings, export_settings
+                    accounting_export, advance_settings, export_settings, mapping_resolver
                 )
 
-            # Post the data to the external accounting system
-            created_object = self.post(accounting_export, body_model_object, lineitems_model_objects)
+        # Post the data to the external accounting system, outside the transaction so that completed stages stay checkpointed
+        created_object = self.post(accounting_export, body_model_object, lineitems_model_objects)
 
+        with transaction.atomic():
             # Update the accounting export details
             detail = created_object
 
             accounting_export.detail = detail
+            # Checkpoints only serve retries of an unfinished export
+            accounting_export.export_checkpoints = {}
             accounting_export.export_url = 'https://businesscentral.dynamics.com/'
             accounting_export.business_central_errors = None
             accounting_export.exported_at = datetime.now()
-            accounting_export.status = 'COMPLETE'
-            accounting_export.save()
+            update_accounting_export_status(accounting_export, 'COMPLETE')
             resolve_errors_for_exported_accounting_export(accounting_export)
+
+    def run_export_stage(self, accounting_export: AccountingExport, stage: str, func, *args, **kwargs):
+        """
+        Run an export stage unless an earlier attempt completed it
+        The response of the stage is committed right away, so a retry resumes after the last completed stage
+        :param accounting_export: The accounting export object
+        :param stage: Name of the stage
+        :param func: Function posting the stage
+        :return: Response of the stage
+        """
+        if stage in accounting_export.export_checkpoints:
+            return accounting_export.export_checkpoints[stage]
+
+        with record_export_stage(accounting_export, stage):
+            response = func(*args, **kwargs)
+
+            accounting_export.export_checkpoints[stage] = response
+            AccountingExport.objects.filter(id=accounting_export.id).update(export_checkpoints=accounting_export.export_checkpoints)
+
+        return response
+
+    def run_attachments_stage(self, accounting_export: AccountingExport, func, *args):
+        """
+        Upload the attachments of an accounting export, skipping the files uploaded by an earlier attempt
+        Only successful uploads are checkpointed, so a retry uploads just the files which failed
+        :param accounting_export: The accounting export object
+        :param func: Function uploading the attachments and returning the result of every file
+        :return: Upload result of every file
+        """
+        uploaded_results = accounting_export.export_checkpoints.get('attachments', [])
+
+        with record_export_stage(accounting_export, 'attachments'):
+            results = func(*args, uploaded_files={(result['ref_id'], result['file_id']) for result in uploaded_results})
+
+            accounting_export.export_checkpoints['attachments'] = uploaded_results + [result for result in results if result['success']]
+            AccountingExport.objects.filter(id=accounting_export.id).update(export_checkpoints=accounting_export.export_checkpoints)
+
+        return uploaded_results + results
+
+    def clear_export_stage(self, accounting_export: AccountingExport, stage: str):
+        """
+        Drop the checkpoint of a stage which has to be posted again
+        :param accounting_export: The accounting export object
+        :param stage: Name of the stage
+        """
+        accounting_export.export_checkpoints.pop(stage, None)
+        AccountingExport.objects.filter(id=accounting_export.id).update(export_checkpoints=accounting_export.export_checkpoints)
@@ -1,13 +1,27 @@
 from datetime import datetime
+from typing import Dict, List
 
 from django.db import models
-from django.db.models import Sum
-from fyle_accounting_mappings.models import DestinationAttribute, EmployeeMapping, ExpenseAttribute, Mapping, MappingSetting
+from django.db.models import F, Func, Sum, Value
+from django.db.models.functions import Lower, Trim
+from fyle_accounting_mappings.models import CategoryMapping, DestinationAttribute, EmployeeMapping
 
 from apps.accounting_exports.models import AccountingExport
+from apps.business_central.exports.mapping_resolver import MappingResolver
 from apps.fyle.models import Expense
 from apps.workspaces.models import AdvancedSetting, ExportSetting, FyleCredential, Workspace
 
+# Vendor names compared case insensitively with runs of whitespace collapsed and trimmed
+# Matches the expression of the destination_attributes_vendor_name_idx index
+NORMALIZED_VENDOR_NAME = Lower(Trim(Func(F('value'), Value(r'\s+'), Value(' '), Value('g'), function='REGEXP_REPLACE')))
+
+
+def normalize_vendor_name(name: str) -> str:
+    """
+    Normalize a merchant or vendor name the way NORMALIZED_VENDOR_NAME does
+    """
+    return ' '.join(name.split()).lower()
+
 
 class BaseExportModel(models.Model):
     """
@@ -118,8 +132,8 @@ class BaseExportModel(models.Model):
             else:
                 if export_settings.name_in_journal_entry == 'MERCHANT':
                     if merchant:
-                        vendor = DestinationAttribute.objects.filter(
-                            value__iexact=merchant, attribute_type='VENDOR', workspace_id=accounting_export.workspace_id
+                        vendor = DestinationAttribute.objects.annotate(normalized_value=NORMALIZED_VENDOR_NAME).filter(
+                            normalized_value=normalize_vendor_name(merchant), attribute_type='VENDOR', workspace_id=accounting_export.workspace_id
                         ).first()
                         return "Vendor", vendor.destination_id if vendor else export_settings.default_vendor_id
                     else:
@@ -155,70 +169,37 @@ class BaseExportModel(models.Model):
 
         return purpose
 
-    def get_location_id(accounting_export: AccountingExport, lineitem: Expense):
-        location_id = None
+    def get_category(lineitem: Expense) -> str:
+        """
+        Get the category of a line item, including the sub category when it differs
+        """
+        return lineitem.category if (lineitem.category == lineitem.sub_category or lineitem.sub_category == None) else '{0} / {1}'.format(lineitem.category, lineitem.sub_category)
 
-        location_setting: MappingSetting = MappingSetting.objects.filter(
-            workspace_id=accounting_export.workspace_id,
-            destination_field='LOCATION'
-        ).first()
+    def get_category_mappings(accounting_export: AccountingExport, lineitems: List[Expense]) -> Dict[str, CategoryMapping]:
+        """
+        Get the category mappings of all the line items in a single query
+        :return: first category mapping of every category
+        """
+        category_mappings = {}
 
-        if location_setting:
-            if location_setting.source_field == 'PROJECT':
-                source_value = lineitem.project
-            elif location_setting.source_field == 'COST_CENTER':
-                source_value = lineitem.cost_center
-            else:
-                attribute = ExpenseAttribute.objects.filter(attribute_type=location_setting.source_field, workspace_id=accounting_export.workspace_id).first()
-                source_value = lineitem.custom_properties.get(attribute.display_name, None)
-
-            mapping: Mapping = Mapping.objects.filter(
-                source_type=location_setting.source_field,
-                destination_type='LOCATION',
-                source__value=source_value,
-                workspace_id=accounting_export.workspace_id
-            ).first()
-
-            if mapping:
-                location_id = mapping.destination.destination_id
-        return location_id
-
-    def get_dimension_object(accounting_export: AccountingExport, lineitem: Expense):
-        mapping_settings = MappingSetting.objects.filter(workspace_id=accounting_export.workspace_id).all()
-
-        dimensions = []
-        default_expense_attributes = ['CATEGORY', 'EMPLOYEE']
-        default_destination_attributes = ['COMPANIES', 'ACCOUNTS', 'VENDORS', 'EMPLOYEES', 'LOCATIONS', 'BANK_ACCOUNTS']
-
-        for setting in mapping_settings:
-            if setting.source_field not in default_expense_attributes and \
-                    setting.destination_field not in default_destination_attributes:
-                if setting.source_field == 'PROJECT':
-                    source_value = lineitem.project
-                elif setting.source_field == 'COST_CENTER':
-                    source_value = lineitem.cost_center
-                else:
-                    attribute = ExpenseAttribute.objects.filter(
-                        attribute_type=setting.source_field,
-                        workspace_id=accounting_export.workspace_id
-                    ).first()
-                    source_value = lineitem.custom_properties.get(attribute.display_name, None)
-
-                mapping: Mapping = Mapping.objects.filter(
-                    source_type=setting.source_field,
-                    destination_type=setting.destination_field,
-                    source__value=source_value,
-                    workspace_id=accounting_export.workspace_id
-                ).first()
-
-                if mapping:
-                    dimension_data = {
-                        'id': mapping.destination.detail['dimension_id'],
-                        'code': mapping.destination.attribute_type,
-                        'valueId': mapping.destination.destination_id,
-                        'valueCode': mapping.destination.detail['code'],
-                        'expense_number': lineitem.expense_number
-                    }
-                    dimensions.append(dimension_data)
-
-        return dimensions
+        for category_mapping in CategoryMapping.objects.filter(
+            source_category__value__in={BaseExportModel.get_category(lineitem) for lineitem in lineitems},
+            workspace_id=accounting_export.workspace_id
+        ).select_related('source_category', 'destination_account').order_by('id'):
+            category_mappings.setdefault(category_mapping.source_category.value, category_mapping)
+
+        return category_mappings
+
+    def get_location_id(accounting_export: AccountingExport, lineitem: Expense, mapping_resolver: MappingResolver):
+        """
+        Get the mapped location id of a line item
+        :param mapping_resolver: resolver shared by the line items of the export run
+        """
+        return mapping_resolver.get_location_id(lineitem)
+
+    def get_dimension_object(accounting_export: AccountingExport, lineitem: Expense, mapping_resolver: MappingResolver):
+        """
+        Get the mapped dimensions of a line item
+        :param mapping_resolver: resolver shared by the line items of the export run
+        """
+        return mapping_resolver.get_dimensions(lineitem)
@@ -1,8 +1,12 @@
 import itertools
 import logging
 import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Set, Tuple
 
+from django.db.models import Exists, OuterRef, Subquery
 from fyle_accounting_mappings.models import CategoryMapping, EmployeeMapping, ExpenseAttribute, Mapping
 from fyle_integrations_platform_connector import PlatformConnector
 
@@ -15,6 +19,8 @@ from ms_business_central_api.exceptions import BulkError
 logger = logging.getLogger(__name__)
 logger.level = logging.INFO
 
+ATTACHMENT_UPLOAD_MAX_WORKERS = 5
+
 
 def get_employee_expense_attribute(value: str, workspace_id: int) -> ExpenseAttribute:
     """
@@ -45,103 +51,115 @@ def get_filtered_mapping(
     return Mapping.objects.filter(**filters).first()
 
 
-def __validate_category_mapping(accounting_export: AccountingExport):
+def validate_category_mappings(workspace_id: int, accounting_exports: List[AccountingExport]) -> Dict[int, List[Dict]]:
+    """
+    Validate the category mappings of the expenses of a batch of accounting exports
+    :param workspace_id: workspace id
+    :param accounting_exports: accounting exports of the workspace
+    :return: bulk errors of every accounting export
+    """
+    bulk_errors = {accounting_export.id: [] for accounting_export in accounting_exports}
 
-    row = 0
-    bulk_errors = []
-    expenses = accounting_export.expenses.all()
+    expenses = Expense.objects.filter(
+        accountingexport__in=accounting_exports
+    ).values('accountingexport', 'category', 'sub_category').order_by('accountingexport', 'id')
 
+    lineitems = []
     for lineitem in expenses:
-        category = lineitem.category if (lineitem.category == lineitem.sub_category or lineitem.sub_category == None) else '{0} / {1}'.format(
-            lineitem.category, lineitem.sub_category)
-
-        category_attribute = ExpenseAttribute.objects.filter(
-            value=category,
-            workspace_id=accounting_export.workspace_id,
-            attribute_type='CATEGORY'
-        ).first()
-
-        account = CategoryMapping.objects.filter(
-            source_category_id=category_attribute.id,
-            workspace_id=accounting_export.workspace_id
-        ).first()
-
-        if not account:
-            bulk_errors.append({
+        category = lineitem['category'] if (lineitem['category'] == lineitem['sub_category'] or lineitem['sub_category'] == None) else '{0} / {1}'.format(
+            lineitem['category'], lineitem['sub_category'])
+        lineitems.append((lineitem['accountingexport'], category))
+
+    # First category attribute of every category along with the presence of its mapping
+    category_attributes = {}
+    for category_attribute in ExpenseAttribute.objects.filter(
+        value__in={category for _, category in lineitems},
+        workspace_id=workspace_id,
+        attribute_type='CATEGORY'
+    ).annotate(
+        is_mapped=Exists(CategoryMapping.objects.filter(source_category_id=OuterRef('id'), workspace_id=workspace_id))
+    ).order_by('id'):
+        category_attributes.setdefault(category_attribute.value, category_attribute)
+
+    error_attributes = []
+    rows = Counter()
+    for accounting_export_id, category in lineitems:
+        category_attribute = category_attributes.get(category)
+        row = rows[accounting_export_id]
+        rows[accounting_export_id] += 1
+
+        if not category_attribute or not category_attribute.is_mapped:
+            bulk_errors[accounting_export_id].append({
                 'row': row,
-                'accounting_export_id': accounting_export.id,
+                'accounting_export_id': accounting_export_id,
                 'value': category,
                 'type': 'Category Mapping',
                 'message': 'Category Mapping not found'
             })
 
             if category_attribute:
-                error, _ = Error.objects.update_or_create(
-                    workspace_id=accounting_export.workspace_id,
-                    expense_attribute=category_attribute,
-                    defaults={
-                        'type': 'CATEGORY_MAPPING',
-                        'error_title': category_attribute.value,
-                        'error_detail': 'Category mapping is missing',
-                        'is_resolved': False
-                    }
-                )
+                error_attributes.append(category_attribute)
 
-                error.increase_repetition_count_by_one()
-
-        row = row + 1
+    Error.bulk_create_or_update_mapping_errors(workspace_id, 'CATEGORY_MAPPING', 'Category mapping is missing', error_attributes)
 
     return bulk_errors
 
 
-def __validate_employee_mapping(accounting_export: AccountingExport, export_settings: ExportSetting):
+def validate_employee_mappings(workspace_id: int, accounting_exports: List[AccountingExport], export_settings: ExportSetting) -> Dict[int, List[Dict]]:
+    """
+    Validate the employee mappings of a batch of accounting exports
+    :param workspace_id: workspace id
+    :param accounting_exports: accounting exports of the workspace
+    :param export_settings: export settings of the workspace
+    :return: bulk errors of every accounting export
+    """
+    bulk_errors = {accounting_export.id: [] for accounting_export in accounting_exports}
+
+    destination_field = 'destination_employee_id' if export_settings.employee_field_mapping == 'EMPLOYEE' else 'destination_vendor_id'
+
+    # First employee attribute of every email along with its mapped destination
+    employee_attributes = {}
+    for employee_attribute in ExpenseAttribute.objects.filter(
+        value__in={accounting_export.description.get('employee_email') for accounting_export in accounting_exports},
+        workspace_id=workspace_id,
+        attribute_type='EMPLOYEE'
+    ).annotate(
+        mapped_destination_id=Subquery(
+            EmployeeMapping.objects.filter(source_employee_id=OuterRef('id'), workspace_id=workspace_id).values(destination_field)[:1]
+        )
+    ).order_by('id'):
+        employee_attributes.setdefault(employee_attribute.value, employee_attribute)
+
+    error_attributes = []
+    for accounting_export in accounting_exports:
+        employee_email = accounting_export.description.get('employee_email')
+        employee_attribute = employee_attributes.get(employee_email)
 
-    bulk_errors = []
-    row = 0
+        if not employee_attribute or not employee_attribute.mapped_destination_id:
+            bulk_errors[accounting_export.id].append({
+                'row': 0,
+                'accounting_export_id': accounting_export.id,
+                'value': employee_email,
+                'type': 'Employee Mapping',
+                'message': 'Employee Mapping not found'
+            })
 
-    employee_email = accounting_export.description.get('employee_email')
+            if employee_attribute:
+                error_attributes.append(employee_attribute)
 
-    try:
-        employee_attribute = get_employee_expense_attribute(employee_email, accounting_export.workspace_id)
-
-        mapping = EmployeeMapping.objects.filter(
-            source_employee=employee_attribute,
-            workspace_id=accounting_export.workspace_id
-        ).get()
-
-        if export_settings.employee_field_mapping == 'EMPLOYEE':
-            mapping = mapping.destination_employee
-        else:
-            mapping = mapping.destination_vendor
-
-        if not mapping:
-            raise EmployeeMapping.DoesNotExist
-    except EmployeeMapping.DoesNotExist:
-        bulk_errors.append({
-            'row': row,
-            'accounting_export_id': accounting_export.id,
-            'value': employee_email,
-            'type': 'Employee Mapping',
-            'message': 'Employee Mapping not found'
-        })
-
-        if employee_attribute:
-            error, _ = Error.objects.update_or_create(
-                workspace_id=accounting_export.workspace_id,
-                expense_attribute=employee_attribute,
-                defaults={
-                    'type': 'EMPLOYEE_MAPPING',
-                    'error_title': employee_attribute.value,
-                    'error_detail': 'Employee mapping is missing',
-                    'is_resolved': False
-                }
-            )
-            error.increase_repetition_count_by_one()
+    Error.bulk_create_or_update_mapping_errors(workspace_id, 'EMPLOYEE_MAPPING', 'Employee mapping is missing', error_attributes)
 
-        row = row + 1
     return bulk_errors
 
 
+def __validate_category_mapping(accounting_export: AccountingExport):
+    return validate_category_mappings(accounting_export.workspace_id, [accounting_export])[accounting_export.id]
+
+
+def __validate_employee_mapping(accounting_export: AccountingExport, export_settings: ExportSetting):
+    return validate_employee_mappings(accounting_export.workspace_id, [accounting_export], export_settings)[accounting_export.id]
+
+
 def validate_accounting_export(accounting_export: AccountingExport, export_settings: ExportSetting):
     category_mapping_errors = __validate_category_mapping(accounting_export)
 
@@ -165,38 +183,80 @@ def resolve_errors_for_exported_accounting_export(accounting_export: AccountingE
     Error.objects.filter(workspace_id=accounting_export.workspace_id, accounting_export=accounting_export, is_resolved=False).update(is_resolved=True)
 
 
-def load_attachments(
-    business_central_connection: BusinessCentralConnector,
-    ref_id: str,
-    ref_type: str,
-    expense: Expense,
-    accounting_export: AccountingExport,
-):
+def __upload_attachment(business_central_connection: BusinessCentralConnector, ref_type: str, ref_id: str, attachment: Dict) -> Dict:
     """
-    Get attachments from fyle
+    Upload a single attachment and record its outcome
     :param business_central_connection: Business Central Connection
-    :param ref_id: object id
     :param ref_type: type of object
-    :param expense_group: Expense group
+    :param ref_id: object id
+    :param attachment: attachment dict
     """
+    result = {'file_id': attachment['id'], 'ref_id': ref_id, 'success': True, 'error': None}
+
     try:
-        fyle_credentials = FyleCredential.objects.get(
-            workspace_id=accounting_export.workspace_id
-        )
-        platform = PlatformConnector(fyle_credentials)
+        business_central_connection.post_attachment(ref_type, ref_id, attachment)
+    except Exception as exception:
+        result['success'] = False
+        result['error'] = str(exception)
 
-        files_list = []
+    return result
 
-        if expense.file_ids and len(expense.file_ids):
-            for file_id in expense.file_ids:
-                if file_id:
-                    file_object = {"id": file_id}
-                    files_list.append(file_object)
 
-            if files_list:
-                attachments = platform.files.bulk_generate_file_urls(files_list)
+def load_accounting_export_attachments(
+    business_central_connection: BusinessCentralConnector,
+    accounting_export: AccountingExport,
+    attachment_references: List[Tuple[str, str, Expense]],
+    uploaded_files: Set[Tuple[str, str]] = None
+) -> List[Dict]:
+    """
+    Get attachments of all the expenses of an accounting export from fyle in one call
+    and upload them to Business Central through a bounded pool of workers
+    :param business_central_connection: Business Central Connection
+    :param accounting_export: Accounting Export
+    :param attachment_references: list of (ref_type, ref_id, expense)
+    :param uploaded_files: (ref_id, file_id) of the files already uploaded, which are skipped
+    :return: per file upload results
+    """
+    results = []
+    uploaded_files = uploaded_files or set()
+
+    file_references = [
+        (ref_type, ref_id, file_id)
+        for ref_type, ref_id, expense in attachment_references
+        for file_id in (expense.file_ids or []) if file_id and (ref_id, file_id) not in uploaded_files
+    ]
+
+    if not file_references:
+        return results
 
-            business_central_connection.post_attachments(ref_type, ref_id, attachments)
+    try:
+        fyle_credentials = FyleCredential.objects.get(workspace_id=accounting_export.workspace_id)
+        platform = PlatformConnector(fyle_credentials)
+
+        file_ids = list(dict.fromkeys(file_id for _, _, file_id in file_references))
+        attachments = {
+            attachment['id']: attachment
+            for attachment in platform.files.bulk_generate_file_urls([{'id': file_id} for file_id in file_ids])
+        }
+
+        uploads = [
+            (ref_type, ref_id, attachments[file_id])
+            for ref_type, ref_id, file_id in file_references if file_id in attachments
+        ]
+
+        with ThreadPoolExecutor(max_workers=min(ATTACHMENT_UPLOAD_MAX_WORKERS, len(uploads) or 1)) as executor:
+            results = list(executor.map(
+                lambda upload: __upload_attachment(business_central_connection, *upload), uploads
+            ))
+
+        failed_results = [result for result in results if not result['success']]
+        if failed_results:
+            logger.info(
+                "Attachment upload failed for accounting export id %s / workspace id %s \n Errors: %s",
+                accounting_export.id,
+                accounting_export.workspace_id,
+                failed_results,
+            )
 
     except Exception:
         error = traceback.format_exc()
@@ -207,6 +267,8 @@ def load_attachments(
             {"error": error},
         )
 
+    return results
+
 
 def validate_failing_export(is_auto_export: bool, interval_hours: int, error: Error):
     """
@@ -1,10 +1,9 @@
 from django.db import models
 from django.db.models import JSONField
 
-from fyle_accounting_mappings.models import CategoryMapping
-
 from apps.accounting_exports.models import AccountingExport
 from apps.business_central.exports.base_model import BaseExportModel
+from apps.business_central.exports.mapping_resolver import MappingResolver
 from apps.fyle.models import Expense
 from apps.workspaces.models import AdvancedSetting, ExportSetting
 from ms_business_central_api.models.fields import (
@@ -97,10 +96,13 @@ class JournalEntryLineItems(BaseExportModel):
         db_table = 'journal_entries_lineitems'
 
     @classmethod
-    def create_or_update_object(self, accounting_export: AccountingExport, advance_setting: AdvancedSetting, export_settings: ExportSetting):
+    def create_or_update_object(
+        self, accounting_export: AccountingExport, advance_setting: AdvancedSetting, export_settings: ExportSetting, mapping_resolver: MappingResolver
+    ):
         """
         Create Jornal Entry LineItems object
         :param accounting_export: expense group
+        :param mapping_resolver: resolver of the mappings of the export run
         :return: purchase invoices object
         """
         lineitem = accounting_export.expenses.first()
@@ -108,12 +110,7 @@ class JournalEntryLineItems(BaseExportModel):
 
         journal_entry_lineitems = []
 
-        category = lineitem.category if (lineitem.category == lineitem.sub_category or lineitem.sub_category == None) else '{0} / {1}'.format(lineitem.category, lineitem.sub_category)
-
-        account = CategoryMapping.objects.filter(
-            source_category__value=category,
-            workspace_id=accounting_export.workspace_id
-        ).first()
+        account = self.get_category_mappings(accounting_export, [lineitem]).get(self.get_category(lineitem))
 
         comment = self.get_expense_comment(accounting_export.workspace_id, lineitem, lineitem.category, advance_setting)
 
@@ -123,24 +120,32 @@ class JournalEntryLineItems(BaseExportModel):
 
         document_number = lineitem.expense_number
 
-        dimensions = self.get_dimension_object(accounting_export, lineitem)
-
-        journal_entry_lineitems_object, _ = JournalEntryLineItems.objects.update_or_create(
-            journal_entry_id = journal_entry.id,
-            expense_id=lineitem.id,
-            defaults={
-                'amount': lineitem.amount * -1,
-                'account_id': account_id,
-                'account_type': account_type,
-                'document_number':  document_number,
-                'accounts_payable_account_id': account.destination_account.destination_id,
-                'comment': comment,
-                'workspace_id': accounting_export.workspace_id,
-                'invoice_date': invoice_date,
-                'description': lineitem.purpose if lineitem.purpose else None,
-                'dimensions': dimensions
-            }
+        dimensions = self.get_dimension_object(accounting_export, lineitem, mapping_resolver)
+
+        JournalEntryLineItems.objects.bulk_create(
+            [JournalEntryLineItems(
+                journal_entry_id=journal_entry.id,
+                expense_id=lineitem.id,
+                amount=lineitem.amount * -1,
+                account_id=account_id,
+                account_type=account_type,
+                document_number=document_number,
+                accounts_payable_account_id=account.destination_account.destination_id,
+                comment=comment,
+                workspace_id=accounting_export.workspace_id,
+                invoice_date=invoice_date,
+                description=lineitem.purpose if lineitem.purpose else None,
+                dimensions=dimensions
+            )],
+            update_conflicts=True,
+            unique_fields=['expense'],
+            update_fields=[
+                'journal_entry', 'amount', 'account_id', 'account_type', 'document_number', 'accounts_payable_account_id',
+                'comment', 'workspace', 'invoice_date', 'description', 'dimensions', 'updated_at'
+            ]
+        )
+        journal_entry_lineitems.extend(
+            JournalEntryLineItems.objects.filter(journal_entry_id=journal_entry.id, expense_id=lineitem.id).select_related('expense')
         )
-        journal_entry_lineitems.append(journal_entry_lineitems_object)
 
         return journal_entry_lineitems
@@ -5,7 +5,7 @@ from apps.accounting_exports.models import AccountingExport
 from apps.business_central.actions import update_accounting_export_summary
 from apps.business_central.exceptions import handle_business_central_exceptions
 from apps.business_central.exports.accounting_export import AccountingDataExporter
-from apps.business_central.exports.helpers import load_attachments
+from apps.business_central.exports.helpers import load_accounting_export_attachments
 from apps.business_central.exports.journal_entry.models import JournalEntry, JournalEntryLineItems
 from apps.business_central.exports.journal_entry.queues import check_accounting_export_and_start_import
 from apps.business_central.utils import BusinessCentralConnector
@@ -99,44 +99,62 @@ class ExportJournalEntry(AccountingDataExporter):
         business_central_connection = BusinessCentralConnector(business_central_credentials, accounting_export.workspace_id)
 
         # Post the journal entry to Business Central
-        response = business_central_connection.bulk_post_journal_lineitems(batch_journal_entry_payload, accounting_export)
+        response = self.run_export_stage(
+            accounting_export, 'lines', business_central_connection.bulk_post_journal_lineitems, batch_journal_entry_payload, accounting_export
+        )
 
         if dimensions:
             dimension_set_line_payloads = self.construct_dimension_set_line_payload(dimensions, response['responses'])
             logger.info('WORKSPACE_ID: {0}, ACCOUNTING_EXPORT_ID: {1}, DIMENSION_SET_LINE_PAYLOADS: {2}'.format(accounting_export.workspace_id, accounting_export.id, dimension_set_line_payloads))
-            dimension_line_responses = (
-                business_central_connection.post_dimension_lines(
-                    dimension_set_line_payloads, "JOURNAL_ENTRY", item.id
-                )
+            dimension_line_responses = self.run_export_stage(
+                accounting_export, 'dimensions', business_central_connection.post_dimension_lines, dimension_set_line_payloads, "JOURNAL_ENTRY", item.id
             )
             response["dimension_line_responses"] = dimension_line_responses
 
-        expenses = accounting_export.expenses.all()
-        # Load attachments to Business Central
-        for i in range(1, len(response["responses"])):
-            load_attachments(
-                business_central_connection,
-                response["responses"][i]["body"]["id"],
+        expenses = list(accounting_export.expenses.all())
+        # Load attachments to Business Central, keeping the result of every file on the export detail
+        response['attachment_results'] = self.run_attachments_stage(
+            accounting_export,
+            load_accounting_export_attachments,
+            business_central_connection,
+            accounting_export,
+            [(
                 "Journal",
-                expenses[i - 1],
-                accounting_export)
+                response["responses"][i]["body"]["id"],
+                expenses[i - 1]
+            ) for i in range(1, len(response["responses"]))]
+        )
 
         return response
 
     def construct_dimension_set_line_payload(self, dimensions: list, exported_response: dict):
         """
         construct payload for setting dimension for Journal Entry
+        Each dimension is attached only to the journal line of its own expense
         """
 
         dimension_payload = []
 
-        for response in exported_response:
-            parent_id = response['body']['id']
-            for dimension in dimensions:
-                dimension_copy = dimension.copy()
-                dimension_copy.pop('expense_number')
-                dimension_copy['parentId'] = parent_id
-                dimension_payload.append(dimension_copy)
+        # The first response is the balancing line of the journal entry, the rest are the expense lines
+        document_mapping = {
+            response['body']['documentNumber']: response['body']['id']
+            for response in exported_response[1:]
+            if response.get('body') and 'documentNumber' in response['body'] and 'id' in response['body']
+        }
+
+        for dimension in dimensions:
+            expense_number = dimension.get('expense_number')
+            parent_id = document_mapping.get(expense_number)
+
+            if parent_id:
+                dimension_payload.append({
+                    "id": dimension['id'],
+                    "code": dimension['code'],
+                    "parentId": parent_id,
+                    "valueId": dimension['valueId'],
+                    "valueCode": dimension['valueCode'],
+                    "exported_module_id": dimension['exported_module_id']
+                })
 
         return dimension_payload
 
@@ -0,0 +1,106 @@
+from typing import Dict, List
+
+from fyle_accounting_mappings.models import ExpenseAttribute, Mapping, MappingSetting
+
+from apps.fyle.models import Expense
+
+DEFAULT_EXPENSE_ATTRIBUTES = ['CATEGORY', 'EMPLOYEE']
+DEFAULT_DESTINATION_ATTRIBUTES = ['COMPANIES', 'ACCOUNTS', 'VENDORS', 'EMPLOYEES', 'LOCATIONS', 'BANK_ACCOUNTS']
+
+
+class MappingResolver:
+    """
+    Snapshot of the mapping settings, custom field display names and mappings of the line items of an export
+    Answers location and dimension lookups of line items without hitting the database
+    A resolver is built for every export run, so it never outlives changes to the mapped attributes
+    """
+
+    def __init__(self, workspace_id: int, lineitems: List[Expense]):
+        self.workspace_id = workspace_id
+
+        self.mapping_settings: List[MappingSetting] = list(
+            MappingSetting.objects.filter(workspace_id=workspace_id).order_by('id')
+        )
+
+        source_fields = [setting.source_field for setting in self.mapping_settings]
+        custom_source_fields = [field for field in source_fields if field not in ('PROJECT', 'COST_CENTER')]
+
+        # Display name of the first expense attribute of every custom source field
+        self.display_names: Dict[str, str] = dict(
+            ExpenseAttribute.objects.filter(
+                workspace_id=workspace_id,
+                attribute_type__in=custom_source_fields
+            ).order_by('attribute_type', 'id').distinct('attribute_type').values_list('attribute_type', 'display_name')
+        )
+
+        # Only the mappings of the source values the line items carry are loaded
+        source_values = {
+            self.get_source_value(source_field, lineitem) for source_field in source_fields for lineitem in lineitems
+        } - {None}
+
+        self.mappings = {}
+        mappings = Mapping.objects.filter(
+            workspace_id=workspace_id,
+            source_type__in=source_fields,
+            destination_type__in=[setting.destination_field for setting in self.mapping_settings],
+            source__value__in=source_values
+        ).select_related('source', 'destination').order_by('id')
+
+        for mapping in mappings:
+            self.mappings.setdefault((mapping.source_type, mapping.destination_type, mapping.source.value), mapping.destination)
+
+    def get_source_value(self, source_field: str, lineitem: Expense):
+        """
+        Get the value of a source field for an expense
+        """
+        if source_field == 'PROJECT':
+            return lineitem.project
+        elif source_field == 'COST_CENTER':
+            return lineitem.cost_center
+
+        return lineitem.custom_properties.get(self.display_names.get(source_field), None)
+
+    def get_destination(self, setting: MappingSetting, lineitem: Expense):
+        """
+        Get the mapped destination attribute of an expense for a mapping setting
+        """
+        source_value = self.get_source_value(setting.source_field, lineitem)
+
+        return self.mappings.get((setting.source_field, setting.destination_field, source_value))
+
+    def get_location_id(self, lineitem: Expense):
+        """
+        Get the mapped location id of an expense
+        """
+        location_setting = next(
+            (setting for setting in self.mapping_settings if setting.destination_field == 'LOCATION'), None
+        )
+
+        if location_setting:
+            destination = self.get_destination(location_setting, lineitem)
+            if destination:
+                return destination.destination_id
+
+        return None
+
+    def get_dimensions(self, lineitem: Expense) -> List[Dict]:
+        """
+        Get the mapped dimensions of an expense
+        """
+        dimensions = []
+
+        for setting in self.mapping_settings:
+            if setting.source_field not in DEFAULT_EXPENSE_ATTRIBUTES and \
+                    setting.destination_field not in DEFAULT_DESTINATION_ATTRIBUTES:
+                destination = self.get_destination(setting, lineitem)
+
+                if destination:
+                    dimensions.append({
+                        'id': destination.detail['dimension_id'],
+                        'code': destination.attribute_type,
+                        'valueId': destination.destination_id,
+                        'valueCode': destination.detail['code'],
+                        'expense_number': lineitem.expense_number
+                    })
+
+        return dimensions
@@ -3,10 +3,9 @@ from typing import List
 from django.db import models
 from django.db.models import JSONField
 
-from fyle_accounting_mappings.models import CategoryMapping
-
 from apps.accounting_exports.models import AccountingExport
 from apps.business_central.exports.base_model import BaseExportModel
+from apps.business_central.exports.mapping_resolver import MappingResolver
 from apps.fyle.models import Expense
 from apps.workspaces.models import AdvancedSetting, ExportSetting
 from ms_business_central_api.models.fields import CustomDateTimeField, FloatNullField, StringNullField, TextNotNullField
@@ -71,42 +70,56 @@ class PurchaseInvoiceLineitems(BaseExportModel):
         db_table = 'purchase_invoice_lineitems'
 
     @classmethod
-    def create_or_update_object(self, accounting_export: AccountingExport, advance_setting: AdvancedSetting, _: ExportSetting):
+    def create_or_update_object(
+        self, accounting_export: AccountingExport, advance_setting: AdvancedSetting, _: ExportSetting, mapping_resolver: MappingResolver
+    ):
         """
         Create Purchase Invoice
         :param accounting_export: expense group
+        :param mapping_resolver: resolver of the mappings of the export run
         :return: purchase invoices object
         """
 
-        expenses: List[Expense] = accounting_export.expenses.all()
+        expenses: List[Expense] = list(accounting_export.expenses.all())
         purchase_invoice = PurchaseInvoice.objects.get(accounting_export=accounting_export)
+        category_mappings = self.get_category_mappings(accounting_export, expenses)
 
         purchase_invoice_lineitem_objects = []
 
         for lineitem in expenses:
-            category = lineitem.category if (lineitem.category == lineitem.sub_category or lineitem.sub_category == None) else '{0} / {1}'.format(lineitem.category, lineitem.sub_category)
-
-            account = CategoryMapping.objects.filter(
-                source_category__value=category,
-                workspace_id=accounting_export.workspace_id
-            ).first()
+            account = category_mappings.get(self.get_category(lineitem))
 
             description = self.get_expense_purpose(lineitem, lineitem.category, advance_setting)
-            location_id = self.get_location_id(accounting_export, lineitem)
-            dimensions = self.get_dimension_object(accounting_export, lineitem)
+            location_id = self.get_location_id(accounting_export, lineitem, mapping_resolver)
+            dimensions = self.get_dimension_object(accounting_export, lineitem, mapping_resolver)
 
-            purchase_invoice_lineitem_object, _ = PurchaseInvoiceLineitems.objects.update_or_create(
+            purchase_invoice_lineitem_objects.append(PurchaseInvoiceLineitems(
                 purchase_invoice_id=purchase_invoice.id,
                 expense_id=lineitem.id,
-                defaults={
-                    'amount': lineitem.amount,
-                    'accounts_payable_account_id': account.destination_account.destination_id if account else None,
-                    'description': description,
-                    'workspace_id': accounting_export.workspace_id,
-                    'location_id': location_id,
-                    'dimensions': dimensions
-                }
-            )
-            purchase_invoice_lineitem_objects.append(purchase_invoice_lineitem_object)
-
-        return purchase_invoice_lineitem_objects
+                amount=lineitem.amount,
+                accounts_payable_account_id=account.destination_account.destination_id if account else None,
+                description=description,
+                workspace_id=accounting_export.workspace_id,
+                location_id=location_id,
+                dimensions=dimensions
+            ))
+
+        # Create or update all the line items in a single statement
+        PurchaseInvoiceLineitems.objects.bulk_create(
+            purchase_invoice_lineitem_objects,
+            update_conflicts=True,
+            unique_fields=['expense'],
+            update_fields=[
+                'purchase_invoice', 'amount', 'accounts_payable_account_id', 'description',
+                'workspace', 'location_id', 'dimensions', 'updated_at'
+            ]
+        )
+
+        purchase_invoice_lineitems = {
+            purchase_invoice_lineitem.expense_id: purchase_invoice_lineitem
+            for purchase_invoice_lineitem in PurchaseInvoiceLineitems.objects.filter(
+                purchase_invoice_id=purchase_invoice.id
+            ).select_related('expense')
+        }
+
+        return [purchase_invoice_lineitems[lineitem.id] for lineitem in expenses]
@@ -2,11 +2,13 @@ import logging
 from datetime import datetime
 from typing import Dict, List
 
+from dynamics.exceptions.dynamics_exceptions import WrongParamsError
+
 from apps.accounting_exports.models import AccountingExport
 from apps.business_central.actions import update_accounting_export_summary
 from apps.business_central.exceptions import handle_business_central_exceptions
 from apps.business_central.exports.accounting_export import AccountingDataExporter
-from apps.business_central.exports.helpers import load_attachments
+from apps.business_central.exports.helpers import load_accounting_export_attachments
 from apps.business_central.exports.purchase_invoice.models import PurchaseInvoice, PurchaseInvoiceLineitems
 from apps.business_central.exports.purchase_invoice.queues import check_accounting_export_and_start_import
 from apps.business_central.utils import BusinessCentralConnector
@@ -79,26 +81,46 @@ class ExportPurchaseInvoice(AccountingDataExporter):
         # Establish a connection to Business Central
         business_central_connection = BusinessCentralConnector(business_central_credentials, accounting_export.workspace_id)
 
-        response = business_central_connection.post_purchase_invoice(purchase_invoice_payload, batch_purchase_invoice_payload)
+        purchase_invoice_response = self.run_export_stage(
+            accounting_export, 'header', business_central_connection.post_purchase_invoice_header, purchase_invoice_payload
+        )
+
+        try:
+            bulk_post_response = self.run_export_stage(
+                accounting_export, 'lines', business_central_connection.post_purchase_invoice_lineitems, purchase_invoice_response['id'], batch_purchase_invoice_payload
+            )
+        except WrongParamsError:
+            # Business Central deletes the purchase invoice when its lines are rejected
+            self.clear_export_stage(accounting_export, 'header')
+            raise
+
+        response = {
+            'purchase_invoice_response': purchase_invoice_response,
+            'bulk_post_response': bulk_post_response
+        }
 
         if dimensions:
             dimension_set_line_payloads = self.construct_dimension_set_line_payload(dimensions, response['bulk_post_response']['responses'])
             logger.info('WORKSPACE_ID: {0}, ACCOUNTING_EXPORT_ID: {1}, DIMENSION_SET_LINE_PAYLOADS: {2}'.format(accounting_export.workspace_id, accounting_export.id, dimension_set_line_payloads))
-            dimension_line_responses = business_central_connection.post_dimension_lines(
-                dimension_set_line_payloads, 'PURCHASE_INVOICE', item.id
+            dimension_line_responses = self.run_export_stage(
+                accounting_export, 'dimensions', business_central_connection.post_dimension_lines, dimension_set_line_payloads, 'PURCHASE_INVOICE', item.id
             )
             response['dimension_line_responses'] = dimension_line_responses
 
         expenses = accounting_export.expenses.all()
 
-        # Load attachments to Business Central
-        for expense in expenses:
-            load_attachments(
-                business_central_connection,
-                response["purchase_invoice_response"]["id"],
+        # Load attachments to Business Central, keeping the result of every file on the export detail
+        response['attachment_results'] = self.run_attachments_stage(
+            accounting_export,
+            load_accounting_export_attachments,
+            business_central_connection,
+            accounting_export,
+            [(
                 "Purchase Invoice",
-                expense,
-                accounting_export)
+                response["purchase_invoice_response"]["id"],
+                expense
+            ) for expense in expenses]
+        )
 
         return response
 
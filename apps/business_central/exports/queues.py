@@ -0,0 +1,242 @@
+import logging
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_q.models import Schedule
+from django_q.tasks import Chain, async_task, schedule
+
+from apps.accounting_exports.models import AccountingExport, AccountingExportSummary, Error
+from apps.business_central.actions import bulk_update_accounting_export_status, update_accounting_export_summary
+from apps.business_central.exports.helpers import validate_failing_export
+from apps.workspaces.models import FyleCredential
+
+logger = logging.getLogger(__name__)
+logger.level = logging.INFO
+
+# Base of the advisory lock keys of the global export slots
+EXPORT_SLOT_LOCK_KEY = 7_100_000
+# Seconds after which a lane finding no free export slot is run again
+EXPORT_SLOT_RETRY_DELAY = 5
+# Lanes outliving this no longer count towards the summary update, the reconcile schedule corrects it instead
+EXPORT_LANES_TIMEOUT = 24 * 60 * 60
+
+
+def __try_advisory_lock(*keys) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock({0})'.format(', '.join(['%s'] * len(keys))), keys)
+        return cursor.fetchone()[0]
+
+
+def __advisory_unlock(*keys):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock({0})'.format(', '.join(['%s'] * len(keys))), keys)
+
+
+def __try_slot(capacity: int, get_keys) -> tuple:
+    """
+    Lock one of the slots if any is free
+    :param capacity: number of slots
+    :param get_keys: function returning the advisory lock keys of a slot
+    :return: keys of the locked slot, None if every slot is taken
+    """
+    for slot in range(capacity):
+        keys = get_keys(slot)
+        if __try_advisory_lock(*keys):
+            return keys
+
+
+@contextmanager
+def export_slot(workspace_id: int):
+    """
+    Hold a workspace export slot and a global export slot, without waiting for them
+    Advisory locks are held by the database session, so a slot is freed even if the worker dies
+    :param workspace_id: Workspace id
+    :return: whether both slots are held
+    """
+    workspace_keys = __try_slot(settings.EXPORT_CONCURRENCY_PER_WORKSPACE, lambda slot: (workspace_id, slot))
+
+    if not workspace_keys:
+        yield False
+        return
+
+    try:
+        global_keys = __try_slot(settings.EXPORT_CONCURRENCY_GLOBAL, lambda slot: (EXPORT_SLOT_LOCK_KEY + slot,))
+
+        if not global_keys:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            __advisory_unlock(*global_keys)
+    finally:
+        __advisory_unlock(*workspace_keys)
+
+
+def enqueue_accounting_exports(
+    workspace_id: int,
+    accounting_exports: List[AccountingExport],
+    export_type: str,
+    is_auto_export: bool,
+    interval_hours: int
+) -> List[AccountingExport]:
+    """
+    Move the accounting exports to ENQUEUED in bulk, skipping the ones failing repeatedly
+    Runs a constant number of queries however many accounting exports are enqueued
+    :param workspace_id: Workspace id
+    :param accounting_exports: accounting exports to enqueue
+    :param export_type: type of the export
+    :param is_auto_export: Is auto export
+    :param interval_hours: Interval hours
+    :return: enqueued accounting exports
+    """
+    accounting_exports = list(accounting_exports)
+
+    # The oldest unresolved error of every accounting export
+    errors = {}
+    for error in Error.objects.filter(
+        workspace_id=workspace_id, is_resolved=False, accounting_export_id__in=[accounting_export.id for accounting_export in accounting_exports]
+    ).order_by('id'):
+        errors.setdefault(error.accounting_export_id, error)
+
+    accounting_exports_to_export = []
+
+    for accounting_export in accounting_exports:
+        error = errors.get(accounting_export.id)
+        skip_export = validate_failing_export(is_auto_export, interval_hours, error)
+        if skip_export:
+            logger.info('Skipping expense group %s as it has %s errors', accounting_export.id, error.repetition_count)
+            continue
+
+        accounting_export.status = 'ENQUEUED'
+        accounting_export.type = export_type
+        accounting_exports_to_export.append(accounting_export)
+
+    if accounting_exports_to_export:
+        bulk_update_accounting_export_status(
+            workspace_id, [accounting_export.id for accounting_export in accounting_exports_to_export], 'ENQUEUED', type=export_type
+        )
+
+    return accounting_exports_to_export
+
+
+def get_export_lanes(accounting_exports: List[AccountingExport], concurrency: int) -> List[List[AccountingExport]]:
+    """
+    Split accounting exports round robin into lanes which run in parallel
+    :param accounting_exports: accounting exports
+    :param concurrency: maximum number of lanes
+    :return: lanes of accounting exports
+    """
+    lane_count = max(min(concurrency, len(accounting_exports)), 1)
+
+    return [lane for lane in (accounting_exports[index::lane_count] for index in range(lane_count)) if lane]
+
+
+def schedule_accounting_exports(workspace_id: int, accounting_exports: List[AccountingExport], export_task: str):
+    """
+    Sync dimensions and then fan the accounting exports out to the qcluster workers
+    :param workspace_id: Workspace id
+    :param accounting_exports: accounting exports to export
+    :param export_task: dotted path of the export task
+    """
+    fyle_credentials = FyleCredential.objects.filter(workspace_id=workspace_id).first()
+
+    chain = Chain()
+    chain.append('apps.fyle.helpers.sync_dimensions', fyle_credentials)
+
+    if accounting_exports:
+        chain.append(
+            'apps.business_central.exports.queues.start_export_lanes',
+            workspace_id,
+            get_export_lanes(accounting_exports, settings.EXPORT_CONCURRENCY_PER_WORKSPACE),
+            export_task
+        )
+
+    if chain.length() > 1:
+        chain.run()
+
+
+def start_export_lanes(workspace_id: int, lanes: List[List[AccountingExport]], export_task: str):
+    """
+    Run every lane of accounting exports as a task of its own
+    :param workspace_id: Workspace id
+    :param lanes: lanes of accounting exports
+    :param export_task: dotted path of the export task
+    """
+    lanes_key = 'export_lanes_{0}_{1}'.format(workspace_id, uuid.uuid4().hex)
+    cache.set(lanes_key, len(lanes), EXPORT_LANES_TIMEOUT)
+
+    for lane in lanes:
+        async_task(
+            'apps.business_central.exports.queues.run_export_lane',
+            workspace_id,
+            export_task,
+            [accounting_export.id for accounting_export in lane],
+            lanes_key
+        )
+
+
+def run_export_lane(workspace_id: int, export_task: str, accounting_export_ids: List[int], lanes_key: str):
+    """
+    Export the next accounting export of a lane once the workspace and global caps allow it, then enqueue the rest of the lane
+    A lane finding no free slot is scheduled again instead of holding the worker while it waits
+    :param workspace_id: Workspace id
+    :param export_task: dotted path of the export task
+    :param accounting_export_ids: accounting export ids left in the lane
+    :param lanes_key: cache key counting the unfinished lanes of the batch
+    """
+    if not accounting_export_ids:
+        complete_export_lane(workspace_id, lanes_key)
+        return
+
+    acquired = False
+
+    try:
+        with export_slot(workspace_id) as acquired:
+            if acquired:
+                accounting_export = AccountingExport.objects.get(id=accounting_export_ids[0])
+                import_string(export_task)(accounting_export, False)
+    finally:
+        # The lane moves on even if the export raised, so the last lane always completes the batch
+        if acquired:
+            async_task('apps.business_central.exports.queues.run_export_lane', workspace_id, export_task, accounting_export_ids[1:], lanes_key)
+        else:
+            schedule(
+                'apps.business_central.exports.queues.run_export_lane',
+                workspace_id,
+                export_task,
+                accounting_export_ids,
+                lanes_key,
+                schedule_type=Schedule.ONCE,
+                next_run=timezone.now() + timedelta(seconds=EXPORT_SLOT_RETRY_DELAY)
+            )
+
+
+def complete_export_lane(workspace_id: int, lanes_key: str):
+    """
+    Count a finished lane and update the accounting export summary once the last lane of the batch finishes
+    The summary is updated even if some exports of the batch are stuck, the reconcile schedule corrects any drift
+    :param workspace_id: Workspace id
+    :param lanes_key: cache key counting the unfinished lanes of the batch
+    """
+    with transaction.atomic():
+        # Lanes are serialised on the summary row, so the count is never decremented twice at once
+        AccountingExportSummary.objects.select_for_update().filter(workspace_id=workspace_id).first()
+
+        remaining_lanes = cache.get(lanes_key)
+
+        if remaining_lanes and remaining_lanes > 1:
+            cache.set(lanes_key, remaining_lanes - 1, EXPORT_LANES_TIMEOUT)
+            return
+
+        cache.delete(lanes_key)
+
+    update_accounting_export_summary(workspace_id)
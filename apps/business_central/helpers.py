@@ -1,7 +1,12 @@
 
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Dict
 
+from django.conf import settings
+from django.db import connection
 from django.utils.module_loading import import_string
 
 from apps.workspaces.models import BusinessCentralCredentials, Workspace
@@ -12,14 +17,14 @@ logger.level = logging.INFO
 
 # Import your Workspace and BusinessCentralCredentials models here
 # Also, make sure you have 'logger' defined and imported from a logging module
-def check_interval_and_sync_dimension(workspace: Workspace, business_central_credential: BusinessCentralCredentials) -> bool:
+def check_interval_and_sync_dimension(workspace: Workspace, business_central_credential: BusinessCentralCredentials) -> Dict[str, Dict]:
     """
     Check the synchronization interval and trigger dimension synchronization if needed.
 
     :param workspace: Workspace Instance
     :param business_central_credential: BusinessCentralCredentials Instance
 
-    :return: True if synchronization is triggered, False if not
+    :return: duration and error of the sync of every dimension if synchronization is triggered, None if not
     """
 
     if workspace.destination_synced_at:
@@ -28,20 +33,46 @@ def check_interval_and_sync_dimension(workspace: Workspace, business_central_cre
 
     if workspace.destination_synced_at is None or time_interval.days > 0:
         # If destination_synced_at is None or the time interval is greater than 0 days, trigger synchronization
-        sync_dimensions(business_central_credential, workspace.id)
-        return True
+        return sync_dimensions(business_central_credential, workspace.id)
 
-    return False
+    return None
 
 
-def sync_dimensions(business_central_credential: BusinessCentralCredentials, workspace_id: int) -> None:
+def sync_dimension(business_central_connection, dimension: str) -> Dict:
+    """
+    Sync a dimension on a worker thread, isolating its failure from the other dimensions
+    :param business_central_connection: Business Central Connection
+    :param dimension: dimension name
+    :return: duration in seconds and error of the sync
+    """
+    started_at = time.monotonic()
+    error = None
+
+    try:
+        # Dynamically call the sync method based on the dimension
+        getattr(business_central_connection, 'sync_{}'.format(dimension))()
+    except Exception as exception:
+        # Log any exceptions that occur during synchronization
+        logger.info(exception)
+        error = str(exception)
+    finally:
+        # Every worker thread opens a database connection of its own
+        connection.close()
+
+    return {'duration': round(time.monotonic() - started_at, 3), 'error': error}
+
+
+def sync_dimensions(business_central_credential: BusinessCentralCredentials, workspace_id: int) -> Dict[str, Dict]:
     """
     Synchronize various dimensions with Business Central using the provided credentials.
 
     :param business_central_credential: BusinessCentralCredentials Instance
     :param workspace_id: ID of the workspace
 
-    This function syncs dimensions like accounts, vendors, commitments, jobs, categories, and cost codes.
+    This function syncs dimensions like companies, accounts, vendors, employees, locations, bank accounts and dimensions.
+    The dimensions are independent of each other, so they are synced concurrently over the shared rate limited connection.
+
+    :return: duration in seconds and error of the sync of every dimension
     """
 
     # Initialize the Business Central connection using the provided credentials and workspace ID
@@ -50,11 +81,11 @@ def sync_dimensions(business_central_credential: BusinessCentralCredentials, wor
     # List of dimensions to sync
     dimensions = ['companies', 'accounts', 'vendors', 'employees', 'locations', 'bank_accounts', 'dimensions']
 
-    for dimension in dimensions:
-        try:
-            # Dynamically call the sync method based on the dimension
-            sync = getattr(business_central_connection, 'sync_{}'.format(dimension))
-            sync()
-        except Exception as exception:
-            # Log any exceptions that occur during synchronization
-            logger.info(exception)
+    with ThreadPoolExecutor(max_workers=settings.SYNC_DIMENSIONS_CONCURRENCY) as executor:
+        results = dict(zip(dimensions, executor.map(
+            lambda dimension: sync_dimension(business_central_connection, dimension), dimensions
+        )))
+
+    logger.info('Synced dimensions of workspace %s: %s', workspace_id, results)
+
+    return results
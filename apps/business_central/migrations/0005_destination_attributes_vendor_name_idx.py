@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built concurrently, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('business_central', '0004_journalentrylineitems_dimension_success_log_and_more'),
+        ('fyle_accounting_mappings', '0027_alter_employeemapping_source_employee'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS destination_attributes_vendor_name_idx
+                ON destination_attributes (workspace_id, lower(btrim(regexp_replace(value, '\\s+', ' ', 'g'))))
+                WHERE attribute_type = 'VENDOR';
+            """,
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS destination_attributes_vendor_name_idx;'
+        )
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built concurrently, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('business_central', '0005_destination_attributes_vendor_name_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS destination_attributes_value_idx
+                ON destination_attributes (workspace_id, attribute_type, value, id);
+            """,
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS destination_attributes_value_idx;'
+        )
+    ]
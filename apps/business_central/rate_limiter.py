@@ -0,0 +1,233 @@
+import copy
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from dynamics.apis.api_base import ApiBase
+from dynamics.exceptions.dynamics_exceptions import (
+    DynamicsError,
+    ExpiredTokenError,
+    InternalServerError,
+    InvalidTokenError,
+    NoPrivilegeError,
+    NotFoundItemError,
+    WrongParamsError
+)
+
+logger = logging.getLogger(__name__)
+logger.level = logging.INFO
+
+# Business Central allows 600 requests a minute per environment and company
+RATE_LIMIT_REQUESTS_PER_SECOND = 10
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_MIN_REQUESTS_PER_SECOND = 0.5
+RATE_LIMIT_RECOVERY_STEP = 0.1
+RATE_LIMIT_MAX_RETRIES = 5
+RATE_LIMIT_BACKOFF_SECONDS = 2
+# Throttled requests are counted in a one minute window, the backoffs of a call add up to just past it
+# and a single backoff never waits longer than the window itself
+RATE_LIMIT_WINDOW_SECONDS = 60
+RATE_LIMIT_MAX_BACKOFF_SECONDS = RATE_LIMIT_WINDOW_SECONDS
+# A call stops retrying once its retries would take longer than this, well within the qcluster timeout
+RATE_LIMIT_MAX_RETRY_SECONDS = 120
+
+THROTTLED_STATUS_CODES = [429, 503]
+# A 503 may come after Business Central processed the request, so only reads are retried on it
+# and calls changing data, such as posts and $batch requests, are retried on 429 alone
+WRITE_THROTTLED_STATUS_CODES = [429]
+READ_METHOD_PREFIXES = ('get', 'count')
+
+
+# Status codes the SDK raises a dedicated exception for, every other failed response is a bare DynamicsError
+EXCEPTION_STATUS_CODES = {
+    WrongParamsError: 400,
+    InvalidTokenError: 401,
+    NoPrivilegeError: 403,
+    NotFoundItemError: 404,
+    ExpiredTokenError: 498,
+    InternalServerError: 500
+}
+
+
+def get_status_code(exception: DynamicsError):
+    """
+    Get the HTTP status code of a failed Business Central response
+    The SDK keeps no status code on its exceptions, a bare DynamicsError carries it as 'Error: <status code>'
+    :param exception: Dynamics exception
+    :return: status code or None
+    """
+    if type(exception) in EXCEPTION_STATUS_CODES:
+        return EXCEPTION_STATUS_CODES[type(exception)]
+
+    match = re.fullmatch(r'Error: (\d{3})', str(exception.message))
+
+    return int(match.group(1)) if match else None
+
+
+def get_retry_after(attempt: int) -> float:
+    """
+    Get the seconds to wait before retrying a throttled request, backing off exponentially up to the throttle window
+    The SDK keeps only the text of failed responses, so a Retry-After header is never available here
+    :param attempt: number of the failed attempt, starting at 0
+    :return: seconds to wait
+    """
+    return min(RATE_LIMIT_BACKOFF_SECONDS * (2 ** attempt), RATE_LIMIT_MAX_BACKOFF_SECONDS)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every connection of a Business Central environment and company in this process
+    The rate is halved whenever Business Central throttles and creeps back up with every success
+    """
+
+    # Limiters of the tenants called by this process, keyed by (environment, company id)
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    # Business Central calls made by this process, retries included
+    _call_count = 0
+
+    def __init__(self, requests_per_second: float = RATE_LIMIT_REQUESTS_PER_SECOND, burst: int = RATE_LIMIT_BURST):
+        self.max_requests_per_second = requests_per_second
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_call_count(cls) -> int:
+        """
+        Get the number of Business Central calls made by this process
+        """
+        return cls._call_count
+
+    @classmethod
+    def get_limiter(cls, environment: str, company_id: str):
+        """
+        Get the limiter of a Business Central environment and company
+        Every qcluster worker process keeps a bucket of its own, so each gets an equal share of the limit
+        :param environment: Business Central environment
+        :param company_id: Business Central company id
+        :return: RateLimiter object
+        """
+        workers = settings.Q_CLUSTER['workers']
+
+        with cls._limiters_lock:
+            if (environment, company_id) not in cls._limiters:
+                cls._limiters[(environment, company_id)] = cls(RATE_LIMIT_REQUESTS_PER_SECOND / workers, max(RATE_LIMIT_BURST // workers, 1))
+
+            return cls._limiters[(environment, company_id)]
+
+    def acquire(self):
+        """
+        Take a token of the bucket, waiting until the tokens owed by the bucket are refilled
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.requests_per_second) - 1
+            self.refilled_at = now
+
+            wait = -self.tokens / self.requests_per_second
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        """
+        Raise the rate back towards the limit after a successful call
+        """
+        with self.lock:
+            self.requests_per_second = min(self.max_requests_per_second, self.requests_per_second + RATE_LIMIT_RECOVERY_STEP)
+
+    def on_throttle(self, retry_after: float):
+        """
+        Halve the rate and hold every caller of the bucket back for retry_after seconds
+        :param retry_after: seconds to wait
+        """
+        with self.lock:
+            self.requests_per_second = max(RATE_LIMIT_MIN_REQUESTS_PER_SECOND, self.requests_per_second / 2)
+            self.tokens = min(self.tokens, 0) - retry_after * self.requests_per_second
+
+    def call(self, func, *args, retry_status_codes: list = THROTTLED_STATUS_CODES, **kwargs):
+        """
+        Call a Business Central API once the bucket allows it, retrying throttled calls
+        Retries stop after RATE_LIMIT_MAX_RETRIES attempts or RATE_LIMIT_MAX_RETRY_SECONDS, whichever comes first
+        :param func: API method
+        :param retry_status_codes: throttled status codes the call is retried on
+        :return: API response
+        """
+        started_at = time.monotonic()
+
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire()
+
+            with RateLimiter._limiters_lock:
+                RateLimiter._call_count += 1
+
+            try:
+                response = func(*args, **kwargs)
+            except DynamicsError as exception:
+                status_code = get_status_code(exception)
+
+                if status_code not in retry_status_codes or attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise
+
+                retry_after = get_retry_after(attempt)
+
+                if time.monotonic() - started_at + retry_after > RATE_LIMIT_MAX_RETRY_SECONDS:
+                    logger.info('Business Central throttled %s with status %s past the retry time limit', getattr(func, '__name__', func), status_code)
+                    raise
+
+                logger.info('Business Central throttled %s with status %s, retrying in %s seconds', getattr(func, '__name__', func), status_code, retry_after)
+                self.on_throttle(retry_after)
+                continue
+
+            self.on_success()
+            return response
+
+
+class RateLimitedApi:
+    """
+    Dynamics API object whose methods are called through a rate limiter
+    """
+
+    def __init__(self, api: ApiBase, limiter: RateLimiter):
+        self._api = api
+        self._limiter = limiter
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._api, name)
+
+        if callable(attribute):
+            retry_status_codes = THROTTLED_STATUS_CODES if name.startswith(READ_METHOD_PREFIXES) else WRITE_THROTTLED_STATUS_CODES
+
+            def rate_limited_call(*args, **kwargs):
+                # The SDK keeps request state on API objects, such as the company appended to the batch URL
+                # by every bulk post, so each call is made on a copy of the API object
+                return self._limiter.call(getattr(copy.copy(self._api), name), *args, retry_status_codes=retry_status_codes, **kwargs)
+
+            return rate_limited_call
+
+        return attribute
+
+
+class RateLimitedConnection:
+    """
+    Dynamics connection whose API objects are called through a rate limiter
+    """
+
+    def __init__(self, connection, limiter: RateLimiter):
+        self._connection = connection
+        self._limiter = limiter
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._connection, name)
+
+        if isinstance(attribute, ApiBase):
+            attribute = RateLimitedApi(attribute, self._limiter)
+            setattr(self, name, attribute)
+
+        return attribute
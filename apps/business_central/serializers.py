@@ -21,6 +21,9 @@ class ImportBusinessCentralAttributesSerializer(serializers.Serializer):
     Import Business Central Attributes serializer
     """
 
+    # Duration and error of the sync of every dimension, empty when no sync was due
+    dimensions = serializers.DictField(read_only=True)
+
     def create(self, validated_data):
         try:
             # Get the workspace ID from the URL kwargs
@@ -35,17 +38,26 @@ class ImportBusinessCentralAttributesSerializer(serializers.Serializer):
 
             if refresh_dimension:
                 # If 'refresh' is true, perform a full sync of dimensions
-                sync_dimensions(business_central_credentials, workspace.id)
+                dimensions = sync_dimensions(business_central_credentials, workspace.id)
             else:
                 # If 'refresh' is false, check the interval and sync dimension accordingly
-                check_interval_and_sync_dimension(workspace, business_central_credentials)
+                dimensions = check_interval_and_sync_dimension(workspace, business_central_credentials) or {}
+
+            # Nothing was synced when every dimension failed, so the workspace is not marked as synced
+            if dimensions and all(result['error'] for result in dimensions.values()):
+                raise serializers.ValidationError(
+                    {'message': 'Failed to sync Business Central dimensions', 'dimensions': dimensions}
+                )
 
             # Update the destination_synced_at field and save the workspace
             workspace.destination_synced_at = datetime.now()
             workspace.save(update_fields=['destination_synced_at'])
 
-            # Return a success response
-            return Response(status=status.HTTP_200_OK)
+            # Return the result of the sync of every dimension
+            return {'dimensions': dimensions}
+
+        except serializers.ValidationError:
+            raise
 
         except BusinessCentralCredentials.DoesNotExist:
             # Handle the case when business central credentials are not found or invalid
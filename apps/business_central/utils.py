@@ -1,8 +1,12 @@
 import base64
+import itertools
 import logging
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import Dict, List
 
+from django.db import transaction
 from django.utils import timezone
 from dynamics.core.client import Dynamics
 from fyle_accounting_mappings.models import DestinationAttribute
@@ -10,20 +14,26 @@ from openpyxl.utils.escape import unescape
 
 from apps.business_central.exports.journal_entry.models import JournalEntryLineItems
 from apps.business_central.exports.purchase_invoice.models import PurchaseInvoiceLineitems
-from apps.workspaces.models import BusinessCentralCredentials, ExportSetting, Workspace
+from apps.business_central.rate_limiter import RateLimitedConnection, RateLimiter
+from apps.workspaces.models import BusinessCentralCredentials, DestinationSyncWatermark, ExportSetting, Workspace
 from ms_business_central_api import settings
+from ms_business_central_api.exceptions import PageShiftError
 
 logger = logging.getLogger(__name__)
 logger.level = logging.INFO
 
-SYNC_UPPER_LIMIT = {
-    'accounts': 2000,
-    'vendors': 10000,
-    'locations': 1000,
-    'bank_accounts':2000,
-    'dimension_values': 1000,
-    'dimensions': 1000
-}
+# Records fetched from Business Central in a page, and destination attributes upserted in a chunk, during a sync
+SYNC_PAGE_SIZE = 1000
+SYNC_CHUNK_SIZE = 500
+
+# Maximum number of operations Business Central accepts in a $batch request
+DIMENSION_LINES_BATCH_SIZE = 100
+
+# Delta syncs cannot see records deleted in Business Central, a full sync catches them once in a while
+FULL_SYNC_INTERVAL = timedelta(days=7)
+
+# Business Central access tokens live for an hour, cached connections are refreshed a little before that
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=55)
 
 
 class BusinessCentralConnector:
@@ -31,26 +41,69 @@ class BusinessCentralConnector:
     Business Central Utility Functions
     """
 
+    # Dynamics connections of the workspaces served by this process, keyed by workspace id
+    _connections = {}
+    _workspace_locks = {}
+    _workspace_locks_lock = threading.Lock()
+
     def __init__(self, credentials_object: BusinessCentralCredentials, workspace_id: int):
-        client_id = settings.BUSINESS_CENTRAL_CLIENT_ID
-        client_secret = settings.BUSINESS_CENTRAL_CLIENT_SECRET
-        environment = credentials_object.environment
-        refresh_token = credentials_object.refresh_token
+        self.connection = self.get_connection(credentials_object, workspace_id)
+        self.workspace_id = workspace_id
+
+    @classmethod
+    def get_connection(cls, credentials_object: BusinessCentralCredentials, workspace_id: int) -> RateLimitedConnection:
+        """
+        Get the Dynamics connection of a workspace, the access token is reused until shortly before it expires
+        Refreshes are serialised by a per workspace lock within the process and a row lock on the credentials across processes
+        :param credentials_object: Business Central credentials
+        :param workspace_id: Workspace id
+        :return: rate limited Dynamics connection
+        """
+        with cls._workspace_locks_lock:
+            workspace_lock = cls._workspace_locks.setdefault(workspace_id, threading.Lock())
 
         business_central_company_id = credentials_object.workspace.business_central_company_id
+        signature = (credentials_object.environment, business_central_company_id)
+
+        with workspace_lock:
+            cached_connection = cls._connections.get(workspace_id)
+
+            if not cached_connection or cached_connection['expires_at'] <= timezone.now() or cached_connection['signature'] != signature:
+                with transaction.atomic():
+                    # Another worker may have exchanged the refresh token already, so read it under the lock
+                    credentials = BusinessCentralCredentials.objects.select_for_update().get(id=credentials_object.id)
+
+                    connection = Dynamics(
+                        environment=credentials.environment,
+                        client_id=settings.BUSINESS_CENTRAL_CLIENT_ID,
+                        client_secret=settings.BUSINESS_CENTRAL_CLIENT_SECRET,
+                        refresh_token=credentials.refresh_token,
+                        company_id=business_central_company_id
+                    )
 
-        self.connection = Dynamics(
-            environment=environment,
-            client_id=client_id,
-            client_secret=client_secret,
-            refresh_token=refresh_token,
-            company_id=business_central_company_id
-        )
+                    credentials.refresh_token = connection.refresh_token
+                    credentials.save()
 
-        self.workspace_id = workspace_id
+                credentials_object.refresh_token = credentials.refresh_token
 
-        credentials_object.refresh_token = self.connection.refresh_token
-        credentials_object.save()
+                cached_connection = cls._connections[workspace_id] = {
+                    'connection': connection,
+                    # Calls of every connection to the same tenant share one token bucket
+                    'limiter': RateLimiter.get_limiter(credentials.environment, business_central_company_id),
+                    'signature': signature,
+                    'expires_at': timezone.now() + ACCESS_TOKEN_LIFETIME
+                }
+
+        # Every connector calls through its own wrapper, which never changes the state of the cached API objects
+        return RateLimitedConnection(cached_connection['connection'], cached_connection['limiter'])
+
+    @classmethod
+    def clear_connection(cls, workspace_id: int):
+        """
+        Drop the cached connection of a workspace
+        :param workspace_id: Workspace id
+        """
+        cls._connections.pop(workspace_id, None)
 
     def _create_destination_attribute(self, attribute_type, display_name, value, destination_id, active, detail):
         """
@@ -72,33 +125,66 @@ class BusinessCentralConnector:
             'detail': detail
         }
 
-    def is_sync_allowed(self, attribute_type: str, attribute_count: int):
+    def _get_records(self, get_all, *args, order_by: str = 'id', detect_shifts: bool = False, **kwargs):
         """
-        Checks if the sync is allowed
-
-        Returns:
-            bool: True
+        Get the records of a Business Central API page by page, so they never sit in memory all at once
+        Pages are taken in a fixed order, so every record is returned once unless records are added or deleted meanwhile
+        :param get_all: API method getting the records
+        :param order_by: $orderby of the pages
+        :param detect_shifts: Fetch every page after the first along with the last record of the page before it,
+            raising PageShiftError if that record moved because records were added or deleted meanwhile
+        :return: generator of records
         """
-        if attribute_count > SYNC_UPPER_LIMIT[attribute_type]:
-            workspace_created_at = Workspace.objects.get(id=self.workspace_id).created_at
-            if workspace_created_at > timezone.make_aware(datetime(2024, 10, 1), timezone.get_current_timezone()):
-                return False
+        skip = 0
+        last_record = None
+
+        while True:
+            if last_record is None:
+                records = get_all(*args, **kwargs, **{'$orderby': order_by, '$top': SYNC_PAGE_SIZE, '$skip': skip})
             else:
-                return True
+                records = get_all(*args, **kwargs, **{'$orderby': order_by, '$top': SYNC_PAGE_SIZE + 1, '$skip': skip - 1})
 
-        return True
+                if not records or records[0]['id'] != last_record['id']:
+                    raise PageShiftError('Records were added or deleted while reading page {0}'.format(skip // SYNC_PAGE_SIZE + 1))
 
-    def _sync_data(self, data, attribute_type, display_name, workspace_id, field_names):
+                records = records[1:]
+
+            yield from records
+
+            if len(records) < SYNC_PAGE_SIZE:
+                return
+
+            skip += SYNC_PAGE_SIZE
+
+            if detect_shifts:
+                last_record = records[-1]
+
+    def _bulk_upsert_destination_attributes(self, destination_attributes, attribute_type, update=False) -> List[str]:
         """
-        Synchronize data from MS Dynamics SDK to your application
-        :param data: Data to synchronize
+        Create or update destination attributes in fixed size chunks
+        :param destination_attributes: iterable of destination attributes
+        :param attribute_type: Type of the attribute
+        :param update: Update pre-existing attributes or not
+        :return: destination ids of the attributes
+        """
+        destination_attributes = iter(destination_attributes)
+        destination_ids = []
+
+        for chunk in iter(lambda: list(itertools.islice(destination_attributes, SYNC_CHUNK_SIZE)), []):
+            DestinationAttribute.bulk_create_or_update_destination_attributes(chunk, attribute_type, self.workspace_id, update)
+            destination_ids.extend(attribute['destination_id'] for attribute in chunk)
+
+        return destination_ids
+
+    def _get_destination_attributes(self, data, attribute_type, display_name, field_names):
+        """
+        Construct the destination attributes of MS Dynamics records
+        :param data: Records to construct from
         :param attribute_type: Type of the attribute
         :param display_name: Display name for the data
-        :param workspace_id: ID of the workspace
         :param field_names: Names of fields to include in detail
+        :return: generator of destination attributes
         """
-
-        destination_attributes = []
         for item in data:
             value = None
             if 'displayName' in item and item['displayName']:
@@ -121,70 +207,136 @@ class BusinessCentralConnector:
                         detail['category'] = unescape(detail['category'])
                 if item.get('accountType') != 'Posting' or not item.get('directPosting'):
                     continue
-            destination_attributes.append(self._create_destination_attribute(
+            yield self._create_destination_attribute(
                 attribute_type,
                 display_name,
                 value,
                 item['number'] if item.get('number') else item['id'],
                 active,
                 detail
-            ))
-        DestinationAttribute.bulk_create_or_update_destination_attributes(
-            destination_attributes, attribute_type, workspace_id, True)
+            )
+
+    def _sync_data(self, data, attribute_type, display_name, workspace_id, field_names):
+        """
+        Synchronize data from MS Dynamics SDK to your application
+        The data is consumed as it arrives and upserted in chunks, so memory and transaction size stay constant
+        :param data: Data to synchronize, any iterable of records
+        :param attribute_type: Type of the attribute
+        :param display_name: Display name for the data
+        :param workspace_id: ID of the workspace
+        :param field_names: Names of fields to include in detail
+        :return: destination ids of the synced attributes
+        """
+        return self._bulk_upsert_destination_attributes(
+            self._get_destination_attributes(data, attribute_type, display_name, field_names), attribute_type, True
+        )
+
+    def _track_last_modified_at(self, data, watermark: DestinationSyncWatermark):
+        """
+        Pass records through, moving the watermark to the latest lastModifiedDateTime among them
+        :param data: Records
+        :param watermark: DestinationSyncWatermark object
+        :return: generator of records
+        """
+        for item in data:
+            if item.get('lastModifiedDateTime'):
+                modified_at = datetime.fromisoformat(item['lastModifiedDateTime'])
+                if not watermark.last_modified_at or modified_at > watermark.last_modified_at:
+                    watermark.last_modified_at = modified_at
+
+            yield item
+
+    def _sync_modified_data(self, api, attribute_type, display_name, field_names):
+        """
+        Synchronize the records modified since the last sync, or every record when a full sync is due
+        A full sync also deactivates the attributes whose records were deleted in Business Central
+        :param api: Dynamics API of the records
+        :param attribute_type: Type of the attribute
+        :param display_name: Display name for the data
+        :param field_names: Names of fields to include in detail, lastModifiedDateTime included
+        """
+        watermark, _ = DestinationSyncWatermark.objects.get_or_create(workspace_id=self.workspace_id, attribute_type=attribute_type)
+
+        is_full_sync = not watermark.last_modified_at or not watermark.last_full_sync_at or \
+            watermark.last_full_sync_at < timezone.now() - FULL_SYNC_INTERVAL
+
+        if is_full_sync:
+            data = self._get_records(api.get_all, detect_shifts=True)
+        else:
+            # Records modified at the watermark itself are synced again, which is harmless
+            data = self._get_records(api.get_all, order_by='lastModifiedDateTime,id', **{'$filter': 'lastModifiedDateTime ge {0}'.format(
+                watermark.last_modified_at.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            )})
+
+        # An error interrupting the records raises here, before anything is deactivated or the watermark is saved
+        try:
+            destination_ids = self._sync_data(
+                self._track_last_modified_at(data, watermark), attribute_type, display_name, self.workspace_id, field_names
+            )
+        except PageShiftError as exception:
+            # A read missing records would deactivate them, the full sync is left due and runs again with the next sync
+            logger.warning(
+                'Skipping deactivation of %s for workspace %s as the full sync was incomplete: %s', attribute_type, self.workspace_id, exception.message
+            )
+            return
+
+        if is_full_sync:
+            # Every record was read in a consistent order, so whatever is missing was deleted in Business Central
+            DestinationAttribute.objects.filter(
+                workspace_id=self.workspace_id, attribute_type=attribute_type, active=True
+            ).exclude(destination_id__in=destination_ids).update(active=False, updated_at=timezone.now())
+
+            watermark.last_full_sync_at = timezone.now()
+
+        watermark.save()
 
     def sync_bank_accounts(self):
         """
         sync business central bank accounts
         """
-        attribute_count = self.connection.bank_accounts.count()
-        if not self.is_sync_allowed(attribute_type = 'bank_accounts', attribute_count=attribute_count):
-            logger.info('Skipping sync of bank accounts for workspace %s as it has %s counts which is over the limit', self.workspace_id, attribute_count)
-            return
-        bank_accounts = self.connection.bank_accounts.get_all()
         field_names = ['currencyCode', 'intercompanyEnabled', 'number']
 
-        self._sync_data(bank_accounts, 'BANK_ACCOUNT', 'bank_account', self.workspace_id, field_names)
+        self._sync_data(self._get_records(self.connection.bank_accounts.get_all), 'BANK_ACCOUNT', 'bank_account', self.workspace_id, field_names)
         return []
 
+    def _get_dimension_attributes(self, dimension, dimension_values):
+        """
+        Construct the destination attributes of the values of a dimension
+        :param dimension: Business Central dimension
+        :param dimension_values: values of the dimension
+        :return: generator of destination attributes
+        """
+        for value in dimension_values:
+            detail = {'dimension_id': dimension['id'], 'code': value['code']}
+            yield {
+                'attribute_type': dimension['code'],
+                'display_name': dimension['displayName'],
+                'value': value['displayName'],
+                'destination_id': value['id'],
+                'detail': detail,
+                'active': True,
+            }
+
     def sync_dimensions(self):
         """
         sync business central dimensions
         """
+        dimensions = list(self._get_records(self.connection.dimensions.get_all_dimensions))
+        concurrency = settings.SYNC_DIMENSIONS_CONCURRENCY
 
-        attribute_count = self.connection.dimensions.count()
-        if not self.is_sync_allowed(attribute_type = 'dimensions', attribute_count=attribute_count):
-            logger.info('Skipping sync of dimensions for workspace %s as it has %s counts which is over the limit', self.workspace_id, attribute_count)
-            return
-        dimensions = self.connection.dimensions.get_all_dimensions()
-        for dimension in dimensions:
-            dimension_attributes = []
-            dimension_id = dimension['id']
-            dimension_name = dimension['code']
-
-            attribute_count = self.connection.dimensions.count_dimension_values(dimension_id)
-            if not self.is_sync_allowed(attribute_type = 'dimension_values', attribute_count=attribute_count):
-                logger.info('Skipping sync of dimension_values %s for workspace %s as it has %s counts which is over the limit', dimension_name, self.workspace_id, attribute_count)
-                continue
+        # Values of a window of dimensions are fetched concurrently and saved on this thread before the next window is fetched
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(dimensions) or 1)) as executor:
+            for index in range(0, len(dimensions), concurrency):
+                window = dimensions[index:index + concurrency]
 
-            dimension_values = self.connection.dimensions.get_all_dimension_values(
-                dimension_id
-            )
-            for value in dimension_values:
-                detail = {'dimension_id': dimension_id, 'code': value['code']}
-                dimension_attributes.append(
-                    {
-                        'attribute_type': dimension_name,
-                        'display_name': dimension['displayName'],
-                        'value': value['displayName'],
-                        'destination_id': value['id'],
-                        'detail': detail,
-                        'active': True,
-                    }
+                all_dimension_values = executor.map(
+                    lambda dimension: list(self._get_records(self.connection.dimensions.get_all_dimension_values, dimension['id'])), window
                 )
 
-            DestinationAttribute.bulk_create_or_update_destination_attributes(
-                dimension_attributes, dimension_name, self.workspace_id
-            )
+                for dimension, dimension_values in zip(window, all_dimension_values):
+                    self._bulk_upsert_destination_attributes(
+                        self._get_dimension_attributes(dimension, dimension_values), dimension['code']
+                    )
 
         return []
 
@@ -192,38 +344,27 @@ class BusinessCentralConnector:
         """
         sync business central companies
         """
-        companies = self.connection.companies.get_all()
         field_names = []
 
-        self._sync_data(companies, 'COMPANY', 'company', self.workspace_id, field_names)
+        self._sync_data(self._get_records(self.connection.companies.get_all), 'COMPANY', 'company', self.workspace_id, field_names)
         return []
 
     def sync_accounts(self):
         """
         Synchronize accounts from MS Dynamics SDK to your application
         """
-        attribute_count = self.connection.accounts.count()
-        if not self.is_sync_allowed(attribute_type = 'accounts', attribute_count=attribute_count):
-            logger.info('Skipping sync of accounts for workspace %s as it has %s counts which is over the limit', self.workspace_id, attribute_count)
-            return
         field_names = ['category', 'subCategory', 'accountType', 'directPosting', 'lastModifiedDateTime']
 
-        accounts = self.connection.accounts.get_all()
-        self._sync_data(accounts, 'ACCOUNT', 'accounts', self.workspace_id, field_names)
+        self._sync_modified_data(self.connection.accounts, 'ACCOUNT', 'accounts', field_names)
         return []
 
     def sync_vendors(self):
         """
         Synchronize vendors from MS Dynamics SDK to your application
         """
-        attribute_count = self.connection.vendors.count()
-        if not self.is_sync_allowed(attribute_type = 'vendors', attribute_count=attribute_count):
-            logger.info('Skipping sync of vendors for workspace %s as it has %s counts which is over the limit', self.workspace_id, attribute_count)
-            return
         field_names = ['email', 'currencyId', 'currencyCode', 'lastModifiedDateTime']
 
-        vendors = self.connection.vendors.get_all()
-        self._sync_data(vendors, 'VENDOR', 'vendor', self.workspace_id, field_names)
+        self._sync_modified_data(self.connection.vendors, 'VENDOR', 'vendor', field_names)
         return []
 
     def sync_employees(self):
@@ -232,22 +373,16 @@ class BusinessCentralConnector:
         """
         field_names = ['email', 'personalEmail', 'lastModifiedDateTime']
 
-        employees = self.connection.employees.get_all()
-        self._sync_data(employees, 'EMPLOYEE', 'employee', self.workspace_id, field_names)
+        self._sync_modified_data(self.connection.employees, 'EMPLOYEE', 'employee', field_names)
         return []
 
     def sync_locations(self):
         """
         Synchronize locations from MS Dynamics SDK to your application
         """
-        attribute_count = self.connection.locations.count()
-        if not self.is_sync_allowed(attribute_type = 'locations', attribute_count = attribute_count):
-            logger.info('Skipping sync of locations for workspace %s as it has %s counts which is over the limit', self.workspace_id, attribute_count)
-            return
         field_names = ['code', 'city', 'country']
 
-        locations = self.connection.locations.get_all()
-        self._sync_data(locations, 'LOCATION', 'location', self.workspace_id, field_names)
+        self._sync_data(self._get_records(self.connection.locations.get_all), 'LOCATION', 'location', self.workspace_id, field_names)
         return []
 
     def get_companies(self):
@@ -284,14 +419,27 @@ class BusinessCentralConnector:
 
         return bulk_post_response
 
-    def post_purchase_invoice(self, purchase_invoice_payload, purchase_invoice_lineitem_payload):
+    def post_purchase_invoice_header(self, purchase_invoice_payload):
         """
-        Post purchase invoice to MS Dynamics SDK
+        Post purchase invoice header to MS Dynamics SDK
+        """
+        return self.connection.purchase_invoices.post(purchase_invoice_payload)
+
+    def post_purchase_invoice_lineitems(self, purchase_invoice_id, purchase_invoice_lineitem_payload):
+        """
+        Post purchase invoice line items to MS Dynamics SDK
+        Business Central deletes the purchase invoice when any of the line items is rejected
         """
         workspace = Workspace.objects.get(id=self.workspace_id)
 
-        purchase_invoice_response = self.connection.purchase_invoices.post(purchase_invoice_payload)
-        bulk_post_response = self.connection.purchase_invoice_line_items.bulk_post(purchase_invoice_response['id'], purchase_invoice_lineitem_payload, workspace.business_central_company_id)
+        return self.connection.purchase_invoice_line_items.bulk_post(purchase_invoice_id, purchase_invoice_lineitem_payload, workspace.business_central_company_id)
+
+    def post_purchase_invoice(self, purchase_invoice_payload, purchase_invoice_lineitem_payload):
+        """
+        Post purchase invoice to MS Dynamics SDK
+        """
+        purchase_invoice_response = self.post_purchase_invoice_header(purchase_invoice_payload)
+        bulk_post_response = self.post_purchase_invoice_lineitems(purchase_invoice_response['id'], purchase_invoice_lineitem_payload)
 
         response = {
             "purchase_invoice_response": purchase_invoice_response,
@@ -299,48 +447,156 @@ class BusinessCentralConnector:
         }
         return response
 
-    def post_dimension_lines(self, dimension_line_payloads: List[Dict], export_module_type: str, top_level_id: int) -> List[Dict]:
+    def __post_dimension_line(self, dimension_line_payload: Dict, export_module_type: str):
+        """
+        Post a single dimension line
+        """
+        if export_module_type == 'JOURNAL_ENTRY':
+            return self.connection.journal_line_items.post_journal_entry_dimensions(
+                journal_line_item_id=dimension_line_payload['parentId'],
+                data=dimension_line_payload
+            )
+
+        return self.connection.purchase_invoice_line_items.post_purchase_invoice_dimensions(
+            purchase_invoice_item_id=dimension_line_payload['parentId'],
+            data=dimension_line_payload
+        )
+
+    @staticmethod
+    def __post_batch(api, batch_requests: List[Dict], isolation: str) -> Dict:
+        """
+        Post a $batch request through an SDK api
+        The SDK exposes $batch only through its private _bulk_post_request, which appends ?company= to the batch url
+        stored on the api whenever a company_id is passed. No company_id is ever passed here, every request url
+        carries the company itself, so the batch url of the shared connection is never changed.
+        The rate limited api also makes the call on a copy of the SDK api.
+        :return: $batch response with a status and body per request id
+        """
+        return api._bulk_post_request(data={'requests': batch_requests}, isolation=isolation)
+
+    def __bulk_post_dimension_lines(self, dimension_line_payloads: List[Dict], export_module_type: str, company_id: str) -> List[Dict]:
+        """
+        Post dimension lines in a single $batch request
+        The batch is posted with snapshot isolation, so it is either applied or rolled back as a whole
+        :return: sub response (status and body) of every dimension line, in order
+        """
+        if export_module_type == 'JOURNAL_ENTRY':
+            api = self.connection.journal_line_items
+            url = 'companies({0})/journalLines({1})/dimensionSetLines'
+        else:
+            api = self.connection.purchase_invoice_line_items
+            url = 'companies({0})/purchaseInvoiceLines({1})/dimensionSetLines'
+
+        bulk_response = self.__post_batch(
+            api,
+            [{
+                'id': str(index),
+                'method': 'POST',
+                'url': url.format(company_id, dimension_line_payload['parentId']),
+                'headers': {
+                    'Content-Type': 'application/json'
+                },
+                'body': dimension_line_payload
+            } for index, dimension_line_payload in enumerate(dimension_line_payloads)],
+            isolation='snapshot'
+        )
+
+        responses = {response.get('id'): response for response in bulk_response.get('responses', [])}
+
+        return [responses.get(str(index), {}) for index in range(len(dimension_line_payloads))]
+
+    @staticmethod
+    def __get_dimension_line_log(response: Dict):
+        """
+        Log field and log of a $batch sub response, the SDK raises only when the whole batch fails
+        """
+        status = response.get('status')
+        if isinstance(status, int) and 200 <= status < 300:
+            return 'dimension_success_log', str(response.get('body'))
+
+        return 'dimension_error_log', str(response.get('body') or 'Dimension line failed with status {0}'.format(status))
+
+    def post_dimension_lines(self, dimension_line_payloads: List[Dict], export_module_type: str, top_level_id: int, batched: bool = True) -> List[Dict]:
         """
         Post dimension lines for purchase invoice line and journal line items.
 
         :param dimension_line_payloads: List of payload dictionaries for dimension lines.
         :param export_module_type: Type of export module ('JOURNAL_ENTRY' and 'PURCHASE_INVOICE').
+        :param batched: Post the lines in $batch requests of DIMENSION_LINES_BATCH_SIZE operations.
         :return: List of exception responses, if any.
         """
         exception_response = []
 
-        def get_lineitem_by_id(module_type: str, item_id: int):
-            if module_type == 'JOURNAL_ENTRY':
-                return JournalEntryLineItems.objects.get(id=item_id, journal_entry_id=top_level_id)
-            else:
-                return PurchaseInvoiceLineitems.objects.get(id=item_id, purchase_invoice_id=top_level_id)
-
-        for dimension_line_payload in dimension_line_payloads:
-            exported_module_id = dimension_line_payload.pop('exported_module_id')
+        if export_module_type == 'JOURNAL_ENTRY':
+            lineitem_model = JournalEntryLineItems
+            lineitems = JournalEntryLineItems.objects.filter(journal_entry_id=top_level_id)
+        else:
+            lineitem_model = PurchaseInvoiceLineitems
+            lineitems = PurchaseInvoiceLineitems.objects.filter(purchase_invoice_id=top_level_id)
+
+        lineitems = {lineitem.id: lineitem for lineitem in lineitems}
+        company_id = Workspace.objects.get(id=self.workspace_id).business_central_company_id
+        batch_size = DIMENSION_LINES_BATCH_SIZE if batched else 1
+
+        for offset in range(0, len(dimension_line_payloads), batch_size):
+            batch = dimension_line_payloads[offset:offset + batch_size]
+            exported_module_ids = [dimension_line_payload.pop('exported_module_id') for dimension_line_payload in batch]
+            dimension_line_logs = None
+
+            if batched:
+                try:
+                    dimension_line_logs = [
+                        self.__get_dimension_line_log(response)
+                        for response in self.__bulk_post_dimension_lines(batch, export_module_type, company_id)
+                    ]
+                except Exception as exception:
+                    logger.info('Dimension lines batch rejected for workspace %s, posting them one by one: %s', self.workspace_id, exception)
+
+            if dimension_line_logs is None:
+                # Post the lines one by one to log the outcome of each of them
+                dimension_line_logs = []
+                for dimension_line_payload in batch:
+                    try:
+                        response = self.__post_dimension_line(dimension_line_payload, export_module_type)
+                        dimension_line_logs.append(('dimension_success_log', str(response)))
+                    except Exception as exception:
+                        error_message = str(getattr(exception, 'response', exception))
+                        dimension_line_logs.append(('dimension_error_log', error_message))
+
+            updated_lineitems = {}
+            for exported_module_id, (log_field, log) in zip(exported_module_ids, dimension_line_logs):
+                lineitem = lineitems[exported_module_id]
+                setattr(lineitem, log_field, log)
+                lineitem.updated_at = timezone.now()
+                updated_lineitems[exported_module_id] = lineitem
+
+            lineitem_model.objects.bulk_update(
+                updated_lineitems.values(), ['dimension_success_log', 'dimension_error_log', 'updated_at']
+            )
 
-            try:
-                if export_module_type == 'JOURNAL_ENTRY':
-                    response = self.connection.journal_line_items.post_journal_entry_dimensions(
-                        journal_line_item_id=dimension_line_payload['parentId'],
-                        data=dimension_line_payload
-                    )
-                else:
-                    response = self.connection.purchase_invoice_line_items.post_purchase_invoice_dimensions(
-                        purchase_invoice_item_id=dimension_line_payload['parentId'],
-                        data=dimension_line_payload
-                    )
+        return exception_response
 
-                lineitem = get_lineitem_by_id(export_module_type, exported_module_id)
-                lineitem.dimension_success_log = str(response)
-                lineitem.save()
+    def post_attachment(self, ref_type: str, ref_id: str, attachment: Dict) -> Dict:
+        """
+        Link a single attachment to an object in Business Central
+        :param ref_id: object id
+        :param ref_type: type of object
+        :param attachment: attachment dict with id, name, content_type and download_url
+        """
+        data = {
+            "parentId": ref_id,
+            "fileName": "{0}_{1}".format(attachment["id"], attachment["name"]),
+            "parentType": ref_type
+        }
+        post_response = self.connection.attachments.post(data)
 
-            except Exception as exception:
-                lineitem = get_lineitem_by_id(export_module_type, exported_module_id)
-                error_message = str(getattr(exception, 'response', exception))
-                lineitem.dimension_error_log = error_message
-                lineitem.save()
+        self.connection.attachments.upload(
+            post_response["id"],
+            attachment["content_type"],
+            base64.b64decode(attachment["download_url"])
+        )
 
-        return exception_response
+        return post_response
 
     def post_attachments(
         self, ref_type: str, ref_id: str, attachments: List[Dict]
@@ -351,22 +607,8 @@ class BusinessCentralConnector:
         :param ref_type: type of object
         :param attachments: attachment[dict()]
         """
-        responses = []
-        if len(attachments):
-            for attachment in attachments:
-                data = {
-                    "parentId": ref_id,
-                    "fileName": "{0}_{1}".format(attachment["id"], attachment["name"]),
-                    "parentType": ref_type
-                }
-                post_response = self.connection.attachments.post(data)
-
-                self.connection.attachments.upload(
-                    post_response["id"],
-                    attachment["content_type"],
-                    base64.b64decode(attachment["download_url"])
-                )
-
-                responses.append(post_response)
+        post_response = None
+        for attachment in attachments:
+            post_response = self.post_attachment(ref_type, ref_id, attachment)
 
         return post_response
@@ -1,7 +1,9 @@
 import json
-from typing import List
+from datetime import datetime, timezone
+from typing import Dict, List
 
 import requests
+from dateutil import parser
 from django.conf import settings
 from django.db.models import Q
 from fyle_integrations_platform_connector import PlatformConnector
@@ -33,7 +35,7 @@ def construct_expense_filter(expense_filter):
                     expense_filter.values = [int(value) for value in expense_filter.values]
                 # If the expense filter is a custom field and the operator is yes or no(checkbox)
                 if expense_filter.custom_field_type == 'BOOLEAN':
-                    expense_filter.values[0] = True if expense_filter.values[0] == 'true' else False
+                    expense_filter.values[0] = True if expense_filter.values[0] in (True, 'true') else False
                 # Construct the filter for the custom property
                 filter1 = {
                     f'custom_properties__{expense_filter.condition}__{expense_filter.operator}':
@@ -107,6 +109,236 @@ def construct_expense_filter_query(expense_filters: List[ExpenseFilter]):
     return final_filter
 
 
+# Compiled expense filter predicates, keyed by workspace id
+# Each entry holds the (id, updated_at) signature of the filters it was compiled from
+EXPENSE_FILTER_PREDICATE_CACHE = {}
+
+# Ordering of jsonb values of different types in Postgres
+JSON_TYPE_ORDER = {
+    type(None): 0,
+    str: 1,
+    int: 2,
+    float: 2,
+    bool: 3,
+    list: 4,
+    dict: 5
+}
+
+
+def __is_json_equal(value, other_value) -> bool:
+    """
+    Compare two values the way Postgres compares jsonb values
+    """
+    if isinstance(value, bool) or isinstance(other_value, bool):
+        return isinstance(value, bool) and isinstance(other_value, bool) and value == other_value
+
+    if JSON_TYPE_ORDER.get(type(value)) != JSON_TYPE_ORDER.get(type(other_value)):
+        return False
+
+    return value == other_value
+
+
+def __get_json_text(value):
+    """
+    Text representation of a jsonb value, same as the ->> operator
+    """
+    if value is None or isinstance(value, str):
+        return value
+
+    return json.dumps(value)
+
+
+def __is_json_lesser(value, other_value, or_equal: bool) -> bool:
+    """
+    Check value < other_value (or <=) using the jsonb ordering of Postgres
+    """
+    value_order = JSON_TYPE_ORDER.get(type(value))
+    other_value_order = JSON_TYPE_ORDER.get(type(other_value))
+
+    if value_order != other_value_order:
+        return value_order < other_value_order
+
+    if value_order >= JSON_TYPE_ORDER[list]:
+        value, other_value = json.dumps(value), json.dumps(other_value)
+
+    return value <= other_value if or_equal else value < other_value
+
+
+def __parse_datetime(value):
+    """
+    Parse a date filter value, naive values are treated as UTC like the database does
+    """
+    if isinstance(value, str):
+        value = parser.parse(value)
+
+    if value and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return value
+
+
+def __construct_custom_field_predicate(expense_filter: ExpenseFilter):
+    """
+    Compile an expense filter on a custom field, custom properties are compared like jsonb values
+    :param expense_filter: ExpenseFilter object
+    :return: predicate or None
+    """
+    condition = expense_filter.condition
+    operator = expense_filter.operator
+    values = list(expense_filter.values or [])
+
+    def get_custom_property(expense: Dict):
+        return expense['custom_properties'].get(condition) if expense['custom_properties'] else None
+
+    def has_custom_property(expense: Dict):
+        return bool(expense['custom_properties']) and condition in expense['custom_properties']
+
+    if operator == 'isnull':
+        if values[0].lower() == 'true':
+            return lambda expense: get_custom_property(expense) is None
+
+        return lambda expense: get_custom_property(expense) is not None
+
+    if operator == 'not_in':
+        if expense_filter.custom_field_type != 'SELECT':
+            return None
+
+        return lambda expense: has_custom_property(expense) and not any(
+            __is_json_equal(get_custom_property(expense), value) for value in values
+        )
+
+    if expense_filter.custom_field_type == 'NUMBER':
+        values = [int(value) for value in values]
+    if expense_filter.custom_field_type == 'BOOLEAN':
+        values[0] = True if values[0] == 'true' else False
+
+    if operator == 'in':
+        return lambda expense: has_custom_property(expense) and any(
+            __is_json_equal(get_custom_property(expense), value) for value in values
+        )
+
+    if len(values) != 1:
+        return None
+
+    value = values[0]
+
+    if operator in ('iexact', 'icontains') and isinstance(value, str):
+        def match_text(expense: Dict):
+            expense_value = __get_json_text(get_custom_property(expense))
+            if expense_value is None:
+                return False
+
+            if operator == 'iexact':
+                return expense_value.upper() == value.upper()
+
+            return value.upper() in expense_value.upper()
+
+        return match_text
+
+    if operator in ('lt', 'lte') and expense_filter.custom_field_type == 'NUMBER':
+        return lambda expense: has_custom_property(expense) and __is_json_lesser(
+            get_custom_property(expense), value, operator == 'lte'
+        )
+
+    return None
+
+
+def construct_expense_filter_predicate(expense_filter: ExpenseFilter):
+    """
+    Compile a single expense filter into a predicate over the expense dicts returned by the platform connector
+    Mirrors construct_expense_filter(), returns None for filters it does not support
+    :param expense_filter: ExpenseFilter object
+    :return: predicate or None
+    """
+    if expense_filter.is_custom:
+        return __construct_custom_field_predicate(expense_filter)
+
+    condition = expense_filter.condition
+    operator = expense_filter.operator
+    values = list(expense_filter.values or [])
+
+    if operator == 'not_in':
+        if condition != 'category':
+            return None
+
+        return lambda expense: expense.get(condition) is None or expense.get(condition) not in values
+
+    if operator == 'in':
+        return lambda expense: expense.get(condition) is not None and expense.get(condition) in values
+
+    if len(values) != 1:
+        return None
+
+    value = values[0]
+
+    if operator == 'iexact':
+        return lambda expense: expense.get(condition) is not None and str(expense.get(condition)).upper() == value.upper()
+
+    if operator == 'icontains':
+        return lambda expense: expense.get(condition) is not None and value.upper() in str(expense.get(condition)).upper()
+
+    if operator in ('lt', 'lte') and condition == 'spent_at':
+        filter_value = __parse_datetime(value)
+
+        def match_date(expense: Dict):
+            expense_value = __parse_datetime(expense.get(condition))
+            if expense_value is None:
+                return False
+
+            return expense_value <= filter_value if operator == 'lte' else expense_value < filter_value
+
+        return match_date
+
+    return None
+
+
+def construct_expense_filter_predicate_query(expense_filters: List[ExpenseFilter]):
+    """
+    Combine the predicates of ranked expense filters, same as construct_expense_filter_query()
+    :param expense_filters: ExpenseFilter objects ordered by rank
+    :return: predicate or None if any of the filters is not supported
+    """
+    final_predicate = None
+    join_by = None
+
+    for expense_filter in expense_filters:
+        predicate = construct_expense_filter_predicate(expense_filter)
+
+        if predicate is None:
+            return None
+
+        if expense_filter.rank == 1:
+            final_predicate = predicate
+        elif join_by == 'AND':
+            final_predicate = (lambda first, second: lambda expense: first(expense) and second(expense))(final_predicate, predicate)
+        else:
+            final_predicate = (lambda first, second: lambda expense: first(expense) or second(expense))(final_predicate, predicate)
+
+        join_by = expense_filter.join_by
+
+    return final_predicate
+
+
+def get_expense_filter_predicate(workspace_id: int, expense_filters: List[ExpenseFilter]):
+    """
+    Get the compiled predicate for the expense filters of a workspace
+    The compiled predicate is reused till any of the filters is created, updated or deleted
+    :param workspace_id: Workspace id
+    :param expense_filters: ExpenseFilter objects ordered by rank
+    :return: predicate or None if the filters have to be evaluated in the database
+    """
+    signature = tuple((expense_filter.id, expense_filter.updated_at) for expense_filter in expense_filters)
+    cached_predicate = EXPENSE_FILTER_PREDICATE_CACHE.get(workspace_id)
+
+    if cached_predicate and cached_predicate[0] == signature:
+        return cached_predicate[1]
+
+    predicate = construct_expense_filter_predicate_query(expense_filters)
+    EXPENSE_FILTER_PREDICATE_CACHE[workspace_id] = (signature, predicate)
+
+    return predicate
+
+
 def post_request(url, body, refresh_token=None):
     """
     Create a HTTP post request.
@@ -245,6 +477,78 @@ def get_fyle_orgs(refresh_token: str, cluster_domain: str):
     return get_request(api_url, {}, refresh_token)
 
 
+def __format_gte_filter(value: datetime) -> str:
+    return 'gte.{}'.format(datetime.strftime(value, '%Y-%m-%dT%H:%M:%S.000Z'))
+
+
+def __construct_expenses_query_params(
+    source_account_type: str,
+    state: str,
+    settled_at: datetime = None,
+    approved_at: datetime = None,
+    last_paid_at: datetime = None
+) -> dict:
+    """
+    Construct the query params of the expenses to import, filtering the same way platform.expenses.get() does
+    Expenses of a later state are included when importing since a timestamp, as they moved on after it
+    :return: query params
+    """
+    states = [state]
+    if state == 'PAYMENT_PROCESSING' and settled_at:
+        states.append('PAID')
+    elif state == 'APPROVED' and (settled_at or approved_at):
+        states.extend(['PAYMENT_PROCESSING', 'PAID'])
+
+    query_params = {
+        'order': 'report_id.asc,id.asc',
+        'source_account->type': 'eq.{}'.format(source_account_type),
+        'state': 'in.{}'.format(tuple(states)).replace("'", '"') if len(states) > 1 else 'eq.{}'.format(state)
+    }
+
+    if settled_at:
+        query_params['last_settled_at'] = __format_gte_filter(settled_at)
+
+    if last_paid_at:
+        query_params['report_last_paid_at'] = __format_gte_filter(last_paid_at)
+
+    if approved_at:
+        query_params['report_last_approved_at'] = __format_gte_filter(approved_at)
+
+    return query_params
+
+
+def get_expenses_generator(
+    platform: PlatformConnector,
+    workspace_id: int,
+    source_account_type: str,
+    state: str,
+    settled_at: datetime = None,
+    approved_at: datetime = None,
+    last_paid_at: datetime = None,
+    filter_credit_expenses: bool = False
+):
+    """
+    Lazily fetch expenses from Fyle, one page at a time
+    Mirrors platform.expenses.get() without holding every page in memory,
+    pages are ordered by report so that a report only spans consecutive pages
+    :return: Generator of constructed expense lists
+    """
+    query_params = __construct_expenses_query_params(source_account_type, state, settled_at, approved_at, last_paid_at)
+
+    for expense_page in platform.expenses.connection.list_all(query_params):
+        # Non reimbursable expenses paid from the personal cash account are never exported
+        expenses = [
+            expense for expense in expense_page['data']
+            if expense['is_reimbursable'] or expense['source_account']['type'] != 'PERSONAL_CASH_ACCOUNT'
+        ]
+
+        if filter_credit_expenses:
+            expenses = [expense for expense in expenses if expense['amount'] > 0]
+
+        if expenses:
+            yield platform.expenses.construct_expense_object(expenses, workspace_id)
+
+
 def sync_dimensions(fyle_credentials: FyleCredential) -> None:
     platform = PlatformConnector(fyle_credentials)
 
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Callable, Dict, List
 
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
@@ -48,6 +48,9 @@ SOURCE_ACCOUNT_MAP = {
     'PERSONAL_CORPORATE_CREDIT_CARD_ACCOUNT': 'CCC'
 }
 
+# Number of expenses upserted per INSERT ... ON CONFLICT statement
+EXPENSE_UPSERT_BATCH_SIZE = 500
+
 
 class Expense(BaseForeignWorkspaceModel):
     """
@@ -97,13 +100,21 @@ class Expense(BaseForeignWorkspaceModel):
         db_table = 'expenses'
 
     @staticmethod
-    def create_expense_objects(expenses: List[Dict], workspace_id: int, skip_update: bool = False):
+    def create_expense_objects(
+        expenses: List[Dict], workspace_id: int, skip_update: bool = False, expense_filter_predicate: Callable = None
+    ):
         """
         Bulk create expense objects
+        Expenses are upserted in chunks with INSERT ... ON CONFLICT (expense_id) DO UPDATE
+        and only the ones which are not part of any accounting export yet are returned
+        :param expense_filter_predicate: compiled expense filters, matching expenses are marked
+            as skipped during the upsert and left out of the result
         """
 
-        # Create an empty list to store expense objects
-        expense_objects = []
+        # Build one unsaved Expense per expense_id, the last occurrence wins like sequential upserts
+        expense_objects_map = {}
+        skipped_expense_ids = set()
+        update_fields = None
 
         for expense in expenses:
             # Iterate through custom property fields and handle empty values
@@ -157,15 +168,58 @@ class Expense(BaseForeignWorkspaceModel):
             if expense_data_to_append:
                 defaults.update(expense_data_to_append)
 
-            # Create or update an Expense object based on expense_id
-            expense_object, _ = Expense.objects.update_or_create(
-                expense_id=expense['id'],
-                defaults=defaults
+            # Fields overwritten on conflict, skip_update leaves the report level fields untouched
+            if update_fields is None:
+                update_fields = [field for field in defaults.keys() if field != 'workspace_id'] + ['workspace', 'updated_at']
+
+            expense_id = str(expense['id'])
+            skipped_expense_ids.discard(expense_id)
+            if expense_filter_predicate and expense_filter_predicate(expense):
+                # New expenses are inserted as skipped, is_skipped is never overwritten on conflict
+                skipped_expense_ids.add(expense_id)
+                defaults['is_skipped'] = True
+
+            expense_objects_map.pop(expense_id, None)
+            expense_objects_map[expense_id] = Expense(expense_id=expense_id, **defaults)
+
+        expense_objects = []
+        expenses_to_upsert = list(expense_objects_map.values())
+
+        for offset in range(0, len(expenses_to_upsert), EXPENSE_UPSERT_BATCH_SIZE):
+            batch = expenses_to_upsert[offset:offset + EXPENSE_UPSERT_BATCH_SIZE]
+
+            # Create or update the whole batch based on expense_id in a single statement
+            Expense.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['expense_id'],
+                update_fields=update_fields
             )
 
-            # Check if an AccountingExport related to the expense object already exists
-            if not expense_object.accountingexport_set.exists():
-                expense_objects.append(expense_object)
+            # Anti join to pick the expenses which are not linked to an AccountingExport yet
+            batch_expense_ids = [expense_object.expense_id for expense_object in batch]
+            ungrouped_expenses = {
+                expense_object.expense_id: expense_object
+                for expense_object in Expense.objects.filter(expense_id__in=batch_expense_ids, accountingexport__isnull=True)
+            }
+
+            if expense_filter_predicate:
+                # Expenses which already existed keep their is_skipped on conflict, mark the newly matching ones
+                expense_ids_to_skip = [
+                    expense_id for expense_id, expense_object in ungrouped_expenses.items()
+                    if expense_id in skipped_expense_ids and not expense_object.is_skipped
+                ]
+                if expense_ids_to_skip:
+                    Expense.objects.filter(expense_id__in=expense_ids_to_skip).update(is_skipped=True)
+
+                ungrouped_expenses = {
+                    expense_id: expense_object for expense_id, expense_object in ungrouped_expenses.items()
+                    if expense_id not in skipped_expense_ids and not expense_object.is_skipped
+                }
+
+            expense_objects.extend(
+                ungrouped_expenses[expense_id] for expense_id in batch_expense_ids if expense_id in ungrouped_expenses
+            )
 
         return expense_objects
 
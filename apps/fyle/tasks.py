@@ -8,7 +8,7 @@ from fyle_integrations_platform_connector.apis.expenses import Expenses as FyleE
 
 from apps.accounting_exports.models import AccountingExport
 from apps.fyle.exceptions import handle_exceptions
-from apps.fyle.helpers import construct_expense_filter_query
+from apps.fyle.helpers import construct_expense_filter_query, get_expense_filter_predicate, get_expenses_generator
 from apps.fyle.models import Expense, ExpenseFilter
 from apps.workspaces.models import ExportSetting, FyleCredential, Workspace
 
@@ -50,6 +50,7 @@ def get_filtered_expenses(workspace: int, expense_objects: list, expense_filters
 def import_expenses(workspace_id, accounting_export: AccountingExport, source_account_type, fund_source_key):
     """
     Common logic for importing expenses from Fyle
+    Expenses are streamed page by page, every page is upserted, filtered and grouped in its own transaction
     :param accounting_export: Task log object
     :param workspace_id: workspace id
     :param source_account_type: Fyle source account type
@@ -63,32 +64,66 @@ def import_expenses(workspace_id, accounting_export: AccountingExport, source_ac
     export_settings = ExportSetting.objects.get(workspace_id=workspace_id)
     workspace = Workspace.objects.get(pk=workspace_id)
     last_synced_at = getattr(workspace, f"{fund_source_map.get(fund_source_key)}_last_synced_at", None)
+    expense_state = getattr(export_settings, f"{fund_source_map.get(fund_source_key)}_expense_state")
     fyle_credentials = FyleCredential.objects.get(workspace_id=workspace_id)
 
     platform = PlatformConnector(fyle_credentials)
 
-    expenses = platform.expenses.get(
-        source_account_type=[source_account_type],
-        state=getattr(export_settings, f"{fund_source_map.get(fund_source_key)}_expense_state"),
-        settled_at=last_synced_at if getattr(export_settings, f"{fund_source_map.get(fund_source_key)}_expense_state") == 'PAYMENT_PROCESSING' else None,
-        approved_at=last_synced_at if getattr(export_settings, f"{fund_source_map.get(fund_source_key)}_expense_state") == 'APPROVED' else None,
+    # Captured before the first page is fetched so that nothing updated during the import is missed next time
+    sync_started_at = datetime.now()
+
+    expense_pages = get_expenses_generator(
+        platform=platform,
+        workspace_id=workspace_id,
+        source_account_type=source_account_type,
+        state=expense_state,
+        settled_at=last_synced_at if expense_state == 'PAYMENT_PROCESSING' else None,
+        approved_at=last_synced_at if expense_state == 'APPROVED' else None,
         filter_credit_expenses=(fund_source_key == 'CCC'),
-        last_paid_at=last_synced_at if getattr(export_settings, f"{fund_source_map.get(fund_source_key)}_expense_state") == 'PAID' else None
+        last_paid_at=last_synced_at if expense_state == 'PAID' else None
     )
+    expense_filters = list(ExpenseFilter.objects.filter(workspace_id=workspace_id).order_by('rank'))
+    # Filters are evaluated in memory while upserting, the database query is only a fallback
+    expense_filter_predicate = get_expense_filter_predicate(workspace_id, expense_filters) if expense_filters else None
+
+    is_expenses_imported = False
+    carried_over_expenses = []
+
+    for expenses in expense_pages:
+        is_expenses_imported = True
 
-    if expenses:
         with transaction.atomic():
-            setattr(workspace, f"{fund_source_map.get(fund_source_key)}_last_synced_at", datetime.now())
-            workspace.save()
-            expense_objects = Expense.create_expense_objects(expenses, workspace_id)
-            expense_filters = ExpenseFilter.objects.filter(workspace_id=workspace_id).order_by('rank')
-            if expense_filters:
-                expense_objects = get_filtered_expenses(workspace, expense_objects, expense_filters)
-            AccountingExport.create_accounting_export(
-                expense_objects,
-                fund_source=fund_source_key,
-                workspace_id=workspace_id
+            expense_objects = Expense.create_expense_objects(
+                expenses, workspace_id, expense_filter_predicate=expense_filter_predicate
             )
+            if expense_filters and not expense_filter_predicate:
+                expense_objects = get_filtered_expenses(workspace, expense_objects, expense_filters)
+
+            # The last report of the page can continue on the next page, hold it back until then
+            last_report_id = expenses[-1]['report_id']
+            expense_objects = carried_over_expenses + list(expense_objects)
+            carried_over_expenses = [expense for expense in expense_objects if expense.report_id == last_report_id]
+            expense_objects = [expense for expense in expense_objects if expense.report_id != last_report_id]
+
+            if expense_objects:
+                AccountingExport.create_accounting_export(
+                    expense_objects,
+                    fund_source=fund_source_key,
+                    workspace_id=workspace_id
+                )
+
+    if is_expenses_imported:
+        # The sync checkpoint only moves once every page has been committed
+        with transaction.atomic():
+            if carried_over_expenses:
+                AccountingExport.create_accounting_export(
+                    carried_over_expenses,
+                    fund_source=fund_source_key,
+                    workspace_id=workspace_id
+                )
+
+            setattr(workspace, f"{fund_source_map.get(fund_source_key)}_last_synced_at", sync_started_at)
+            workspace.save()
 
     accounting_export.status = 'COMPLETE'
     accounting_export.business_central_errors = None
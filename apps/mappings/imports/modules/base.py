@@ -1,8 +1,11 @@
 import math
 import copy
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
 from typing import List
 
+from django.conf import settings
+from django.db.models import F
 from fyle_accounting_mappings.models import CategoryMapping, DestinationAttribute, ExpenseAttribute, Mapping
 from fyle_integrations_platform_connector import PlatformConnector
 
@@ -76,19 +79,23 @@ class Base:
 
         return filters
 
-    def remove_duplicate_attributes(self, destination_attributes: List[DestinationAttribute]):
+    def remove_duplicate_attributes(self, destination_attributes: List[DestinationAttribute], seen_values: set = None):
         """
-        Remove duplicate attributes
+        Remove duplicate attributes, comparing values case insensitively
         :param destination_attributes: destination attributes
+        :param seen_values: lower cased values kept so far, shared across batches to dedupe them against each other
         :return: list[DestinationAttribute]
         """
+        if seen_values is None:
+            seen_values = set()
+
         unique_attributes = []
-        attribute_values = []
 
         for destination_attribute in destination_attributes:
-            if destination_attribute.value.lower() not in attribute_values:
+            attribute_value = destination_attribute.value.lower()
+            if attribute_value not in seen_values:
                 unique_attributes.append(destination_attribute)
-                attribute_values.append(destination_attribute.value.lower())
+                seen_values.add(attribute_value)
 
         return unique_attributes
 
@@ -232,31 +239,62 @@ class Base:
         destination_attributes_generator = self.get_destination_attributes_generator(destination_attributes_count, filters)
         platform_class = self.get_platform_class(platform)
 
-        for paginated_destination_attributes, is_last_batch in destination_attributes_generator:
-            fyle_payload = self.setup_fyle_payload_creation(
-                paginated_destination_attributes=paginated_destination_attributes,
-                is_auto_sync_status_allowed=is_auto_sync_status_allowed
-            )
+        # Posts of merchants and custom fields rewrite the options of a whole field, so they never overlap
+        concurrency = 1 if self.platform_class_name in ['expense_custom_fields', 'merchants'] else settings.IMPORT_CONCURRENCY
 
-            self.post_to_fyle_and_sync(
-                fyle_payload=fyle_payload,
-                resource_class=platform_class,
-                is_last_batch=is_last_batch,
-                import_log=import_log
-            )
+        # Payloads of the next batches are built while up to concurrency batches are being posted to Fyle
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            posts = set()
+
+            for paginated_destination_attributes, _ in destination_attributes_generator:
+                fyle_payload = self.setup_fyle_payload_creation(
+                    paginated_destination_attributes=paginated_destination_attributes,
+                    is_auto_sync_status_allowed=is_auto_sync_status_allowed
+                )
+
+                if len(posts) >= concurrency:
+                    done, posts = wait(posts, return_when=FIRST_COMPLETED)
+                    self.update_import_log_post_posts(done, import_log)
+
+                posts.add(executor.submit(self.post_to_fyle, fyle_payload, platform_class))
+
+            done, _ = wait(posts)
+            self.update_import_log_post_posts(done, import_log)
+
+        # Every batch is posted by now, as a failed post raises above
+        import_log.last_successful_run_at = datetime.now()
+        import_log.status = 'COMPLETE'
+        import_log.error_log = []
+        import_log.save(update_fields=['last_successful_run_at', 'status', 'error_log', 'updated_at'])
 
     def get_destination_attributes_generator(self, destination_attributes_count: int, filters: dict):
         """
         Get destination attributes generator
+        Batches are paged by keyset on (value, id), so every batch is a range scan of the value index
         :param destination_attributes_count: Destination attributes count
         :param filters: dict
         :return: Generator of destination_attributes
         """
-        for offset in range(0, destination_attributes_count, 200):
-            limit = offset + 200
-            paginated_destination_attributes = DestinationAttribute.objects.filter(**filters).order_by('value', 'id')[offset:limit]
-            paginated_destination_attributes_without_duplicates = self.remove_duplicate_attributes(paginated_destination_attributes)
-            is_last_batch = True if limit >= destination_attributes_count else False
+        batches_count = math.ceil(destination_attributes_count / 200)
+        last_destination_attribute = None
+        seen_values = set()
+
+        for batch in range(batches_count):
+            destination_attributes = DestinationAttribute.objects.filter(**filters)
+
+            if last_destination_attribute:
+                destination_attributes = destination_attributes.filter(
+                    value__gte=last_destination_attribute.value
+                ).exclude(
+                    value=last_destination_attribute.value, id__lte=last_destination_attribute.id
+                )
+
+            paginated_destination_attributes = list(destination_attributes.order_by('value', 'id')[:200])
+            if paginated_destination_attributes:
+                last_destination_attribute = paginated_destination_attributes[-1]
+
+            paginated_destination_attributes_without_duplicates = self.remove_duplicate_attributes(paginated_destination_attributes, seen_values)
+            is_last_batch = batch == batches_count - 1
 
             yield paginated_destination_attributes_without_duplicates, is_last_batch
 
@@ -286,21 +324,45 @@ class Base:
         # This is a map of attribute name to attribute source_id
         return {attribute['value'].lower(): attribute['source_id'] for attribute in existing_expense_attributes_values}
 
-    def post_to_fyle_and_sync(self, fyle_payload: List[object], resource_class, is_last_batch: bool, import_log: ImportLog):
+    def post_to_fyle(self, fyle_payload: List[object], resource_class):
         """
-        Post to Fyle and Sync
+        Post to Fyle
         :param fyle_payload: List of Fyle Payload
         :param resource_class: Platform Class
-        :param is_last_batch: bool
-        :param import_log: ImportLog object
         """
         if fyle_payload and self.platform_class_name in ['expense_custom_fields', 'merchants']:
             resource_class.post(fyle_payload)
         elif fyle_payload:
             resource_class.post_bulk(fyle_payload)
 
+    def post_to_fyle_and_sync(self, fyle_payload: List[object], resource_class, is_last_batch: bool, import_log: ImportLog):
+        """
+        Post to Fyle and Sync
+        :param fyle_payload: List of Fyle Payload
+        :param resource_class: Platform Class
+        :param is_last_batch: bool
+        :param import_log: ImportLog object
+        """
+        self.post_to_fyle(fyle_payload, resource_class)
+
         self.update_import_log_post_import(is_last_batch, import_log)
 
+    def update_import_log_post_posts(self, posts: set, import_log: ImportLog):
+        """
+        Count the finished posts of batches as processed, raising the error of a failed one
+        :param posts: finished futures of posts to Fyle
+        :param import_log: ImportLog object
+        """
+        failed_posts = [post for post in posts if post.exception()]
+        processed_batches_count = len(posts) - len(failed_posts)
+
+        if processed_batches_count:
+            ImportLog.objects.filter(id=import_log.id).update(processed_batches_count=F('processed_batches_count') + processed_batches_count)
+            import_log.refresh_from_db(fields=['processed_batches_count'])
+
+        if failed_posts:
+            failed_posts[0].result()
+
     def update_import_log_post_import(self, is_last_batch: bool, import_log: ImportLog):
         """
         Update Import Log Post Import
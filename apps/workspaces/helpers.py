@@ -7,6 +7,7 @@ import requests
 from django.conf import settings
 from dynamics.exceptions.dynamics_exceptions import InternalServerError, InvalidTokenError
 
+from apps.business_central.utils import BusinessCentralConnector
 from apps.workspaces.models import BusinessCentralCredentials
 
 logger = logging.getLogger(__name__)
@@ -92,4 +93,7 @@ def connect_business_central(authorization_code, redirect_uri, workspace_id):
         business_central_credentials.is_expired = False
         business_central_credentials.save()
 
+        # The cached connection was made with the replaced credentials
+        BusinessCentralConnector.clear_connection(workspace_id)
+
     return business_central_credentials
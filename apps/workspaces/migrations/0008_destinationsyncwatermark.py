@@ -0,0 +1,31 @@
+# Generated by Django 4.2.28 on 2026-10-18 11:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ms_business_central_api.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0007_businesscentralcredentials_environment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DestinationSyncWatermark',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Created at datetime')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Updated at datetime')),
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('attribute_type', ms_business_central_api.models.fields.StringNotNullField(help_text='Attribute type', max_length=150)),
+                ('last_modified_at', ms_business_central_api.models.fields.CustomDateTimeField(help_text='Latest lastModifiedDateTime of the synced records', null=True)),
+                ('last_full_sync_at', ms_business_central_api.models.fields.CustomDateTimeField(help_text='Last sync of every record', null=True)),
+                ('workspace', models.ForeignKey(help_text='Reference to Workspace model', on_delete=django.db.models.deletion.PROTECT, to='workspaces.workspace')),
+            ],
+            options={
+                'db_table': 'destination_sync_watermarks',
+                'unique_together': {('workspace', 'attribute_type')},
+            },
+        ),
+    ]
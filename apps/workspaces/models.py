@@ -276,3 +276,18 @@ class LastExportDetail(BaseModel):
 
     class Meta:
         db_table = 'last_export_details'
+
+
+class DestinationSyncWatermark(BaseForeignWorkspaceModel):
+    """
+    Table to store how far the Business Central attributes of a workspace are synced
+    """
+
+    id = models.AutoField(primary_key=True)
+    attribute_type = StringNotNullField(max_length=150, help_text='Attribute type')
+    last_modified_at = CustomDateTimeField(help_text='Latest lastModifiedDateTime of the synced records')
+    last_full_sync_at = CustomDateTimeField(help_text='Last sync of every record')
+
+    class Meta:
+        db_table = 'destination_sync_watermarks'
+        unique_together = ('workspace', 'attribute_type')
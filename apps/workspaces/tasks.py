@@ -7,6 +7,7 @@ from django_q.models import Schedule
 from fyle_integrations_platform_connector import PlatformConnector
 
 from apps.accounting_exports.models import AccountingExport, AccountingExportSummary
+from apps.business_central.actions import update_accounting_export_summary
 from apps.business_central.exports.journal_entry.tasks import ExportJournalEntry
 from apps.business_central.exports.purchase_invoice.tasks import ExportPurchaseInvoice
 from apps.fyle.queue import queue_import_credit_card_expenses, queue_import_reimbursable_expenses
@@ -97,7 +98,9 @@ def run_import_export(workspace_id: int, export_mode = None):
         if advance_settings:
             accounting_summary.next_export_at = last_exported_at + timedelta(hours=advance_settings.interval_hours)
 
-        accounting_summary.save()
+        # The counters are maintained by the exports, recount them for the new export window
+        accounting_summary.save(update_fields=['last_exported_at', 'export_mode', 'next_export_at', 'updated_at'])
+        update_accounting_export_summary(workspace_id)
 
 
 def schedule_sync(workspace_id: int, schedule_enabled: bool, hours: int, email_added: List, emails_selected: List):
@@ -203,7 +206,10 @@ def export_to_business_central(workspace_id: int):
 
         accounting_summary.last_exported_at = last_exported_at
         accounting_summary.export_mode = 'MANUAL'
-        accounting_summary.save()
+
+        # The counters are maintained by the exports, recount them for the new export window
+        accounting_summary.save(update_fields=['last_exported_at', 'export_mode', 'next_export_at', 'updated_at'])
+        update_accounting_export_summary(workspace_id)
 
 
 def async_create_admin_subcriptions(workspace_id: int) -> None:
@@ -20,3 +20,20 @@ class BulkError(Exception):
 
     def __str__(self):
         return repr(self.message)
+
+
+class PageShiftError(Exception):
+    """
+    Page Shift Error Exception.
+    Raised when records were added or deleted while a paged read was in progress.
+
+    Parameters:
+        msg (str): Short description of the error.
+    """
+
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.message = msg
+
+    def __str__(self):
+        return repr(self.message)
@@ -288,6 +288,16 @@ BUSINESS_CENTRAL_REDIRECT_URI = os.environ.get("BUSINESS_CENTRAL_REDIRECT_URI")
 BUSINESS_CENTRAL_TOKEN_URI = os.environ.get("BUSINESS_CENTRAL_TOKEN_URI")
 BUSINESS_CENTRAL_ENVIRONMENT = os.environ.get("BUSINESS_CENTRAL_ENVIRONMENT")
 
+# Maximum number of accounting exports running at once, per workspace and across all workspaces
+EXPORT_CONCURRENCY_PER_WORKSPACE = int(os.environ.get('EXPORT_CONCURRENCY_PER_WORKSPACE', 2))
+EXPORT_CONCURRENCY_GLOBAL = int(os.environ.get('EXPORT_CONCURRENCY_GLOBAL', 4))
+
+# Maximum number of Business Central dimensions synced at once per workspace
+SYNC_DIMENSIONS_CONCURRENCY = int(os.environ.get('SYNC_DIMENSIONS_CONCURRENCY', 4))
+
+# Maximum number of attribute batches being posted to Fyle at once per import
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 1))
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -19,6 +19,12 @@ BEGIN
   GET DIAGNOSTICS rcount = ROW_COUNT;
   RAISE NOTICE 'Deleted % accounting_export_summary', rcount;
 
+  DELETE
+  FROM destination_sync_watermarks dsw
+  WHERE dsw.workspace_id = _workspace_id;
+  GET DIAGNOSTICS rcount = ROW_COUNT;
+  RAISE NOTICE 'Deleted % destination_sync_watermarks', rcount;
+
   DELETE
   FROM import_logs il
   WHERE il.workspace_id = _workspace_id;
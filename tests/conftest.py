@@ -11,6 +11,7 @@ from fyle_rest_auth.models import AuthToken, User
 from rest_framework.test import APIClient
 
 from apps.accounting_exports.models import AccountingExport, AccountingExportSummary, Error
+from apps.business_central.utils import BusinessCentralConnector
 from apps.fyle.helpers import get_access_token
 from apps.fyle.models import ExpenseFilter
 from apps.workspaces.models import BusinessCentralCredentials, ExportSetting, FyleCredential, ImportSetting, Workspace
@@ -107,6 +108,14 @@ def default_session_fixture(request):
     patched_6.__enter__()
 
 
+@pytest.fixture(autouse=True)
+def clear_business_central_connections():
+    """
+    Pytest fixture to drop the Business Central connections cached by earlier tests
+    """
+    BusinessCentralConnector._connections.clear()
+
+
 @pytest.fixture
 @pytest.mark.django_db(databases=['default'])
 def create_temp_workspace():
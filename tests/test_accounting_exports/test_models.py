@@ -0,0 +1,37 @@
+import copy
+
+from apps.accounting_exports.models import AccountingExport
+from apps.fyle.models import Expense
+from apps.workspaces.models import ExportSetting
+from tests.test_fyle.fixtures import fixtures as data
+
+
+def test_create_accounting_export(db, create_temp_workspace, add_export_settings, django_assert_num_queries):
+    export_setting = ExportSetting.objects.get(workspace_id=1)
+    export_setting.reimbursable_expense_date = 'LAST_SPENT_AT'
+    export_setting.save()
+
+    expenses = []
+    for index in range(100):
+        expense = copy.deepcopy(data['expenses'][0])
+        expense['id'] = 'txExpense{}'.format(index)
+        expense['report_id'] = 'rpReport{}'.format(index % 10)
+        expense['claim_number'] = 'C/2022/05/R/{}'.format(index % 10)
+        expense['spent_at'] = '2022-05-{:02d}T17:00:00Z'.format(index // 10 + 1)
+        expenses.append(expense)
+
+    expense_objects = Expense.create_expense_objects(expenses, 1)
+
+    # Export setting, AccountingExport rows and their expenses, whatever the number of expenses
+    with django_assert_num_queries(3):
+        AccountingExport.create_accounting_export(expense_objects, 'PERSONAL', 1)
+
+    accounting_exports = AccountingExport.objects.filter(workspace_id=1).order_by('id')
+    assert accounting_exports.count() == 10
+
+    accounting_export = accounting_exports.get(description__report_id='rpReport3')
+    assert accounting_export.status == 'EXPORT_READY'
+    assert accounting_export.description['last_spent_at'] == '2022-05-10'
+    assert accounting_export.description['claim_number'] == 'C/2022/05/R/3'
+    assert accounting_export.expenses.count() == 10
+    assert Expense.objects.filter(accountingexport__isnull=True).count() == 0
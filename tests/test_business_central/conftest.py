@@ -17,6 +17,7 @@ from fyle_accounting_mappings.models import (
     MappingSetting,
     ExpenseField
 )
+from apps.business_central.exports.mapping_resolver import MappingResolver
 from apps.business_central.models import JournalEntry, JournalEntryLineItems
 from apps.business_central.models import PurchaseInvoice, PurchaseInvoiceLineitems
 from apps.business_central.utils import BusinessCentralConnector
@@ -205,7 +206,8 @@ def create_journal_line_items(
     journal_line_items = JournalEntryLineItems.create_or_update_object(
         accounting_export=accounting_export,
         advance_setting=advanced_setting,
-        export_settings=export_settings
+        export_settings=export_settings,
+        mapping_resolver=MappingResolver(workspace_id, list(accounting_export.expenses.all()))
     )
 
     return journal_line_items
@@ -249,7 +251,8 @@ def create_purchase_invoice_line_items(
     purchase_invoice_line_items = PurchaseInvoiceLineitems.create_or_update_object(
         accounting_export=accounting_export,
         advance_setting=advanced_setting,
-        _=export_settings
+        _=export_settings,
+        mapping_resolver=MappingResolver(workspace_id, list(accounting_export.expenses.all()))
     )
 
     return purchase_invoice_line_items
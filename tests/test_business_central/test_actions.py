@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+from apps.accounting_exports.models import AccountingExport, AccountingExportSummary
+from apps.business_central.actions import (
+    reconcile_accounting_export_summaries,
+    update_accounting_export_status,
+    update_accounting_export_summary,
+)
+
+
+def get_summary_counts(workspace_id: int):
+    accounting_export_summary = AccountingExportSummary.objects.get(workspace_id=workspace_id)
+
+    return (
+        accounting_export_summary.failed_accounting_export_count,
+        accounting_export_summary.successful_accounting_export_count,
+        accounting_export_summary.total_accounting_export_count
+    )
+
+
+def test_update_accounting_export_status(
+    db,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses,
+    add_accounting_export_summary
+):
+    workspace_id = 1
+    accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
+
+    update_accounting_export_status(accounting_export, 'FAILED')
+    assert get_summary_counts(workspace_id) == (6, 5, 11)
+
+    # A stale copy of the export still moves the counters from the saved status
+    stale_accounting_export = AccountingExport.objects.get(id=accounting_export.id)
+    update_accounting_export_status(accounting_export, 'FATAL')
+    update_accounting_export_status(stale_accounting_export, 'IN_PROGRESS')
+    assert get_summary_counts(workspace_id) == (5, 5, 10)
+
+    update_accounting_export_status(accounting_export, 'COMPLETE')
+    update_accounting_export_status(accounting_export, 'COMPLETE')
+    assert get_summary_counts(workspace_id) == (5, 6, 11)
+    assert AccountingExport.objects.get(id=accounting_export.id).status == 'COMPLETE'
+
+    accounting_export.type = 'FETCHING_REIMBURSABLE_EXPENSES'
+    update_accounting_export_status(accounting_export, 'FAILED')
+    assert get_summary_counts(workspace_id) == (5, 6, 11)
+
+
+def test_reconcile_accounting_export_summaries(
+    db,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses,
+    add_accounting_export_summary
+):
+    workspace_id = 1
+    AccountingExportSummary.objects.filter(workspace_id=workspace_id).update(
+        last_exported_at=datetime.now(tz=timezone.utc) - timedelta(minutes=5)
+    )
+
+    accounting_exports = AccountingExport.objects.filter(workspace_id=workspace_id).order_by('id')
+    AccountingExport.objects.filter(id=accounting_exports[0].id).update(status='COMPLETE')
+    AccountingExport.objects.filter(id__in=[accounting_export.id for accounting_export in accounting_exports[1:]]).update(status='FATAL')
+
+    failed_count = accounting_exports.count() - 1
+
+    reconcile_accounting_export_summaries()
+
+    assert get_summary_counts(workspace_id) == (failed_count, 1, failed_count + 1)
+    assert get_summary_counts(2) == (0, 0, 0)
+
+    assert update_accounting_export_summary(workspace_id).total_accounting_export_count == failed_count + 1
@@ -82,8 +82,15 @@ def test_handle_business_central_exceptions(
     def test_func(accounting_export):
         raise InvalidTokenError(response = 'Error', msg = 'Error')
 
+    accounting_export.status = 'IN_PROGRESS'
+    accounting_export.save()
+
     test_func(accounting_export)
 
+    accounting_export.refresh_from_db()
+    assert accounting_export.status == 'FAILED'
+    assert accounting_export.detail == {'accounting_export_id': accounting_export.id, 'message': 'Business Central Account token expired'}
+
     business_central_credentials = BusinessCentralCredentials.objects.filter(workspace_id=workspace_id).first()
     assert business_central_credentials.is_expired == True
     assert business_central_credentials.refresh_token == None
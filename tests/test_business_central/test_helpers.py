@@ -1,3 +1,4 @@
+import copy
 import pytest
 from datetime import datetime, timedelta, timezone
 
@@ -7,8 +8,10 @@ from apps.business_central.exports.helpers import (
     __validate_category_mapping,
     __validate_employee_mapping,
     validate_accounting_export,
+    validate_category_mappings,
+    validate_employee_mappings,
     resolve_errors_for_exported_accounting_export,
-    load_attachments
+    load_accounting_export_attachments
 )
 
 from apps.business_central.helpers import (
@@ -24,11 +27,12 @@ from fyle_accounting_mappings.models import (
 )
 
 from apps.accounting_exports.models import AccountingExport, Error
-from apps.business_central.utils import BusinessCentralConnector, BusinessCentralCredentials
+from apps.business_central.utils import BusinessCentralCredentials
 from apps.fyle.models import Expense
 from apps.workspaces.models import ExportSetting, Workspace
 
 from ms_business_central_api.exceptions import BulkError
+from tests.test_business_central.fixtures import data
 
 
 def test_get_employee_expense_attribute(
@@ -80,58 +84,7 @@ def test_resolve_errors_for_exported_accounting_export(
     assert error.type == 'EMPLOYEE_MAPPING'
 
 
-def test_load_attachments_1(
-    db,
-    mocker,
-    create_temp_workspace,
-    add_business_central_creds,
-    add_fyle_credentials,
-    create_export_settings,
-    create_accounting_export_expenses
-):
-    workspace_id = 1
-
-    expense = Expense.objects.filter(workspace_id=workspace_id).first()
-    accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
-
-    business_central_creds = BusinessCentralCredentials.objects.filter(workspace_id=workspace_id).first()
-    business_central_creds.workspace.business_central_company_id = "Business_Company_Id"
-    business_central_creds.save()
-
-    dynamic_connection_mock = mocker.patch('dynamics.core.client.Dynamics')
-    dynamic_connection_mock.return_value.refresh_token = 'Dummy_Token'
-    platform_mock = mocker.patch('fyle_integrations_platform_connector.PlatformConnector')
-    mock_generate_file_urls = mocker.patch.object(
-        platform_mock.return_value.files,
-        'bulk_generate_file_urls',
-        return_value=[
-            {
-                'id':1,
-                'data':'dummy'
-            }
-        ]
-    )
-
-    business_central_connection = BusinessCentralConnector(
-        credentials_object=business_central_creds,
-        workspace_id=workspace_id
-    )
-
-    mock_post_attachments = mocker.patch.object(business_central_connection, 'post_attachments')
-
-    load_attachments(
-        business_central_connection=business_central_connection,
-        ref_id="Ref_Id",
-        ref_type="Ref_Type",
-        expense=expense,
-        accounting_export=accounting_export
-    )
-
-    assert mock_post_attachments.call_count == 0
-    assert mock_generate_file_urls.call_count == 0
-
-
-def test_load_attachments_2(
+def test_load_accounting_export_attachments(
     db,
     mocker,
     create_temp_workspace,
@@ -145,92 +98,62 @@ def test_load_attachments_2(
     accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
     expense = Expense.objects.filter(workspace_id=workspace_id).first()
 
-    expense.file_ids = [1, 2, 3]
+    expense.file_ids = ['fi1', 'fi2']
     expense.save()
 
-    business_central_creds = BusinessCentralCredentials.objects.filter(workspace_id=workspace_id).first()
-    business_central_creds.workspace.business_central_company_id = "Business_Company_Id"
-    business_central_creds.save()
-
-    dynamic_connection_mock = mocker.patch('apps.business_central.utils.Dynamics')
-    dynamic_connection_mock.return_value.refresh_token = 'Dummy_Token'
     platform_mock = mocker.patch('apps.business_central.exports.helpers.PlatformConnector')
     mock_generate_file_urls = mocker.patch.object(
         platform_mock.return_value.files,
         'bulk_generate_file_urls',
         return_value=[
-            {
-                'id':1,
-                'data':'dummy'
-            }
+            {'id': 'fi1', 'name': 'receipt_1.png', 'content_type': 'image/png', 'download_url': 'ZHVtbXk='},
+            {'id': 'fi2', 'name': 'receipt_2.png', 'content_type': 'image/png', 'download_url': 'ZHVtbXk='}
         ]
     )
 
-    business_central_connection = BusinessCentralConnector(
-        credentials_object=business_central_creds,
-        workspace_id=workspace_id
-    )
+    def post_attachment(ref_type, ref_id, attachment):
+        if ref_id == 'Ref_Id_2':
+            raise Exception('Upload failed')
+        return {'id': 'Attachment_Id'}
 
-    assert business_central_creds.refresh_token == 'Dummy_Token'
+    business_central_connection = mocker.MagicMock()
+    business_central_connection.post_attachment.side_effect = post_attachment
 
-    mock_post_attachments = mocker.patch.object(business_central_connection, 'post_attachments')
-
-    load_attachments(
-        business_central_connection=business_central_connection,
-        ref_id="Ref_Id",
-        ref_type="Ref_Type",
-        expense=expense,
-        accounting_export=accounting_export
+    results = load_accounting_export_attachments(
+        business_central_connection,
+        accounting_export,
+        [('Journal', 'Ref_Id_1', expense), ('Journal', 'Ref_Id_2', expense)]
     )
 
-    assert mock_post_attachments.call_count == 1
     assert mock_generate_file_urls.call_count == 1
-
-
-def test_load_attachments_3(
-    db,
-    mocker,
-    create_temp_workspace,
-    add_business_central_creds,
-    add_fyle_credentials,
-    create_export_settings,
-    create_accounting_export_expenses
-):
-    workspace_id = 1
-
-    expense = Expense.objects.filter(workspace_id=workspace_id).first()
-    accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
-
-    business_central_creds = BusinessCentralCredentials.objects.filter(workspace_id=workspace_id).first()
-    business_central_creds.workspace.business_central_company_id = "Business_Company_Id"
-    business_central_creds.save()
-
-    dynamic_connection_mock = mocker.patch('apps.business_central.utils.Dynamics')
-    dynamic_connection_mock.return_value.refresh_token = 'Dummy_Token'
-    platform_mock = mocker.patch(
-        'apps.business_central.exports.helpers.PlatformConnector',
-        side_effect=Exception('Error')
-    )
-
-    business_central_connection = BusinessCentralConnector(
-        credentials_object=business_central_creds,
-        workspace_id=workspace_id
+    assert mock_generate_file_urls.call_args[0][0] == [{'id': 'fi1'}, {'id': 'fi2'}]
+    assert business_central_connection.post_attachment.call_count == 4
+    assert [(result['ref_id'], result['file_id'], result['success']) for result in results] == [
+        ('Ref_Id_1', 'fi1', True),
+        ('Ref_Id_1', 'fi2', True),
+        ('Ref_Id_2', 'fi1', False),
+        ('Ref_Id_2', 'fi2', False)
+    ]
+    assert results[2]['error'] == 'Upload failed'
+
+    # Files uploaded by an earlier attempt are skipped
+    results = load_accounting_export_attachments(
+        business_central_connection,
+        accounting_export,
+        [('Journal', 'Ref_Id_1', expense), ('Journal', 'Ref_Id_2', expense)],
+        uploaded_files={('Ref_Id_1', 'fi1'), ('Ref_Id_1', 'fi2'), ('Ref_Id_2', 'fi1')}
     )
 
-    assert business_central_creds.refresh_token == 'Dummy_Token'
+    assert [(result['ref_id'], result['file_id']) for result in results] == [('Ref_Id_2', 'fi2')]
+    assert mock_generate_file_urls.call_args[0][0] == [{'id': 'fi2'}]
 
-    with pytest.raises(Exception) as e:
-        load_attachments(
-            business_central_connection=business_central_connection,
-            ref_id="Ref_Id",
-            ref_type="Ref_Type",
-            expense=expense,
-            accounting_export=accounting_export
-        )
+    expense.file_ids = []
+    expense.save()
 
-        assert str(e.value) == 'Error'
+    results = load_accounting_export_attachments(business_central_connection, accounting_export, [('Journal', 'Ref_Id_1', expense)])
 
-    assert platform_mock.call_count == 1
+    assert results == []
+    assert mock_generate_file_urls.call_count == 2
 
 
 def test_get_filtered_mapping(
@@ -444,6 +367,52 @@ def test_validate_accounting_export(
         assert e.value.response[1]['type'] == 'Category Mapping'
 
 
+def test_validate_mappings_in_bulk(
+    db,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses,
+    create_category_mapping,
+    create_employee_mapping_with_employee,
+    django_assert_max_num_queries
+):
+    workspace_id = 1
+    export_settings = ExportSetting.objects.filter(workspace_id=workspace_id).first()
+    CategoryMapping.objects.filter(workspace_id=workspace_id).delete()
+
+    accounting_exports = [AccountingExport.objects.filter(workspace_id=workspace_id).first()]
+    accounting_exports.append(AccountingExport.objects.create(
+        workspace_id=workspace_id, fund_source='PERSONAL', status='EXPORT_READY', description={'employee_email': 'jane@fyle.in'}
+    ))
+
+    expenses = []
+    for index in range(50):
+        expense = copy.deepcopy(data['expenses'][0])
+        expense['id'] = 'txExpense{}'.format(index)
+        expenses.append(expense)
+    accounting_exports[1].expenses.add(*Expense.create_expense_objects(expenses, workspace_id))
+
+    # The number of queries does not depend on the number of line items
+    with django_assert_max_num_queries(8):
+        category_mapping_errors = validate_category_mappings(workspace_id, accounting_exports)
+        employee_mapping_errors = validate_employee_mappings(workspace_id, accounting_exports, export_settings)
+
+    assert len(category_mapping_errors[accounting_exports[0].id]) == 1
+    assert len(category_mapping_errors[accounting_exports[1].id]) == 50
+    assert category_mapping_errors[accounting_exports[1].id][49]['row'] == 49
+    assert employee_mapping_errors[accounting_exports[0].id] == []
+    assert employee_mapping_errors[accounting_exports[1].id][0]['type'] == 'Employee Mapping'
+
+    error = Error.objects.get(workspace_id=workspace_id, type='CATEGORY_MAPPING')
+    assert error.repetition_count == 51
+
+    validate_category_mappings(workspace_id, accounting_exports[:1])
+
+    error.refresh_from_db()
+    assert error.repetition_count == 52
+    assert Error.objects.filter(workspace_id=workspace_id).count() == 1
+
+
 def test_check_interval_and_sync_dimension(
     db,
     mocker,
@@ -458,7 +427,7 @@ def test_check_interval_and_sync_dimension(
     workspace.destination_synced_at = None
     workspace.save()
 
-    sync_dimensions_mock = mocker.patch('apps.business_central.helpers.sync_dimensions', return_value=None)
+    sync_dimensions_mock = mocker.patch('apps.business_central.helpers.sync_dimensions', return_value={'vendors': {'duration': 0.1, 'error': None}})
 
     return_value = check_interval_and_sync_dimension(
         workspace=workspace,
@@ -466,7 +435,7 @@ def test_check_interval_and_sync_dimension(
     )
 
     assert sync_dimensions_mock.call_count == 1
-    assert return_value == True
+    assert return_value == {'vendors': {'duration': 0.1, 'error': None}}
 
     workspace.destination_synced_at = datetime.now(timezone.utc) - timedelta(days=2)
     workspace.save()
@@ -477,7 +446,7 @@ def test_check_interval_and_sync_dimension(
     )
 
     assert sync_dimensions_mock.call_count == 2
-    assert return_value == True
+    assert return_value == {'vendors': {'duration': 0.1, 'error': None}}
 
     workspace.destination_synced_at = datetime.now(timezone.utc)
     workspace.save()
@@ -488,7 +457,7 @@ def test_check_interval_and_sync_dimension(
     )
 
     assert sync_dimensions_mock.call_count == 2
-    assert return_value == False
+    assert return_value is None
 
 
 def test_sync_dimensions(
@@ -538,3 +507,27 @@ def test_sync_dimensions(
         )
 
         assert str(e.value) == 'Error'
+
+
+def test_sync_dimensions_isolates_errors(
+    db,
+    mocker,
+    create_temp_workspace,
+    add_business_central_creds
+):
+    workspace_id = 1
+
+    business_central_creds = BusinessCentralCredentials.objects.get(workspace_id=workspace_id)
+    business_central_connection_mock = mocker.patch('apps.business_central.utils.BusinessCentralConnector')
+    business_central_connection_mock.return_value.sync_vendors.side_effect = Exception('Vendors failed')
+
+    results = sync_dimensions(
+        business_central_credential=business_central_creds,
+        workspace_id=workspace_id
+    )
+
+    assert list(results.keys()) == ['companies', 'accounts', 'vendors', 'employees', 'locations', 'bank_accounts', 'dimensions']
+    assert results['vendors']['error'] == 'Vendors failed'
+    assert all(result['error'] is None for dimension, result in results.items() if dimension != 'vendors')
+    assert all(result['duration'] >= 0 for result in results.values())
+    assert business_central_connection_mock.return_value.sync_dimensions.call_count == 1
@@ -1,10 +1,14 @@
+import copy
+
 import pytest
-from fyle_accounting_mappings.models import EmployeeMapping, ExpenseAttribute, Mapping, MappingSetting
+from fyle_accounting_mappings.models import DestinationAttribute, EmployeeMapping, ExpenseAttribute, Mapping, MappingSetting
 
 from apps.accounting_exports.models import AccountingExport, Expense
 from apps.business_central.exports.accounting_export import AccountingDataExporter
+from apps.business_central.exports.mapping_resolver import MappingResolver
 from apps.business_central.models import JournalEntry, JournalEntryLineItems, PurchaseInvoice, PurchaseInvoiceLineitems
 from apps.workspaces.models import AdvancedSetting, ExportSetting
+from tests.test_business_central.fixtures import data
 
 
 def test_create_or_update_journal_entry_1(
@@ -139,7 +143,8 @@ def test_create_or_update_journal_entry_line_items(
     journal_line_items = JournalEntryLineItems.create_or_update_object(
         accounting_export=AccountingExport.objects.get(workspace_id=workspace_id),
         advance_setting=AdvancedSetting.objects.get(workspace_id=workspace_id),
-        export_settings=ExportSetting.objects.get(workspace_id=workspace_id)
+        export_settings=ExportSetting.objects.get(workspace_id=workspace_id),
+        mapping_resolver=MappingResolver(workspace_id, list(Expense.objects.filter(workspace_id=workspace_id)))
     )
 
     assert len(journal_line_items) == 1
@@ -190,7 +195,8 @@ def test_create_or_update_purchase_invoice_line_items(
     purchase_invoice_line_items = PurchaseInvoiceLineitems.create_or_update_object(
         accounting_export=AccountingExport.objects.get(workspace_id=workspace_id),
         advance_setting=AdvancedSetting.objects.get(workspace_id=workspace_id),
-        _=ExportSetting.objects.get(workspace_id=workspace_id)
+        _=ExportSetting.objects.get(workspace_id=workspace_id),
+        mapping_resolver=MappingResolver(workspace_id, list(Expense.objects.filter(workspace_id=workspace_id)))
     )
 
     assert len(purchase_invoice_line_items) == 1
@@ -198,6 +204,50 @@ def test_create_or_update_purchase_invoice_line_items(
     assert purchase_invoice_line_items[0].purchase_invoice.amount == 50
 
 
+def test_create_or_update_purchase_invoice_line_items_in_bulk(
+        db,
+        create_temp_workspace,
+        create_export_settings,
+        add_advanced_settings,
+        create_accounting_export_expenses,
+        create_employee_mapping_with_employee,
+        create_category_mapping,
+        django_assert_max_num_queries
+):
+    workspace_id = 1
+    accounting_export = AccountingExport.objects.get(workspace_id=workspace_id)
+    advance_setting = AdvancedSetting.objects.get(workspace_id=workspace_id)
+
+    expenses = []
+    for index in range(100):
+        expense = copy.deepcopy(data['expenses'][0])
+        expense['id'] = 'txExpense{}'.format(index)
+        expense['amount'] = index
+        expense['category'] = 'Food' if index % 2 else 'Travel'
+        expenses.append(expense)
+    accounting_export.expenses.add(*Expense.create_expense_objects(expenses, workspace_id))
+
+    PurchaseInvoice.create_or_update_object(accounting_export, advance_setting, ExportSetting.objects.get(workspace_id=workspace_id))
+
+    # The number of queries does not depend on the number of line items
+    with django_assert_max_num_queries(10):
+        mapping_resolver = MappingResolver(workspace_id, list(accounting_export.expenses.all()))
+        purchase_invoice_line_items = PurchaseInvoiceLineitems.create_or_update_object(accounting_export, advance_setting, None, mapping_resolver)
+
+    assert len(purchase_invoice_line_items) == 101
+    assert len({purchase_invoice_line_item.id for purchase_invoice_line_item in purchase_invoice_line_items}) == 101
+
+    line_items = {line_item.expense.expense_id: line_item for line_item in purchase_invoice_line_items}
+    assert line_items['txExpense1'].accounts_payable_account_id == 'dest_category123'
+    assert line_items['txExpense2'].accounts_payable_account_id is None
+
+    Expense.objects.filter(expense_id='txExpense3').update(amount=1000)
+    PurchaseInvoiceLineitems.create_or_update_object(accounting_export, advance_setting, None, mapping_resolver)
+
+    assert PurchaseInvoiceLineitems.objects.count() == 101
+    assert PurchaseInvoiceLineitems.objects.get(expense__expense_id='txExpense3').amount == 1000
+
+
 def test_accounting_data_exporter_1():
     workspace_id = 1
     accounting_data_exporter = AccountingDataExporter()
@@ -371,7 +421,7 @@ def test_base_model_get_location_id_1(
     accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
     expenses = Expense.objects.filter(workspace_id=workspace_id).first()
 
-    location_id = base_model.get_location_id(accounting_export, expenses)
+    location_id = base_model.get_location_id(accounting_export, expenses, MappingResolver(workspace_id, [expenses]))
 
     assert location_id is None
 
@@ -408,7 +458,7 @@ def test_base_model_get_location_id_2(
     mapping.destination_type = 'LOCATION'
     mapping.save()
 
-    location_id = base_model.get_location_id(accounting_export, expenses)
+    location_id = base_model.get_location_id(accounting_export, expenses, MappingResolver(workspace_id, [expenses]))
     assert location_id == mapping.destination.destination_id
 
     mapping_setting.source_field = 'COST_CENTER'
@@ -420,7 +470,7 @@ def test_base_model_get_location_id_2(
     mapping.source = expense_attribute
     mapping.save()
 
-    location_id = base_model.get_location_id(accounting_export, expenses)
+    location_id = base_model.get_location_id(accounting_export, expenses, MappingResolver(workspace_id, [expenses]))
     assert location_id == mapping.destination.destination_id
 
     mapping_setting.source_field = 'CUSTOM'
@@ -439,10 +489,36 @@ def test_base_model_get_location_id_2(
     }
     expenses.save()
 
-    location_id = base_model.get_location_id(accounting_export, expenses)
+    location_id = base_model.get_location_id(accounting_export, expenses, MappingResolver(workspace_id, [expenses]))
     assert location_id == mapping.destination.destination_id
 
 
+def test_base_model_get_account_id_type_merchant(
+    db,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses
+):
+    workspace_id = 1
+    export_settings = ExportSetting.objects.get(workspace_id=workspace_id)
+    export_settings.name_in_journal_entry = 'MERCHANT'
+    export_settings.default_vendor_id = 'default_vendor'
+    export_settings.save()
+
+    accounting_export = AccountingExport.objects.get(workspace_id=workspace_id)
+    accounting_export.fund_source = 'CCC'
+
+    DestinationAttribute.objects.create(
+        workspace_id=workspace_id, attribute_type='VENDOR', display_name='vendor', value=' Acme\t Corp  ', destination_id='acme'
+    )
+
+    for merchant in ['Acme Corp', 'acme corp', '  ACME   corp\n']:
+        assert JournalEntry.get_account_id_type(accounting_export, export_settings, merchant) == ('Vendor', 'acme')
+
+    assert JournalEntry.get_account_id_type(accounting_export, export_settings, 'Acme Corporation') == ('Vendor', 'default_vendor')
+    assert JournalEntry.get_account_id_type(accounting_export, export_settings, None) == ('Vendor', 'default_vendor')
+
+
 def test_get_expense_purpose(
     db,
     create_temp_workspace,
@@ -481,3 +557,51 @@ def test_get_expense_comment(
         advance_setting=advanced_settings
     )
     assert return_value == 'Food - ashwin.t@fyle.in'
+
+
+def test_mapping_resolver(
+    db,
+    create_temp_workspace,
+    create_expense_objects,
+    create_mapping_settings,
+    django_assert_num_queries
+):
+    workspace_id = 1
+    expense = Expense.objects.filter(workspace_id=workspace_id).first()
+
+    source = ExpenseAttribute.objects.create(
+        attribute_type='COST_CENTER', display_name='Cost Center', value='Marketing', source_id='cc1', workspace_id=workspace_id
+    )
+    destination = DestinationAttribute.objects.create(
+        attribute_type='DEPARTMENT', display_name='Department', value='Sales', destination_id='dept1',
+        detail={'dimension_id': 'dim1', 'code': 'SALES'}, workspace_id=workspace_id
+    )
+    MappingSetting.objects.create(source_field='COST_CENTER', destination_field='DEPARTMENT', workspace_id=workspace_id)
+    Mapping.objects.create(
+        source_type='COST_CENTER', destination_type='DEPARTMENT', source=source, destination=destination, workspace_id=workspace_id
+    )
+
+    # Mappings of source values no line item carries are not loaded
+    other_source = ExpenseAttribute.objects.create(
+        attribute_type='COST_CENTER', display_name='Cost Center', value='Finance', source_id='cc2', workspace_id=workspace_id
+    )
+    Mapping.objects.create(
+        source_type='COST_CENTER', destination_type='DEPARTMENT', source=other_source, destination=destination, workspace_id=workspace_id
+    )
+
+    mapping_resolver = MappingResolver(workspace_id, [expense])
+
+    assert list(mapping_resolver.mappings) == [('COST_CENTER', 'DEPARTMENT', 'Marketing')]
+
+    # Every line item is answered from the preloaded mappings
+    with django_assert_num_queries(0):
+        assert mapping_resolver.get_location_id(expense) is None
+        assert mapping_resolver.get_dimensions(expense) == [{
+            'id': 'dim1', 'code': 'DEPARTMENT', 'valueId': 'dept1', 'valueCode': 'SALES', 'expense_number': expense.expense_number
+        }]
+
+    # The next export run sees changes to the mapped destination attributes
+    destination.detail = {'dimension_id': 'dim1', 'code': 'SALES_EMEA'}
+    destination.save()
+
+    assert MappingResolver(workspace_id, [expense]).get_dimensions(expense)[0]['valueCode'] == 'SALES_EMEA'
@@ -1,3 +1,11 @@
+import pytest
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from dynamics.exceptions.dynamics_exceptions import WrongParamsError
+
+from apps.accounting_exports.models import AccountingExport, AccountingExportSummary, Error
 from apps.business_central.exports.journal_entry.queues import (
     check_accounting_export_and_start_import
     as
@@ -8,6 +16,16 @@ from apps.business_central.exports.purchase_invoice.queues import (
     as
     check_accounting_export_and_start_import_purchase_invoice
 )
+from apps.business_central.exports.journal_entry.models import JournalEntry
+from apps.business_central.exports.journal_entry.tasks import create_journal_entry
+from apps.business_central.exports.queues import (
+    complete_export_lane,
+    enqueue_accounting_exports,
+    export_slot,
+    get_export_lanes,
+    run_export_lane,
+    start_export_lanes
+)
 
 
 def test_check_accounting_export_and_start_import_journal_entry(
@@ -98,3 +116,171 @@ def test_check_accounting_export_and_start_import_purchase_invoice(
 
     assert accounting_export.status == 'COMPLETE'
     assert accounting_export.type == 'PURCHASE_INVOICE'
+
+
+def test_failed_export_is_queued_again(
+    db,
+    mocker,
+    add_business_central_creds,
+    add_accounting_export_summary,
+    create_journal_line_items
+):
+    accounting_export = AccountingExport.objects.get(workspace_id=1)
+
+    schedule_accounting_exports = mocker.patch('apps.business_central.exports.journal_entry.queues.schedule_accounting_exports')
+    mocker.patch('apps.business_central.exports.accounting_export.validate_accounting_export')
+    business_central_connection = mocker.MagicMock()
+    mocker.patch('apps.business_central.exports.journal_entry.tasks.BusinessCentralConnector', return_value=business_central_connection)
+    business_central_connection.bulk_post_journal_lineitems.return_value = {'responses': [{'body': {'id': 'balancing'}}, {'body': {'id': 'line'}}]}
+
+    # The lines are posted but the attachments stage fails
+    load_accounting_export_attachments = mocker.patch(
+        'apps.business_central.exports.journal_entry.tasks.load_accounting_export_attachments',
+        side_effect=[WrongParamsError('Some of the parameters are wrong', 'Bad request'), []]
+    )
+
+    check_accounting_export_and_start_import_journal_entry(1, [accounting_export.id], False, 0)
+    create_journal_entry(schedule_accounting_exports.call_args[0][1][0], False)
+
+    accounting_export.refresh_from_db()
+    assert accounting_export.status == 'FAILED'
+    assert JournalEntry.objects.filter(accounting_export=accounting_export).exists()
+    assert 'lines' in accounting_export.export_checkpoints
+
+    # The failed export keeps its staged journal entry and is queued again, resuming after the posted lines
+    check_accounting_export_and_start_import_journal_entry(1, [accounting_export.id], False, 0)
+
+    assert [queued.id for queued in schedule_accounting_exports.call_args[0][1]] == [accounting_export.id]
+
+    create_journal_entry(schedule_accounting_exports.call_args[0][1][0], False)
+
+    accounting_export.refresh_from_db()
+    assert accounting_export.status == 'COMPLETE'
+    assert business_central_connection.bulk_post_journal_lineitems.call_count == 1
+    assert load_accounting_export_attachments.call_count == 2
+    assert JournalEntry.objects.filter(accounting_export=accounting_export).count() == 1
+
+
+def test_get_export_lanes():
+    assert get_export_lanes([1, 2, 3, 4, 5], 2) == [[1, 3, 5], [2, 4]]
+    assert get_export_lanes([1], 4) == [[1]]
+    assert get_export_lanes([], 2) == []
+
+
+def test_run_export_lane(
+    db,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses,
+    mocker
+):
+    accounting_export = create_accounting_export_expenses
+    export_task = 'apps.business_central.exports.journal_entry.tasks.create_journal_entry'
+
+    create_journal_entry = mocker.patch(export_task)
+    async_task = mocker.patch('apps.business_central.exports.queues.async_task')
+    schedule = mocker.patch('apps.business_central.exports.queues.schedule')
+    complete_export_lane = mocker.patch('apps.business_central.exports.queues.complete_export_lane')
+
+    run_export_lane(1, export_task, [accounting_export.id, 2], 'lanes')
+
+    create_journal_entry.assert_called_once_with(accounting_export, False)
+    async_task.assert_called_once_with('apps.business_central.exports.queues.run_export_lane', 1, export_task, [2], 'lanes')
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+        assert cursor.fetchone()[0] == 0
+
+        with export_slot(accounting_export.workspace_id) as acquired:
+            assert acquired
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+            assert cursor.fetchone()[0] == 2
+
+    # An export raising still frees its slots and moves the lane on, so the last lane completes the batch
+    create_journal_entry.side_effect = Exception('Export failed')
+
+    with pytest.raises(Exception, match='Export failed'):
+        run_export_lane(1, export_task, [accounting_export.id], 'lanes')
+
+    async_task.assert_called_with('apps.business_central.exports.queues.run_export_lane', 1, export_task, [], 'lanes')
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+        assert cursor.fetchone()[0] == 0
+
+    create_journal_entry.side_effect = None
+
+    # A lane finding every slot of the workspace taken is scheduled again instead of waiting
+    mocker.patch('apps.business_central.exports.queues.__try_advisory_lock', return_value=False)
+
+    run_export_lane(1, export_task, [accounting_export.id, 2], 'lanes')
+
+    assert create_journal_entry.call_count == 2
+    assert async_task.call_count == 2
+    assert schedule.call_args[0] == ('apps.business_central.exports.queues.run_export_lane', 1, export_task, [accounting_export.id, 2], 'lanes')
+
+    run_export_lane(1, export_task, [], 'lanes')
+
+    complete_export_lane.assert_called_once_with(1, 'lanes')
+
+
+def test_complete_export_lane(
+    db,
+    create_temp_workspace,
+    add_accounting_export_summary,
+    create_export_settings,
+    create_accounting_export_expenses,
+    mocker
+):
+    first_accounting_export = create_accounting_export_expenses
+    # An export stuck in progress does not hold the summary back
+    second_accounting_export = AccountingExport.objects.create(workspace_id=1, fund_source='PERSONAL', status='IN_PROGRESS')
+
+    async_task = mocker.patch('apps.business_central.exports.queues.async_task')
+    update_accounting_export_summary = mocker.patch('apps.business_central.exports.queues.update_accounting_export_summary')
+
+    start_export_lanes(1, [[first_accounting_export], [second_accounting_export]], 'export_task')
+
+    assert async_task.call_count == 2
+    lanes_key = async_task.call_args[0][4]
+
+    complete_export_lane(1, lanes_key)
+    assert update_accounting_export_summary.call_count == 0
+
+    complete_export_lane(1, lanes_key)
+    update_accounting_export_summary.assert_called_once_with(1)
+
+
+def test_enqueue_accounting_exports(
+    db,
+    create_temp_workspace,
+    add_accounting_export_summary
+):
+    def enqueue(count: int):
+        accounting_exports = AccountingExport.objects.bulk_create([
+            AccountingExport(workspace_id=1, fund_source='PERSONAL', status='FAILED') for _ in range(count)
+        ])
+
+        # The first export fails repeatedly and is exported only once a day
+        Error.objects.create(
+            workspace_id=1, accounting_export=accounting_exports[0], type='BUSINESS_CENTRAL_ERROR',
+            error_title='Failed', error_detail='Failed', repetition_count=101, is_resolved=False
+        )
+        Error.objects.filter(accounting_export=accounting_exports[0]).update(updated_at=datetime.now(tz=timezone.utc))
+
+        with CaptureQueriesContext(connection) as queries:
+            enqueued_accounting_exports = enqueue_accounting_exports(1, accounting_exports, 'JOURNAL_ENTRY', True, 1)
+
+        return accounting_exports, enqueued_accounting_exports, len(queries)
+
+    accounting_exports, enqueued_accounting_exports, small_query_count = enqueue(5)
+
+    assert [accounting_export.id for accounting_export in enqueued_accounting_exports] == [accounting_export.id for accounting_export in accounting_exports[1:]]
+    assert set(AccountingExport.objects.filter(id__in=[accounting_export.id for accounting_export in accounting_exports[1:]]).values_list('status', 'type')) == {('ENQUEUED', 'JOURNAL_ENTRY')}
+    assert AccountingExport.objects.get(id=accounting_exports[0].id).status == 'FAILED'
+    assert AccountingExportSummary.objects.get(workspace_id=1).failed_accounting_export_count == 1
+
+    _, enqueued_accounting_exports, large_query_count = enqueue(500)
+
+    assert len(enqueued_accounting_exports) == 499
+    assert large_query_count == small_query_count
@@ -0,0 +1,105 @@
+import pytest
+from dynamics.apis import Attachments
+from dynamics.exceptions.dynamics_exceptions import DynamicsError, InternalServerError, WrongParamsError
+
+from apps.business_central.rate_limiter import RateLimitedConnection, RateLimiter, get_retry_after, get_status_code
+
+
+def test_rate_limiter_call(mocker):
+    clock = {'now': 0.0, 'slept': 0.0}
+
+    def sleep(seconds):
+        clock['now'] += seconds
+        clock['slept'] += seconds
+
+    mocker.patch('apps.business_central.rate_limiter.time.monotonic', side_effect=lambda: clock['now'])
+    mocker.patch('apps.business_central.rate_limiter.time.sleep', side_effect=sleep)
+    rate_limiter = RateLimiter(requests_per_second=10, burst=5)
+
+    func = mocker.MagicMock(side_effect=[DynamicsError('Error: 429', 'Too many requests'), {'id': 1}])
+
+    assert rate_limiter.call(func, 'payload') == {'id': 1}
+    assert func.call_count == 2
+    assert rate_limiter.requests_per_second == 5.1
+    # The throttled call holds the bucket back for the two second backoff
+    assert round(clock['slept'], 2) == 2.2
+
+    func = mocker.MagicMock(side_effect=WrongParamsError('Some of the parameters are wrong', 'Bad request'))
+
+    with pytest.raises(WrongParamsError):
+        rate_limiter.call(func)
+
+    assert func.call_count == 1
+
+    func = mocker.MagicMock(side_effect=DynamicsError('Error: 503', 'Service unavailable'))
+
+    with pytest.raises(DynamicsError):
+        rate_limiter.call(func)
+
+    assert func.call_count == 6
+
+    func = mocker.MagicMock(side_effect=DynamicsError('Error: 503', 'Service unavailable'))
+
+    with pytest.raises(DynamicsError):
+        rate_limiter.call(func, retry_status_codes=[429])
+
+    assert func.call_count == 1
+
+    # Retries stop once they would outlast the retry time limit, however many attempts are left
+    mocker.patch('apps.business_central.rate_limiter.RATE_LIMIT_MAX_RETRY_SECONDS', 10)
+    func = mocker.MagicMock(side_effect=DynamicsError('Error: 429', 'Too many requests'))
+
+    with pytest.raises(DynamicsError):
+        rate_limiter.call(func)
+
+    # Backoffs of 2 and 4 seconds fit in the limit, the third of 8 seconds does not
+    assert func.call_count == 3
+
+
+def test_get_status_code():
+    # The SDK raises responses without an exception of their own as DynamicsError('Error: <status code>', response.text)
+    assert get_status_code(DynamicsError('Error: {0}'.format(429), '{"error": {"code": "TooManyRequests"}}')) == 429
+    assert get_status_code(DynamicsError('Error: 503', '')) == 503
+    assert get_status_code(InternalServerError('Internal server error', '')) == 500
+    assert get_status_code(WrongParamsError('Some of the parameters are wrong', '')) == 400
+    assert get_status_code(DynamicsError('Error: 4290', '')) is None
+    assert get_status_code(DynamicsError('Connection reset')) is None
+
+
+def test_get_retry_after():
+    assert get_retry_after(0) == 2
+    assert get_retry_after(3) == 16
+    assert get_retry_after(10) == 60
+
+
+def test_get_limiter(settings):
+    settings.Q_CLUSTER = {**settings.Q_CLUSTER, 'workers': 4}
+    RateLimiter._limiters.clear()
+
+    limiter = RateLimiter.get_limiter('production', 'Company_Id')
+
+    assert RateLimiter.get_limiter('production', 'Company_Id') is limiter
+    assert limiter.requests_per_second == 2.5
+    assert limiter.burst == 1
+
+    RateLimiter._limiters.clear()
+
+
+def test_rate_limited_connection(mocker):
+    rate_limiter = RateLimiter()
+    call = mocker.spy(rate_limiter, 'call')
+
+    dynamics_connection = mocker.MagicMock()
+    dynamics_connection.attachments = Attachments()
+    mocker.patch.object(Attachments, 'post', return_value={'id': 'Attachment_Id'})
+    mocker.patch.object(Attachments, 'get_all', return_value=[])
+
+    connection = RateLimitedConnection(dynamics_connection, rate_limiter)
+
+    assert connection.attachments.post({'parentId': 'Parent_Id'}) == {'id': 'Attachment_Id'}
+    assert call.call_args.kwargs == {'retry_status_codes': [429]}
+    assert connection.attachments.get_all() == []
+    assert call.call_args.kwargs == {'retry_status_codes': [429, 503]}
+    assert connection.attachments is connection.attachments
+    assert call.call_count == 2
+    assert connection.refresh_token == dynamics_connection.refresh_token
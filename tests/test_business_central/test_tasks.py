@@ -1,8 +1,14 @@
+
+import pytest
+from dynamics.exceptions.dynamics_exceptions import WrongParamsError
+
 from apps.business_central.exports.journal_entry.tasks import ExportJournalEntry
 from apps.business_central.exports.purchase_invoice.tasks import ExportPurchaseInvoice
 from apps.business_central.exports.journal_entry.models import JournalEntry, JournalEntryLineItems
 from apps.business_central.exports.purchase_invoice.models import PurchaseInvoice, PurchaseInvoiceLineitems
 from apps.accounting_exports.models import AccountingExport
+from apps.business_central.rate_limiter import RateLimiter
+from apps.workspaces.models import Workspace
 from apps.business_central.exports.journal_entry.tasks import create_journal_entry
 from apps.business_central.exports.purchase_invoice.tasks import create_purchase_invoice
 
@@ -92,18 +98,104 @@ def test_post_export_journal_entry(
         ]
     }
 
-    mocker.patch(
-        'apps.business_central.exports.helpers.load_attachments'
+    load_accounting_export_attachments = mocker.patch(
+        'apps.business_central.exports.journal_entry.tasks.load_accounting_export_attachments',
+        return_value=[{'file_id': 'File_Id', 'ref_id': 67890, 'success': False, 'error': 'Upload failed'}]
     )
 
     export_journal_entry = ExportJournalEntry()
     response = export_journal_entry.post(accounting_export, journal_entry, lineitems)
 
+    assert load_accounting_export_attachments.call_args[0][2] == [('Journal', 67890, accounting_export.expenses.first())]
+    assert response['attachment_results'] == [{'file_id': 'File_Id', 'ref_id': 67890, 'success': False, 'error': 'Upload failed'}]
     assert len(response["responses"]) == 2
     assert response['responses'][0]['body']['id'] == 12345
     assert response['responses'][1]['body']['id'] == 67890
 
 
+def get_journal_entry_dimension_fixtures(line_count: int, dimension_count: int = 3):
+    dimensions = [
+        {
+            'id': 'dimension_{0}'.format(dimension),
+            'code': 'CODE_{0}'.format(dimension),
+            'valueId': 'value_{0}_{1}'.format(line, dimension),
+            'valueCode': 'VALUE_{0}_{1}'.format(line, dimension),
+            'expense_number': 'E/2024/{0}'.format(line),
+            'exported_module_id': line
+        }
+        for line in range(line_count) for dimension in range(dimension_count)
+    ]
+
+    # The balancing line shares the document number of the first expense line
+    responses = [{'body': {'id': 'balancing', 'documentNumber': 'E/2024/0'}}] + [
+        {'body': {'id': 'line_{0}'.format(line), 'documentNumber': 'E/2024/{0}'.format(line)}}
+        for line in range(line_count)
+    ]
+
+    return dimensions, responses
+
+
+def test_construct_journal_entry_dimension_set_line_payload():
+    dimensions, responses = get_journal_entry_dimension_fixtures(2)
+
+    dimension_payload = ExportJournalEntry().construct_dimension_set_line_payload(dimensions, responses)
+
+    assert len(dimension_payload) == 6
+    for payload in dimension_payload:
+        assert payload['parentId'] == 'line_{0}'.format(payload['exported_module_id'])
+        assert 'expense_number' not in payload
+
+    # Dimensions of lines Business Central did not create are skipped
+    dimension_payload = ExportJournalEntry().construct_dimension_set_line_payload(dimensions, responses[:2] + [{'status': 400}])
+
+    assert [payload['parentId'] for payload in dimension_payload] == ['line_0'] * 3
+
+
+class CountingDict(dict):
+    """
+    Dict counting every lookup made on it in a shared counter
+    """
+
+    def __init__(self, counter: dict, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counter = counter
+
+    def __getitem__(self, key):
+        self.counter['lookups'] += 1
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.counter['lookups'] += 1
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.counter['lookups'] += 1
+        return super().__contains__(key)
+
+
+def test_construct_journal_entry_dimension_set_line_payload_scales_linearly():
+    export_journal_entry = ExportJournalEntry()
+
+    def build(line_count: int):
+        counter = {'lookups': 0}
+        dimensions, responses = get_journal_entry_dimension_fixtures(line_count)
+        dimensions = [CountingDict(counter, dimension) for dimension in dimensions]
+        responses = [CountingDict(counter, body=CountingDict(counter, response['body'])) for response in responses]
+
+        dimension_payload = export_journal_entry.construct_dimension_set_line_payload(dimensions, responses)
+
+        return len(dimension_payload), counter['lookups']
+
+    small_size, small_lookups = build(250)
+    large_size, large_lookups = build(1000)
+
+    assert small_size == 250 * 3
+    assert large_size == 1000 * 3
+
+    # 4x the lines makes exactly 4x the lookups, matching dimensions to lines by a cross product would make 16x
+    assert large_lookups == small_lookups * 4
+
+
 def test_create_journal_entry(
     db,
     mocker,
@@ -205,33 +297,160 @@ def test_post_export_purchase_invoice(
         return_value=mocker_instance
     )
 
-    mocker_instance.post_purchase_invoice.return_value = {
-        "purchase_invoice_response": {
-            "id": 12345
-        }
+    mocker_instance.post_purchase_invoice_header.return_value = {
+        "id": 12345
     }
+    mocker_instance.post_purchase_invoice_lineitems.return_value = {
+        "responses": []
+    }
+    mocker_instance.post_dimension_lines.return_value = []
 
-    mocker.patch(
-        'apps.business_central.exports.helpers.load_attachments'
+    load_accounting_export_attachments = mocker.patch(
+        'apps.business_central.exports.purchase_invoice.tasks.load_accounting_export_attachments',
+        return_value=[{'file_id': 'File_Id', 'ref_id': 12345, 'success': True, 'error': None}]
     )
 
     export_purchase_invoice = ExportPurchaseInvoice()
     response = export_purchase_invoice.post(accounting_export, purchase_invoice, lineitems)
 
     assert response['purchase_invoice_response']['id'] == 12345
+    assert response['attachment_results'] == [{'file_id': 'File_Id', 'ref_id': 12345, 'success': True, 'error': None}]
 
-    mocker_instance.post_purchase_invoice.return_value = {
-        "purchase_invoice_response": {
-            "id": 67890
-        }
+    mocker_instance.post_purchase_invoice_header.return_value = {
+        "id": 67890
     }
 
+    # Completed stages are not posted again
+    response = export_purchase_invoice.post(accounting_export, purchase_invoice, lineitems)
+
+    assert response['purchase_invoice_response']['id'] == 12345
+    assert mocker_instance.post_purchase_invoice_header.call_count == 1
+    assert mocker_instance.post_purchase_invoice_lineitems.call_count == 1
+    assert AccountingExport.objects.get(id=accounting_export.id).export_checkpoints['header'] == {'id': 12345}
+    # Uploaded attachments are skipped by the retry
+    assert load_accounting_export_attachments.call_args.kwargs == {'uploaded_files': {(12345, 'File_Id')}}
+
+    # A failed upload is not checkpointed, so the next retry uploads it again
+    load_accounting_export_attachments.return_value = [{'file_id': 'File_Id_2', 'ref_id': 12345, 'success': False, 'error': 'Upload failed'}]
+    export_purchase_invoice.post(accounting_export, purchase_invoice, lineitems)
+
+    assert {result['file_id'] for result in AccountingExport.objects.get(id=accounting_export.id).export_checkpoints['attachments']} == {'File_Id'}
+
+    accounting_export.export_checkpoints = {}
     lineitems.location_id = 'dummy_location_id'
     response = export_purchase_invoice.post(accounting_export, purchase_invoice, lineitems)
 
     assert response['purchase_invoice_response']['id'] == 67890
 
 
+def test_post_export_purchase_invoice_rejected_lines(
+    db,
+    mocker,
+    create_temp_workspace,
+    add_business_central_creds,
+    create_export_settings,
+    create_accounting_export_expenses,
+    create_purchase_invoice,
+    create_purchase_invoice_line_items
+):
+    workspace_id = 1
+    accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
+    purchase_invoice = PurchaseInvoice.objects.filter(workspace_id=workspace_id).first()
+    lineitems = PurchaseInvoiceLineitems.objects.filter(workspace_id=workspace_id)
+
+    mocker_instance = mocker.MagicMock()
+
+    mocker.patch(
+        'apps.business_central.exports.purchase_invoice.tasks.BusinessCentralConnector',
+        return_value=mocker_instance
+    )
+
+    mocker_instance.post_purchase_invoice_header.return_value = {
+        "id": 12345
+    }
+    mocker_instance.post_purchase_invoice_lineitems.side_effect = WrongParamsError('Some of the parameters are wrong', ['Invalid account'])
+
+    export_purchase_invoice = ExportPurchaseInvoice()
+
+    with pytest.raises(WrongParamsError):
+        export_purchase_invoice.post(accounting_export, purchase_invoice, lineitems)
+
+    # The rejected lines deleted the purchase invoice, so the retry posts the header again
+    assert AccountingExport.objects.get(id=accounting_export.id).export_checkpoints == {}
+
+
+def test_create_business_central_object_resumes_checkpoints(
+    db,
+    mocker,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses
+):
+    workspace_id = 1
+    accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
+
+    # An earlier attempt checkpointed the header after this accounting export was queued
+    AccountingExport.objects.filter(id=accounting_export.id).update(export_checkpoints={'header': {'id': 12345}})
+
+    mocker.patch('apps.business_central.exports.accounting_export.validate_accounting_export')
+    mocker.patch.object(PurchaseInvoice, 'create_or_update_object')
+    mocker.patch.object(PurchaseInvoiceLineitems, 'create_or_update_object')
+
+    export_purchase_invoice = ExportPurchaseInvoice()
+    post = mocker.patch.object(
+        export_purchase_invoice,
+        'post',
+        side_effect=lambda accounting_export, *_: {'purchase_invoice_response': accounting_export.export_checkpoints['header']}
+    )
+
+    export_purchase_invoice.create_business_central_object(accounting_export)
+
+    accounting_export.refresh_from_db()
+
+    assert post.call_count == 1
+    assert accounting_export.status == 'COMPLETE'
+    assert accounting_export.detail == {'purchase_invoice_response': {'id': 12345}}
+    assert accounting_export.export_checkpoints == {}
+
+
+def test_create_business_central_object_records_metrics(
+    db,
+    mocker,
+    create_temp_workspace,
+    create_export_settings,
+    create_accounting_export_expenses
+):
+    workspace_id = 1
+    accounting_export = AccountingExport.objects.filter(workspace_id=workspace_id).first()
+
+    mocker.patch('apps.business_central.exports.accounting_export.validate_accounting_export')
+    mocker.patch.object(PurchaseInvoice, 'create_or_update_object')
+    mocker.patch.object(PurchaseInvoiceLineitems, 'create_or_update_object')
+
+    limiter = RateLimiter()
+
+    def post_header():
+        Workspace.objects.get(id=workspace_id)
+        return limiter.call(lambda: {'id': 12345})
+
+    export_purchase_invoice = ExportPurchaseInvoice()
+    mocker.patch.object(
+        export_purchase_invoice,
+        'post',
+        side_effect=lambda accounting_export, *_: {'purchase_invoice_response': export_purchase_invoice.run_export_stage(accounting_export, 'header', post_header)}
+    )
+
+    export_purchase_invoice.create_business_central_object(accounting_export)
+
+    accounting_export.refresh_from_db()
+
+    assert set(accounting_export.export_metrics.keys()) == {'validate', 'staging', 'header'}
+    assert accounting_export.export_metrics['validate']['http_call_count'] == 0
+    assert accounting_export.export_metrics['header']['http_call_count'] == 1
+    assert accounting_export.export_metrics['header']['query_count'] == 2
+    assert accounting_export.export_metrics['header']['duration'] >= 0
+
+
 def test_create_purchase_invoice(
     db,
     mocker,
@@ -1,6 +1,10 @@
-from apps.workspaces.models import Workspace
-from datetime import datetime
-from fyle_accounting_mappings.models import DestinationAttribute, Mapping, CategoryMapping
+import pytest
+from django.utils import timezone
+
+from apps.business_central.utils import BusinessCentralConnector
+from apps.workspaces.models import BusinessCentralCredentials, DestinationSyncWatermark
+from datetime import datetime, timedelta
+from fyle_accounting_mappings.models import DestinationAttribute
 from tests.test_business_central.fixtures import data
 
 
@@ -49,6 +53,73 @@ def test_post_attachments(
     assert response['name'] == 'Return_Attachment_Name'
 
 
+def test_get_connection(
+    db,
+    mocker,
+    create_temp_workspace,
+    add_business_central_creds
+):
+    workspace_id = 1
+
+    business_central_creds = BusinessCentralCredentials.objects.get(workspace_id=workspace_id)
+
+    dynamic_connection_mock = mocker.patch('apps.business_central.utils.Dynamics')
+    dynamic_connection_mock.return_value.refresh_token = 'Dummy_Token'
+
+    first_connection = BusinessCentralConnector(business_central_creds, workspace_id).connection
+    second_connection = BusinessCentralConnector(business_central_creds, workspace_id).connection
+
+    assert first_connection is not second_connection
+    assert first_connection._connection is second_connection._connection
+    assert dynamic_connection_mock.call_count == 1
+    assert BusinessCentralCredentials.objects.get(workspace_id=workspace_id).refresh_token == 'Dummy_Token'
+
+    BusinessCentralConnector._connections[workspace_id]['expires_at'] = timezone.now()
+    BusinessCentralConnector(business_central_creds, workspace_id)
+
+    assert dynamic_connection_mock.call_count == 2
+
+    business_central_creds.workspace.business_central_company_id = 'New_Company_Id'
+    BusinessCentralConnector(business_central_creds, workspace_id)
+
+    assert dynamic_connection_mock.call_count == 3
+    assert dynamic_connection_mock.call_args.kwargs['company_id'] == 'New_Company_Id'
+
+    BusinessCentralConnector.clear_connection(workspace_id)
+    BusinessCentralConnector(business_central_creds, workspace_id)
+
+    assert dynamic_connection_mock.call_count == 4
+
+
+def test_bulk_post_through_cached_connection(
+    db,
+    mocker,
+    create_temp_workspace,
+    add_business_central_creds,
+    create_export_settings
+):
+    workspace_id = 1
+
+    business_central_creds = BusinessCentralCredentials.objects.get(workspace_id=workspace_id)
+    business_central_creds.workspace.business_central_company_id = 'Company_Id'
+    business_central_creds.workspace.save()
+
+    dynamics_init = mocker.patch('dynamics.core.client.Dynamics._Dynamics__refresh_access_token', return_value='Access_Token')
+    requests_post = mocker.patch('dynamics.apis.api_base.requests.post')
+    requests_post.return_value.status_code = 200
+    requests_post.return_value.text = '{"responses": []}'
+
+    # Two exports in the same worker share the cached Dynamics connection
+    for _ in range(2):
+        business_central_connection = BusinessCentralConnector(business_central_creds, workspace_id)
+        business_central_connection.bulk_post_journal_lineitems([{'amount': 10}], None)
+        business_central_connection.post_purchase_invoice_lineitems('Purchase_Invoice_Id', [{'amount': 10}])
+
+    assert dynamics_init.call_count == 1
+    assert requests_post.call_count == 4
+    assert all(call.args[0].endswith('/$batch?company=Company_Id') for call in requests_post.call_args_list)
+
+
 def test_post_purchase_invoice(
     db,
     mocker,
@@ -151,51 +222,115 @@ def test_bulk_post_journal_lineitems(
     assert response[1]['id'] == 'Journal_Line_Item_Id_2'
 
 
-def test_skip_sync_attributes(mocker, db, create_business_central_connection):
-
-    today = datetime.today()
-    Workspace.objects.filter(id=1).update(created_at=today)
+def test_sync_vendors_delta(mocker, db, create_business_central_connection):
+    workspace_id = 1
     business_central_connection = create_business_central_connection
+    vendors_api = business_central_connection.connection.vendors
+
+    vendors = [
+        {'id': 'vendor_1', 'number': 'V1', 'displayName': 'Vendor 1', 'email': '', 'currencyId': '', 'currencyCode': '', 'blocked': ' ', 'lastModifiedDateTime': '2024-01-25T13:26:51.467Z'},
+        {'id': 'vendor_2', 'number': 'V2', 'displayName': 'Vendor 2', 'email': '', 'currencyId': '', 'currencyCode': '', 'blocked': ' ', 'lastModifiedDateTime': '2024-01-25T13:26:51.47Z'}
+    ]
 
-    Mapping.objects.filter(workspace_id=1).delete()
-    CategoryMapping.objects.filter(workspace_id=1).delete()
+    get_all = mocker.patch.object(vendors_api, 'get_all', return_value=vendors)
 
-    DestinationAttribute.objects.filter(workspace_id=1, attribute_type='VENDOR').delete()
+    # The first sync fetches every vendor
+    business_central_connection.sync_vendors()
 
-    mocker.patch.object(
-        business_central_connection.connection.vendors,
-        'count',
-        return_value=10001
-    )
+    get_all.assert_called_once_with(**{'$orderby': 'id', '$top': 1000, '$skip': 0})
+    assert DestinationAttribute.objects.filter(workspace_id=workspace_id, attribute_type='VENDOR', active=True).count() == 2
+
+    watermark = DestinationSyncWatermark.objects.get(workspace_id=workspace_id, attribute_type='VENDOR')
+    assert watermark.last_modified_at == datetime.fromisoformat('2024-01-25T13:26:51.47Z')
+
+    # Later syncs fetch only the vendors modified since the watermark
+    get_all.return_value = [{**vendors[0], 'displayName': 'Vendor One', 'lastModifiedDateTime': '2024-02-01T10:00:00Z'}]
 
     business_central_connection.sync_vendors()
 
-    vendors = DestinationAttribute.objects.filter(attribute_type='VENDOR', workspace_id=1).count()
-    assert vendors == 0
+    get_all.assert_called_with(**{
+        '$filter': 'lastModifiedDateTime ge 2024-01-25T13:26:51.470000Z', '$orderby': 'lastModifiedDateTime,id', '$top': 1000, '$skip': 0
+    })
+    assert DestinationAttribute.objects.get(workspace_id=workspace_id, attribute_type='VENDOR', destination_id='V1').value == 'Vendor One'
 
-    DestinationAttribute.objects.filter(workspace_id=1, attribute_type='LOCATION').delete()
-    mocker.patch.object(
-        business_central_connection.connection.locations,
-        'count',
-        return_value=1001
-    )
+    watermark.refresh_from_db()
+    assert watermark.last_modified_at == datetime.fromisoformat('2024-02-01T10:00:00Z')
+
+    # An empty delta keeps the watermark
+    get_all.return_value = []
+    business_central_connection.sync_vendors()
 
-    business_central_connection.sync_locations()
+    watermark.refresh_from_db()
+    assert watermark.last_modified_at == datetime.fromisoformat('2024-02-01T10:00:00Z')
 
-    locations = DestinationAttribute.objects.filter(attribute_type='LOCATION', workspace_id=1).count()
-    assert locations == 0
+    # A due full sync deactivates the vendors deleted in Business Central
+    DestinationSyncWatermark.objects.filter(id=watermark.id).update(last_full_sync_at=timezone.now() - timedelta(days=8))
+    get_all.return_value = vendors[1:]
 
-    DestinationAttribute.objects.filter(workspace_id=1, attribute_type='ACCOUNT').delete()
-    mocker.patch.object(
-        business_central_connection.connection.accounts,
-        'count',
-        return_value=2001
+    business_central_connection.sync_vendors()
+
+    get_all.assert_called_with(**{'$orderby': 'id', '$top': 1000, '$skip': 0})
+    assert DestinationAttribute.objects.get(workspace_id=workspace_id, attribute_type='VENDOR', destination_id='V1').active is False
+    assert DestinationAttribute.objects.get(workspace_id=workspace_id, attribute_type='VENDOR', destination_id='V2').active is True
+
+    # A full sync returning no vendors deactivates them all, as they were all deleted in Business Central
+    get_all.return_value = []
+    DestinationSyncWatermark.objects.filter(id=watermark.id).update(last_full_sync_at=None)
+    business_central_connection.sync_vendors()
+
+    assert DestinationAttribute.objects.filter(workspace_id=workspace_id, attribute_type='VENDOR', active=True).count() == 0
+
+    get_all.return_value = vendors
+    DestinationSyncWatermark.objects.filter(id=watermark.id).update(last_full_sync_at=None)
+    business_central_connection.sync_vendors()
+
+    # A full sync whose pages shift as a vendor is deleted meanwhile, or interrupted by an error, deactivates nothing
+    mocker.patch('apps.business_central.utils.SYNC_PAGE_SIZE', 1)
+    get_all.return_value = None
+    get_all.side_effect = [vendors[:1], vendors[1:]]
+    DestinationSyncWatermark.objects.filter(id=watermark.id).update(last_full_sync_at=None)
+    warning = mocker.patch('apps.business_central.utils.logger.warning')
+    business_central_connection.sync_vendors()
+
+    get_all.assert_called_with(**{'$orderby': 'id', '$top': 2, '$skip': 0})
+    assert warning.call_count == 1
+    assert DestinationSyncWatermark.objects.get(id=watermark.id).last_full_sync_at is None
+
+    get_all.side_effect = Exception('Connection reset')
+    with pytest.raises(Exception, match='Connection reset'):
+        business_central_connection.sync_vendors()
+
+    assert DestinationAttribute.objects.filter(workspace_id=workspace_id, attribute_type='VENDOR', active=True).count() == 2
+
+
+def test_sync_vendors_in_pages(mocker, db, create_business_central_connection):
+    workspace_id = 1
+    business_central_connection = create_business_central_connection
+
+    DestinationAttribute.objects.filter(workspace_id=workspace_id, attribute_type='VENDOR').delete()
+
+    vendors = [{
+        'id': 'vendor_{}'.format(index), 'number': 'V{}'.format(index), 'displayName': 'Vendor {}'.format(index), 'email': '',
+        'currencyId': '', 'currencyCode': '', 'blocked': ' ', 'lastModifiedDateTime': '2024-01-25T13:26:51Z'
+    } for index in range(10001)]
+
+    get_all = mocker.patch.object(
+        business_central_connection.connection.vendors,
+        'get_all',
+        side_effect=lambda **kwargs: vendors[kwargs['$skip']:kwargs['$skip'] + kwargs['$top']]
+    )
+    bulk_create_or_update = mocker.patch(
+        'apps.business_central.utils.DestinationAttribute.bulk_create_or_update_destination_attributes',
+        wraps=DestinationAttribute.bulk_create_or_update_destination_attributes
     )
 
-    business_central_connection.sync_accounts()
+    business_central_connection.sync_vendors()
 
-    accounts = DestinationAttribute.objects.filter(attribute_type='ACCOUNT', workspace_id=1).count()
-    assert accounts == 0
+    # Vendors beyond the former sync limit are fetched page by page and upserted chunk by chunk
+    assert get_all.call_count == 11
+    assert bulk_create_or_update.call_count == 21
+    assert max(len(call.args[0]) for call in bulk_create_or_update.call_args_list) == 500
+    assert DestinationAttribute.objects.filter(workspace_id=workspace_id, attribute_type='VENDOR', active=True).count() == 10001
 
 
 def test_sync_bank_accounts(mocker, db, create_business_central_connection):
@@ -268,3 +403,71 @@ def test_sync_dimension(mocker, db, create_business_central_connection):
         workspace_id=workspace_id, attribute_type="AREA"
     )
     assert areas.count() == 3
+
+
+def test_post_dimension_lines(
+    db,
+    mocker,
+    create_business_central_connection,
+    create_purchase_invoice_line_items
+):
+    business_central_connection = create_business_central_connection
+    purchase_invoice_line_item = create_purchase_invoice_line_items[0]
+
+    def bulk_post_request(data, isolation):
+        return {'responses': [{'id': request['id'], 'status': 201, 'body': {'id': 'Dimension_Line_{}'.format(request['id'])}} for request in data['requests']]}
+
+    bulk_post_request_mock = mocker.patch.object(
+        business_central_connection.connection.purchase_invoice_line_items,
+        '_bulk_post_request',
+        side_effect=bulk_post_request
+    )
+    post_dimensions_mock = mocker.patch.object(
+        business_central_connection.connection.purchase_invoice_line_items,
+        'post_purchase_invoice_dimensions'
+    )
+
+    def get_dimension_line_payloads(count):
+        return [{
+            'id': 'Dimension_Id', 'code': 'AREA', 'parentId': 'Line_Id', 'valueId': 'Value_Id',
+            'valueCode': 'LARGE', 'exported_module_id': purchase_invoice_line_item.id
+        } for _ in range(count)]
+
+    business_central_connection.post_dimension_lines(
+        get_dimension_line_payloads(150), 'PURCHASE_INVOICE', purchase_invoice_line_item.purchase_invoice_id
+    )
+
+    # 150 dimension lines are posted in two $batch requests
+    assert bulk_post_request_mock.call_count == 2
+    assert len(bulk_post_request_mock.call_args_list[0].kwargs['data']['requests']) == 100
+    assert post_dimensions_mock.call_count == 0
+
+    purchase_invoice_line_item.refresh_from_db()
+    assert purchase_invoice_line_item.dimension_success_log == str({'id': 'Dimension_Line_49'})
+
+    # A rejected batch is posted line by line to log every failure
+    bulk_post_request_mock.side_effect = Exception('Batch rejected')
+    post_dimensions_mock.side_effect = Exception('Invalid dimension value')
+
+    business_central_connection.post_dimension_lines(
+        get_dimension_line_payloads(2), 'PURCHASE_INVOICE', purchase_invoice_line_item.purchase_invoice_id
+    )
+
+    assert post_dimensions_mock.call_count == 2
+
+    purchase_invoice_line_item.refresh_from_db()
+    assert purchase_invoice_line_item.dimension_error_log == 'Invalid dimension value'
+
+    # A throttled sub response of an accepted batch is logged as an error
+    bulk_post_request_mock.side_effect = None
+    bulk_post_request_mock.return_value = {'responses': [{'id': '0', 'status': 429, 'body': {'error': {'code': 'TooManyRequests'}}}]}
+    post_dimensions_mock.reset_mock()
+
+    business_central_connection.post_dimension_lines(
+        get_dimension_line_payloads(1), 'PURCHASE_INVOICE', purchase_invoice_line_item.purchase_invoice_id
+    )
+
+    assert post_dimensions_mock.call_count == 0
+
+    purchase_invoice_line_item.refresh_from_db()
+    assert purchase_invoice_line_item.dimension_error_log == str({'error': {'code': 'TooManyRequests'}})
@@ -18,6 +18,21 @@ def test_sync_dimensions(api_client, test_connection, mocker, create_temp_worksp
 
     response = api_client.post(url)
     assert response.status_code == 201
+    assert response.data == {'dimensions': {}}
+
+    # The result of every dimension is returned, and the request fails only when every dimension failed
+    dimensions = {'vendors': {'duration': 0.1, 'error': None}, 'accounts': {'duration': 0.1, 'error': 'Error'}}
+    mocker.patch('apps.business_central.serializers.sync_dimensions', return_value=dimensions)
+
+    response = api_client.post(url, {'refresh': True}, format='json')
+    assert response.status_code == 201
+    assert response.data == {'dimensions': dimensions}
+
+    dimensions['vendors']['error'] = 'Error'
+
+    response = api_client.post(url, {'refresh': True}, format='json')
+    assert response.status_code == 400
+    assert response.data['message'] == 'Failed to sync Business Central dimensions'
 
     business_central_credentials = BusinessCentralCredentials.objects.get(workspace_id=workspace_id)
     business_central_credentials.delete()
@@ -399,6 +399,7 @@ fixtures = {
                 "export_url":"None",
                 "business_central_errors":[],
                 "exported_at":"None",
+                "export_metrics":{},
                 "workspace":1,
                 "expenses":[]
             },
@@ -416,6 +417,7 @@ fixtures = {
                 "export_url":"None",
                 "business_central_errors":[],
                 "exported_at":"None",
+                "export_metrics":{},
                 "workspace":1,
                 "expenses":[]
             }
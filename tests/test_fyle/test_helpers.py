@@ -1,3 +1,6 @@
+import copy
+from datetime import datetime, timezone
+
 import pytest
 from requests import Response
 from apps.fyle.helpers import (
@@ -7,8 +10,11 @@ from apps.fyle.helpers import (
     get_request,
     post_request,
     construct_expense_filter_query,
+    get_expenses_generator,
+    construct_expense_filter_predicate_query,
+    get_expense_filter_predicate,
 )
-from apps.fyle.models import ExpenseFilter
+from apps.fyle.models import Expense, ExpenseFilter
 from tests.test_fyle.fixtures import fixtures as data
 
 
@@ -175,3 +181,130 @@ def test_construct_expense_filter():
     response = ~Q(**filter_1)
 
     assert constructed_expense_filter == response
+
+
+def test_get_expenses_generator(mocker):
+    platform = mocker.MagicMock()
+    platform.expenses.connection.list_all.return_value = iter([
+        {'data': [
+            {'id': 'tx1', 'is_reimbursable': True, 'amount': 10, 'source_account': {'type': 'PERSONAL_CORPORATE_CREDIT_CARD_ACCOUNT'}},
+            {'id': 'tx2', 'is_reimbursable': False, 'amount': -10, 'source_account': {'type': 'PERSONAL_CORPORATE_CREDIT_CARD_ACCOUNT'}}
+        ]},
+        {'data': [
+            {'id': 'tx3', 'is_reimbursable': False, 'amount': 10, 'source_account': {'type': 'PERSONAL_CASH_ACCOUNT'}}
+        ]}
+    ])
+    platform.expenses.construct_expense_object.side_effect = lambda expenses, workspace_id: [expense['id'] for expense in expenses]
+
+    expense_pages = get_expenses_generator(
+        platform, 1, 'PERSONAL_CORPORATE_CREDIT_CARD_ACCOUNT', 'PAYMENT_PROCESSING', filter_credit_expenses=True
+    )
+
+    assert list(expense_pages) == [['tx1']]
+    query_params = platform.expenses.connection.list_all.call_args[0][0]
+    assert query_params['order'] == 'report_id.asc,id.asc'
+    assert query_params['source_account->type'] == 'eq.PERSONAL_CORPORATE_CREDIT_CARD_ACCOUNT'
+    assert query_params['state'] == 'eq.PAYMENT_PROCESSING'
+
+    platform.expenses.connection.list_all.return_value = iter([])
+
+    list(get_expenses_generator(platform, 1, 'PERSONAL_CASH_ACCOUNT', 'APPROVED', approved_at=datetime(2024, 1, 2, 3, 4, 5)))
+
+    assert platform.expenses.connection.list_all.call_args[0][0] == {
+        'order': 'report_id.asc,id.asc',
+        'source_account->type': 'eq.PERSONAL_CASH_ACCOUNT',
+        'state': 'in.("APPROVED", "PAYMENT_PROCESSING", "PAID")',
+        'report_last_approved_at': 'gte.2024-01-02T03:04:05.000Z'
+    }
+
+
+def test_construct_expense_filter_predicate_query(db, create_temp_workspace):
+    expense_variants = [
+        {'category': 'Food', 'employee_email': 'ashwin.t@fyle.in', 'report_title': 'R/2022/05/R/4', 'spent_at': '2022-05-13T17:00:00Z',
+            'custom_properties': {'Team': 'Alpha', 'Amount Field': 10, 'Flag': True, 'Note': 'Client Dinner'}},
+        {'category': 'Travel', 'employee_email': 'ASHWIN.T@FYLE.IN', 'report_title': 'Trip', 'spent_at': '2022-05-20T00:00:00Z',
+            'custom_properties': {'Team': 'alpha', 'Amount Field': 150, 'Flag': False, 'Note': ''}},
+        {'category': None, 'employee_email': 'john@fyle.in', 'report_title': 'r/2022/06/R/1', 'spent_at': '2022-05-13T18:00:00Z',
+            'custom_properties': {'Team': '', 'Amount Field': '20', 'Flag': 'true'}},
+        {'category': 'Office Supplies', 'employee_email': 'jane@fyle.in', 'report_title': None, 'spent_at': '2022-04-01T10:00:00Z',
+            'custom_properties': {'Amount Field': None, 'Note': 12}},
+    ]
+
+    expenses = []
+    for index, expense_variant in enumerate(expense_variants):
+        expense = copy.deepcopy(data['expenses'][0])
+        expense.update(expense_variant)
+        expense['id'] = 'txParity{}'.format(index)
+        expenses.append(expense)
+
+    Expense.create_expense_objects(expenses, 1)
+
+    filter_sets = [
+        [{'condition': 'category', 'operator': 'in', 'values': ['Food', 'Travel']}],
+        [{'condition': 'category', 'operator': 'not_in', 'values': ['Food', 'Travel']}],
+        [{'condition': 'employee_email', 'operator': 'in', 'values': ['ashwin.t@fyle.in', 'jane@fyle.in']}],
+        [{'condition': 'employee_email', 'operator': 'iexact', 'values': ['Ashwin.T@fyle.in']}],
+        [{'condition': 'report_title', 'operator': 'icontains', 'values': ['R/2022']}],
+        [{'condition': 'spent_at', 'operator': 'lt', 'values': ['2022-05-13T18:00:00+00:00']}],
+        [{'condition': 'spent_at', 'operator': 'lte', 'values': ['2022-05-13 18:00:00']}],
+        [{'condition': 'Team', 'operator': 'in', 'values': ['Alpha'], 'is_custom': True, 'custom_field_type': 'SELECT'}],
+        [{'condition': 'Team', 'operator': 'not_in', 'values': ['Alpha'], 'is_custom': True, 'custom_field_type': 'SELECT'}],
+        [{'condition': 'Team', 'operator': 'isnull', 'values': ['True'], 'is_custom': True, 'custom_field_type': 'SELECT'}],
+        [{'condition': 'Team', 'operator': 'isnull', 'values': ['false'], 'is_custom': True, 'custom_field_type': 'SELECT'}],
+        [{'condition': 'Amount Field', 'operator': 'lt', 'values': ['100'], 'is_custom': True, 'custom_field_type': 'NUMBER'}],
+        [{'condition': 'Amount Field', 'operator': 'lte', 'values': ['150'], 'is_custom': True, 'custom_field_type': 'NUMBER'}],
+        [{'condition': 'Amount Field', 'operator': 'in', 'values': ['10', '20'], 'is_custom': True, 'custom_field_type': 'NUMBER'}],
+        [{'condition': 'Flag', 'operator': 'in', 'values': ['true'], 'is_custom': True, 'custom_field_type': 'BOOLEAN'}],
+        [{'condition': 'Flag', 'operator': 'in', 'values': ['false'], 'is_custom': True, 'custom_field_type': 'BOOLEAN'}],
+        [{'condition': 'Note', 'operator': 'icontains', 'values': ['dinner'], 'is_custom': True, 'custom_field_type': 'TEXT'}],
+        [{'condition': 'Note', 'operator': 'iexact', 'values': ['12'], 'is_custom': True, 'custom_field_type': 'TEXT'}],
+        [
+            {'condition': 'category', 'operator': 'in', 'values': ['Food', 'Travel'], 'join_by': 'AND'},
+            {'condition': 'Team', 'operator': 'isnull', 'values': ['false'], 'is_custom': True, 'custom_field_type': 'SELECT'}
+        ],
+        [
+            {'condition': 'report_title', 'operator': 'icontains', 'values': ['trip'], 'join_by': 'OR'},
+            {'condition': 'spent_at', 'operator': 'lt', 'values': ['2022-05-01T00:00:00Z']}
+        ],
+    ]
+
+    for filter_set in filter_sets:
+        def get_expense_filters():
+            return [
+                ExpenseFilter(**{
+                    'rank': rank, 'workspace_id': 1, 'is_custom': False, 'join_by': None, 'custom_field_type': None,
+                    **expense_filter, 'values': list(expense_filter['values'])
+                }) for rank, expense_filter in enumerate(filter_set, start=1)
+            ]
+
+        predicate = construct_expense_filter_predicate_query(get_expense_filters())
+        assert predicate is not None
+
+        expected_expense_ids = set(Expense.objects.filter(
+            construct_expense_filter_query(get_expense_filters()), workspace_id=1
+        ).values_list('expense_id', flat=True))
+
+        assert {expense['id'] for expense in expenses if predicate(expense)} == expected_expense_ids, filter_set
+
+
+def test_get_expense_filter_predicate():
+    expense_filters = [ExpenseFilter(
+        id=1, condition='employee_email', operator='in', values=['ashwin.t@fyle.in'], rank=1, is_custom=False,
+        workspace_id=1, updated_at=datetime(2024, 1, 1, tzinfo=timezone.utc)
+    )]
+
+    predicate = get_expense_filter_predicate(1, expense_filters)
+    assert predicate({'employee_email': 'ashwin.t@fyle.in'})
+    assert get_expense_filter_predicate(1, expense_filters) is predicate
+
+    # Saving a filter bumps updated_at which invalidates the compiled predicate
+    expense_filters[0].values = ['someone@fyle.in']
+    expense_filters[0].updated_at = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    assert get_expense_filter_predicate(1, expense_filters) is not predicate
+
+    # Filters the predicate can not mirror are left to the database query
+    unsupported_filter = ExpenseFilter(
+        condition='employee_email', operator='isnull', values=['true'], rank=1, is_custom=False, workspace_id=1
+    )
+    assert construct_expense_filter_predicate_query([unsupported_filter]) is None
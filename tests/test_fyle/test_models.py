@@ -0,0 +1,62 @@
+import copy
+
+from apps.accounting_exports.models import AccountingExport
+from apps.fyle.models import Expense
+from tests.test_fyle.fixtures import fixtures as data
+
+
+def test_create_expense_objects(db, create_temp_workspace, django_assert_max_num_queries):
+    expenses = []
+    for index in range(5):
+        expense = copy.deepcopy(data['expenses'][0])
+        expense['id'] = 'txExpense{}'.format(index)
+        expense['expense_number'] = 'E/2022/05/T/{}'.format(index)
+        expenses.append(expense)
+
+    with django_assert_max_num_queries(4):
+        expense_objects = Expense.create_expense_objects(expenses, 1)
+
+    assert [expense.expense_id for expense in expense_objects] == ['txExpense{}'.format(index) for index in range(5)]
+    assert expense_objects[0].custom_properties['Team'] is None
+
+    accounting_export = AccountingExport.objects.create(workspace_id=1, fund_source='PERSONAL', status='EXPORT_READY')
+    accounting_export.expenses.add(expense_objects[0])
+
+    expenses[1]['category'] = 'Travel'
+    expense_objects = Expense.create_expense_objects(expenses, 1)
+
+    assert Expense.objects.filter(workspace_id=1).count() == 5
+    assert [expense.expense_id for expense in expense_objects] == ['txExpense{}'.format(index) for index in range(1, 5)]
+    assert Expense.objects.get(expense_id='txExpense1').category == 'Travel'
+
+
+def test_create_expense_objects_skip_update(db, create_temp_workspace):
+    expense = copy.deepcopy(data['expenses'][0])
+    Expense.create_expense_objects([expense], 1)
+
+    expense = copy.deepcopy(data['expenses'][0])
+    expense['claim_number'] = 'C/2022/05/R/5'
+    expense['category'] = 'Travel'
+    Expense.create_expense_objects([expense, expense], 1, skip_update=True)
+
+    expense = Expense.objects.get(expense_id='91')
+    assert expense.category == 'Travel'
+    assert expense.claim_number == 'C/2022/05/R/4'
+
+
+def test_create_expense_objects_expense_filter_predicate(db, create_temp_workspace):
+    expenses = []
+    for index in range(3):
+        expense = copy.deepcopy(data['expenses'][0])
+        expense['id'] = 'txExpense{}'.format(index)
+        expenses.append(expense)
+
+    Expense.create_expense_objects(expenses[1:], 1)
+
+    def expense_filter_predicate(expense):
+        return expense['id'] in ('txExpense0', 'txExpense1')
+
+    expense_objects = Expense.create_expense_objects(expenses, 1, expense_filter_predicate=expense_filter_predicate)
+
+    assert [expense.expense_id for expense in expense_objects] == ['txExpense2']
+    assert set(Expense.objects.filter(is_skipped=True).values_list('expense_id', flat=True)) == {'txExpense0', 'txExpense1'}
@@ -1,10 +1,12 @@
+import copy
+
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 
 from apps.accounting_exports.models import AccountingExport
 from apps.fyle.models import Expense
-from apps.fyle.tasks import update_non_exported_expenses
+from apps.fyle.tasks import import_expenses, update_non_exported_expenses
 from apps.workspaces.models import Workspace
 from tests.test_fyle.fixtures import fixtures as data
 
@@ -71,3 +73,46 @@ def test_update_non_exported_expenses(db, create_temp_workspace, mocker, api_cli
     url = reverse('webhook-callback', kwargs={'workspace_id': 2})
     response = api_client.post(url, data=payload, format='json')
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_import_expenses(db, mocker, create_temp_workspace, add_fyle_credentials, add_export_settings):
+    expense_pages = []
+    for page in [[('txExpense1', 'rpReport1'), ('txExpense2', 'rpReport2')], [('txExpense3', 'rpReport2'), ('txExpense4', 'rpReport3')]]:
+        expenses = []
+        for expense_id, report_id in page:
+            expense = copy.deepcopy(data['expenses'][0])
+            expense['id'] = expense_id
+            expense['report_id'] = report_id
+            expenses.append(expense)
+        expense_pages.append(expenses)
+
+    mocker.patch('apps.fyle.tasks.PlatformConnector')
+    mocker.patch('apps.fyle.tasks.get_expenses_generator', return_value=iter(expense_pages))
+
+    accounting_export = AccountingExport.objects.create(workspace_id=1, type='FETCHING_REIMBURSABLE_EXPENSES', status='IN_PROGRESS')
+    import_expenses(1, accounting_export, 'PERSONAL_CASH_ACCOUNT', 'PERSONAL')
+
+    assert accounting_export.status == 'COMPLETE'
+    assert Workspace.objects.get(id=1).reimbursable_last_synced_at is not None
+
+    # Expenses of a report split across pages still land in a single accounting export
+    accounting_exports = AccountingExport.objects.filter(workspace_id=1, fund_source='PERSONAL').order_by('id')
+    assert accounting_exports.count() == 3
+    assert sorted(accounting_exports[1].expenses.values_list('expense_id', flat=True)) == ['txExpense2', 'txExpense3']
+
+
+def test_import_expenses_failed_page(db, mocker, create_temp_workspace, add_fyle_credentials, add_export_settings):
+    def expense_pages():
+        yield copy.deepcopy(data['expenses'])
+        raise Exception('Fyle is down')
+
+    mocker.patch('apps.fyle.tasks.PlatformConnector')
+    mocker.patch('apps.fyle.tasks.get_expenses_generator', return_value=expense_pages())
+
+    accounting_export = AccountingExport.objects.create(workspace_id=1, type='FETCHING_REIMBURSABLE_EXPENSES', status='IN_PROGRESS')
+    import_expenses(1, accounting_export, 'PERSONAL_CASH_ACCOUNT', 'PERSONAL')
+
+    # The committed page is kept while the sync checkpoint stays where it was
+    assert accounting_export.status == 'FATAL'
+    assert Expense.objects.filter(workspace_id=1).count() == 1
+    assert Workspace.objects.get(id=1).reimbursable_last_synced_at is None
@@ -122,8 +122,8 @@ def test_accounting_export_sync_view(api_client, test_connection, create_temp_wo
     url = reverse('sync-accounting-exports', kwargs={'workspace_id': 1})
 
     mocker.patch(
-        'fyle_integrations_platform_connector.apis.Expenses.get',
-        return_value = data['expenses'],
+        'apps.fyle.tasks.get_expenses_generator',
+        side_effect=lambda **kwargs: iter([data['expenses']]),
     )
 
     api_client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(access_token))
@@ -131,7 +131,7 @@ def test_accounting_export_sync_view(api_client, test_connection, create_temp_wo
     response = api_client.post(url)
     assert response.status_code == 200
 
-    accounting_exports = AccountingExport.objects.filter(workspace_id=1)
+    accounting_exports = AccountingExport.objects.filter(workspace_id=1).order_by('id')
 
     assert accounting_exports[0].status == 'COMPLETE'
 
@@ -1,6 +1,10 @@
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from unittest import mock
 
+import pytest
+
 from fyle_accounting_mappings.models import CategoryMapping, DestinationAttribute, ExpenseAttribute, Mapping
 from fyle_integrations_platform_connector import PlatformConnector
 
@@ -124,6 +128,134 @@ def test_remove_duplicates(
     assert len(attributes) == 2
 
 
+def test_get_destination_attributes_generator(
+    db,
+    mocker,
+    create_temp_workspace,
+):
+    workspace_id = 1
+
+    # Every value is shared by three attributes, so ties straddle the batch boundaries
+    DestinationAttribute.objects.bulk_create([
+        DestinationAttribute(
+            attribute_type='COST_CENTER',
+            display_name='Cost Center',
+            workspace_id=workspace_id,
+            value='Cost Center {0:03d}'.format(index // 3),
+            destination_id='cost_center_{0}'.format(index),
+        ) for index in range(450)
+    ])
+
+    base = get_base_class_instance()
+    mocker.patch.object(base, 'remove_duplicate_attributes', side_effect=lambda attributes, seen_values: attributes)
+
+    filters = base.construct_attributes_filter('COST_CENTER')
+    batches = list(base.get_destination_attributes_generator(450, filters))
+
+    assert [len(attributes) for attributes, _ in batches] == [200, 200, 50]
+    assert [is_last_batch for _, is_last_batch in batches] == [False, False, True]
+    assert [attribute.id for attributes, _ in batches for attribute in attributes] == list(
+        DestinationAttribute.objects.filter(**filters).order_by('value', 'id').values_list('id', flat=True)
+    )
+
+
+def test_get_destination_attributes_generator_removes_duplicates_across_batches(
+    db,
+    create_temp_workspace,
+):
+    workspace_id = 1
+
+    # A199 and a199 sort into different batches whatever the collation
+    values = ['a{0:03d}'.format(index) for index in range(200)] + ['A199']
+    DestinationAttribute.objects.bulk_create([
+        DestinationAttribute(
+            attribute_type='COST_CENTER',
+            display_name='Cost Center',
+            workspace_id=workspace_id,
+            value=value,
+            destination_id='cost_center_{0}'.format(index),
+        ) for index, value in enumerate(values)
+    ])
+
+    base = get_base_class_instance()
+
+    filters = base.construct_attributes_filter('COST_CENTER')
+    batches = list(base.get_destination_attributes_generator(len(values), filters))
+
+    attribute_values = [attribute.value.lower() for attributes, _ in batches for attribute in attributes]
+
+    assert len(batches) == 2
+    assert len(attribute_values) == 200
+    assert len(set(attribute_values)) == 200
+
+
+def test_construct_payload_and_import_to_fyle_concurrently(
+    db,
+    mocker,
+    settings,
+    create_temp_workspace,
+):
+    workspace_id = 1
+    settings.IMPORT_CONCURRENCY = 3
+
+    DestinationAttribute.objects.bulk_create([
+        DestinationAttribute(
+            attribute_type='PROJECT',
+            display_name='Project',
+            workspace_id=workspace_id,
+            value='Project {0:04d}'.format(index),
+            destination_id='project_{0}'.format(index),
+            active=True,
+        ) for index in range(1000)
+    ])
+
+    posts_in_flight = []
+    max_posts_in_flight = []
+    failing_project_names = []
+    posts_lock = threading.Lock()
+
+    def post_bulk(payload):
+        with posts_lock:
+            posts_in_flight.append(payload)
+            max_posts_in_flight.append(len(posts_in_flight))
+
+        time.sleep(0.05)
+
+        with posts_lock:
+            posts_in_flight.remove(payload)
+
+        if payload[0]['name'] in failing_project_names:
+            raise Exception('Post failed')
+
+    resource_class = mock.MagicMock()
+    resource_class.post_bulk.side_effect = post_bulk
+    project = Project(workspace_id, 'PROJECT', None)
+    mocker.patch.object(project, 'get_platform_class', return_value=resource_class)
+
+    # Up to three batches are posted at once and the import completes after every batch
+    import_log = ImportLog.objects.create(workspace_id=workspace_id, attribute_type='PROJECT', status='IN_PROGRESS')
+
+    project.construct_payload_and_import_to_fyle(mock.MagicMock(), import_log)
+
+    import_log.refresh_from_db()
+    assert resource_class.post_bulk.call_count == 5
+    assert max(max_posts_in_flight) == 3
+    assert import_log.status == 'COMPLETE'
+    assert import_log.processed_batches_count == import_log.total_batches_count == 5
+
+    # A failed batch raises and leaves the import incomplete
+    failing_project_names.append('Project 0200')
+    ImportLog.objects.filter(id=import_log.id).update(status='IN_PROGRESS', processed_batches_count=0)
+    import_log.refresh_from_db()
+
+    with pytest.raises(Exception, match='Post failed'):
+        project.construct_payload_and_import_to_fyle(mock.MagicMock(), import_log)
+
+    import_log.refresh_from_db()
+    assert import_log.status == 'IN_PROGRESS'
+    assert import_log.processed_batches_count < 5
+
+
 def test_get_platform_class(
     api_client,
     test_connection,